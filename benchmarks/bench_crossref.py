@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the crossref reporting routines.
+
+It builds a list of synthetic cross references between systems and times the duplicate
+removal and the formatted output routines with and without fields. The output is written
+to the null device, so the timings only include the formatting and grouping.
+"""
+import os
+import sys
+import time
+import random
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from crossref import remove_duplicates, print_system_to_others, print_others_to_system  # noqa: E402
+
+# Default number of synthetic references
+DEFAULT_REFERENCES = 100000
+
+# Number of synthetic systems
+SYSTEM_COUNT = 20
+
+
+def make_references(count, seed=0):
+    """
+    Build a list of synthetic references from one system to the others, and a dictionary
+    with the references from the other systems, in the format used by crossref.
+    :param count: number of references
+    :type count: int
+    :param seed: random seed
+    :type seed: int
+    :return: list and dictionary of references
+    :rtype: tuple
+    """
+    rnd = random.Random(seed)
+    systems = ['sys' + str(i) for i in range(SYSTEM_COUNT)]
+    fields = ['INP', 'OUT', 'FLNK', 'DOL', 'INPA', 'INPB']
+    input_list = []
+    input_dict = {}
+    for i in range(count):
+        target_system = rnd.choice(systems[1:])
+        target_record = target_system + ':rec' + str(rnd.randrange(count // 4))
+        source_record = systems[0] + ':rec' + str(i)
+        input_list.append((target_record, 'VAL', source_record, rnd.choice(fields), [target_system]))
+        input_dict.setdefault(target_system, []).append((systems[0] + ':rec' + str(rnd.randrange(count // 4)),
+                                                         'VAL', target_record, rnd.choice(fields)))
+    return systems[0], input_list, input_dict
+
+
+def timed(label, function, *args):
+    """
+    Run a function and print the elapsed time
+    :param label: label to print
+    :type label: str
+    :param function: function to run
+    :type function: callable
+    """
+    t = time.perf_counter()
+    function(*args)
+    print('{0:40s} {1:8.3f} s'.format(label, time.perf_counter() - t))
+
+
+def run(count):
+    """
+    Run the benchmark
+    :param count: number of synthetic references
+    :type count: int
+    """
+    system, input_list, input_dict = make_references(count)
+    print('references:', len(input_list), 'to other systems,',
+          sum([len(v) for v in input_dict.values()]), 'from other systems')
+    with open(os.devnull, 'w') as f_out:
+        timed('remove_duplicates', remove_duplicates, [t[:3] for t in input_list])
+        timed('print_system_to_others', print_system_to_others, system, input_list, False, f_out)
+        timed('print_system_to_others (fields)', print_system_to_others, system, input_list, True, f_out)
+        timed('print_others_to_system', print_others_to_system, system, input_dict, False, f_out)
+        timed('print_others_to_system (fields)', print_others_to_system, system, input_dict, True, f_out)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--references',
+                        action='store',
+                        type=int,
+                        dest='references',
+                        default=DEFAULT_REFERENCES,
+                        help='number of synthetic references [default=' + str(DEFAULT_REFERENCES) + ']')
+    args = parser.parse_args()
+    run(args.references)
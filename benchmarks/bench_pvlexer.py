@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pvload file lexer.
+
+It writes a large synthetic pvload file with groups, single statements (scalars and arrays,
+with and without types and scale factors), sleep statements and comments, and times the
+tokenization of the whole file.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from pvlexer import PvLexer  # noqa: E402
+
+# Default number of statements in the synthetic file
+DEFAULT_STATEMENTS = 200000
+
+
+def write_pvload_file(f_out, count, seed=0):
+    """
+    Write a synthetic pvload file
+    :param f_out: output file
+    :type f_out: file
+    :param count: number of statements
+    :type count: int
+    :param seed: random seed
+    :type seed: int
+    """
+    rnd = random.Random(seed)
+    types = ['', 'int ', 'double ', 'float ', 'string ', 'short ']
+    units = ['', ' arcsec', ' deg', ' um', ' mm', ' m', ' * 2', ' / 1000']
+    in_group = False
+    for i in range(count):
+        r = rnd.random()
+        name = 'tcs:sys' + str(i % 50) + ':pv' + str(i)
+        if r < 0.02:
+            f_out.write('# comment line ' + str(i) + '\n')
+        elif r < 0.04:
+            f_out.write('sleep ' + str(rnd.randrange(10)) + ';\n')
+        elif r < 0.08:
+            f_out.write('}\n' if in_group else 'group {\n')
+            in_group = not in_group
+        elif r < 0.2:
+            values = ', '.join(['[' + str(j) + '] ' + str(rnd.random()) for j in range(8)])
+            f_out.write('double ' + name + '[8] = {' + values + '};\n')
+        elif r < 0.3:
+            f_out.write('string ' + name + ' = "value ' + str(i) + '";\n')
+        else:
+            value = str(rnd.randrange(-1000, 1000)) if r < 0.6 else '{0:.6e}'.format(rnd.uniform(-1e3, 1e3))
+            f_out.write(rnd.choice(types) + name + ' = ' + value + rnd.choice(units) + ';  # note\n')
+    if in_group:
+        f_out.write('}\n')
+
+
+def tokenize(file_name):
+    """
+    Tokenize a file
+    :param file_name: file name
+    :type file_name: str
+    :return: number of tokens
+    :rtype: int
+    """
+    lex = PvLexer()
+    count = 0
+    with open(file_name, 'r') as f:
+        for _ in lex.tokens(f):
+            count += 1
+    return count
+
+
+def run(count):
+    """
+    Run the benchmark
+    :param count: number of statements in the synthetic file
+    :type count: int
+    """
+    fd, file_name = tempfile.mkstemp(suffix='.pv')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            write_pvload_file(f, count)
+        size = os.path.getsize(file_name)
+        t = time.perf_counter()
+        tokens = tokenize(file_name)
+        elapsed = time.perf_counter() - t
+        print('{0} statements, {1:.1f} MB, {2} tokens'.format(count, size / 1e6, tokens))
+        print('{0:.3f} s, {1:.0f} tokens/s'.format(elapsed, tokens / elapsed))
+    finally:
+        os.remove(file_name)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--statements',
+                        action='store',
+                        type=int,
+                        dest='statements',
+                        default=DEFAULT_STATEMENTS,
+                        help='number of statements [default=' + str(DEFAULT_STATEMENTS) + ']')
+    args = parser.parse_args()
+    run(args.statements)
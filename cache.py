@@ -0,0 +1,99 @@
+"""
+Routines used to cache the result of parsing files between program runs.
+
+Objects are pickled into files in a cache directory. Each cache entry is identified by a key
+built from the kind of object stored, the absolute path, modification time and size of the
+files it was built from, and any other parameters that affect the result (e.g. filters or macros).
+Entries become stale automatically when a file changes, since its key changes as well.
+Stale entries are never read again and can be removed by deleting the cache directory.
+
+Errors while reading or writing the cache are ignored. The cache is only an optimization,
+and the programs should behave in the same way when it's not available.
+"""
+import os
+import pickle
+import hashlib
+import tempfile
+
+# Default cache directory
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'epicsutil')
+
+# Cache format version. It's included in all the keys, so changing it will invalidate all
+# the existing entries. It should be incremented when the structure of the cached objects changes,
+# or when the routines used to compute them change their results (e.g. the dbdiff link filter).
+CACHE_VERSION = 2
+
+
+def file_signature(file_name):
+    """
+    Return a tuple that identifies the current contents of a file without reading it.
+    :param file_name: file name
+    :type file_name: str
+    :return: tuple with the absolute path, modification time (ns) and size
+    :rtype: tuple
+    """
+    st = os.stat(file_name)
+    return os.path.realpath(file_name), st.st_mtime_ns, st.st_size
+
+
+def cache_key(kind, file_names, *extra):
+    """
+    Return the cache key for an object built from a list of files.
+    :param kind: kind of object stored (e.g. 'database')
+    :type kind: str
+    :param file_names: list of files the object was built from
+    :type file_names: list
+    :param extra: any additional parameters that affect the object
+    :return: cache key
+    :rtype: str
+    """
+    signatures = [file_signature(f) for f in file_names]
+    return kind + '-' + hashlib.sha1(repr((CACHE_VERSION, signatures, extra)).encode()).hexdigest()
+
+
+def read_cache(key, cache_directory=DEFAULT_CACHE_DIRECTORY):
+    """
+    Read an object from the cache.
+    :param key: cache key (from cache_key)
+    :type key: str
+    :param cache_directory: cache directory
+    :type cache_directory: str
+    :return: cached object, or None if not in the cache
+    :rtype: object
+    """
+    try:
+        with open(os.path.join(cache_directory, key), 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def write_cache(key, obj, cache_directory=DEFAULT_CACHE_DIRECTORY):
+    """
+    Write an object to the cache. The object is written to a temporary file first and then
+    renamed, so concurrent programs will never read a partially written entry.
+    :param key: cache key (from cache_key)
+    :type key: str
+    :param obj: object to store
+    :type obj: object
+    :param cache_directory: cache directory
+    :type cache_directory: str
+    :return: True if the object was written, False otherwise
+    :rtype: bool
+    """
+    temp_file_name = None
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        fd, temp_file_name = tempfile.mkstemp(dir=cache_directory, prefix='.' + key)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file_name, os.path.join(cache_directory, key))
+        return True
+    except Exception:
+        if temp_file_name is not None and os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        return False
+
+
+if __name__ == '__main__':
+    pass
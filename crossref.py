@@ -5,20 +5,38 @@ Look for database references between systems.
 The program requires the databases to be placed in a directory with one subdirectory per systems.
 
 For a given system, the program will print the references to records in other systems and
-the references from other systems' databases.
+the references from other systems' databases. The --all option produces the matrix with the
+number of references between every pair of systems, and the list of all the references, in
+CSV, JSON or DOT (graphviz) format. The --match option lists the records whose names match
+a glob pattern (e.g. "tcs:drives:*"), with the system and database where they are defined.
+The --duplicates option lists the record names defined in more than one system, with the
+database file and line number of each definition.
 
 Databases that use macros in records names should have them replaced by the actual values or
 the program will most likely fail to find cross references (use dbmacro for macro replacement).
 
 The program creates a directory with index files to speed up searches the first time it's executed.
-These indices should be rebuilt in the database files are updated (--rebuild option).
+The indices are updated with the database files that were added, changed or removed since
+the last run, using a manifest file per system with the modification time, size and hash of
+each database. They can also be rebuilt from scratch (--rebuild option).
+
+The records and the references between records are also stored in a SQLite database in the index
+directory (see xrefstore), so the cross reference queries don't need to parse the database files.
+The --scan option can be used to look for references by parsing all the database files instead.
 """
 import sys
 import re
-from os import listdir, makedirs
-from os.path import exists, isfile, isdir, join, splitext
+import csv
+import json
+import hashlib
+from os import listdir, makedirs, stat
+from os.path import exists, isfile, isdir, join, splitext, abspath
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from argparse import ArgumentParser, SUPPRESS
 from db import DatabaseFile, EpicsRecord, EpicsMacro
+from dblink import LINK_PV, parse_link
+from xrefstore import CrossRefStore
+from recordindex import read_record_index, MANIFEST_VERSION
 
 # Default directory where databases are stored
 DEFAULT_DATABASE_DIRECTORY = join('.', 'data')
@@ -26,6 +44,14 @@ DEFAULT_DATABASE_DIRECTORY = join('.', 'data')
 # Default directory where indices are stored
 DEFAULT_INDEX_DIRECTORY = join('.', 'indices')
 
+# Output formats for the reference matrix
+FORMAT_CSV = 'csv'
+FORMAT_JSON = 'json'
+FORMAT_DOT = 'dot'
+
+# Name of the cross reference store file (in the index directory)
+STORE_FILE_NAME = 'crossref.sqlite'
+
 # This regular expression used to rule out strings that don't match a record name
 # It only needs to be good enough to check whether a string looks like a record name.
 # The pattern is precompiled to speed up matching in the program.
@@ -51,6 +77,66 @@ def get_index_file_name(system, index_directory):
     return join(join(index_directory, system) + '.index')
 
 
+def get_manifest_file_name(system, index_directory):
+    """
+    Return the manifest file name for a given system.
+    The manifest keeps track of the state of each database file in the system (see read_manifest).
+    :param system: system name
+    :type system: str
+    :param index_directory: index directory
+    :type index_directory: str
+    :return: manifest file name
+    :rtype: str
+    """
+    return join(index_directory, system) + '.manifest'
+
+
+def format_index_line(record_name, database_name, line_number):
+    """
+    Format a line in an index file. Each line contains the record name, the database
+    file name and the line number where the record starts, separated by tabs.
+    :param record_name: record name
+    :type record_name: str
+    :param database_name: database file name
+    :type database_name: str
+    :param line_number: line number
+    :type line_number: int
+    :return: index file line
+    :rtype: str
+    """
+    return record_name + '\t' + database_name + '\t' + str(line_number)
+
+
+def parse_index_line(line):
+    """
+    Split a line from an index file into the record name, database file name and line number.
+    Index files written by older versions of the program contain only the record name,
+    in which case the database file name and line number are None.
+    :param line: index file line
+    :type line: str
+    :return: record name, database file name and line number (tuple)
+    :rtype: tuple
+    """
+    fields = line.split('\t')
+    if len(fields) == 3:
+        try:
+            return fields[0], fields[1], int(fields[2])
+        except ValueError:
+            return fields[0], fields[1], None
+    return fields[0], None, None
+
+
+def get_store_file_name(index_directory):
+    """
+    Return the name of the cross reference store file.
+    :param index_directory: index directory
+    :type index_directory: str
+    :return: store file name
+    :rtype: str
+    """
+    return join(index_directory, STORE_FILE_NAME)
+
+
 def get_database_names(system, data_directory):
     """
     Return the list of database files for a given system.
@@ -91,28 +177,23 @@ def get_system_list(data_directory):
 
 def parse_field_value(field_value):
     """
-    Extract field value from the field value string.
-    It just filters double quotes and extract the first word from the value.
-    This is not a full proof way, but it's good enough for want we want.
+    Extract the target record and field names from the field value string.
+    The value is parsed with dblink.parse_link. Only process variable links whose record
+    name "looks like" a record name are considered references.
     :param field_value: raw field value from the database
     :type field_value: str
     :return: record and field name (tuple)
     :rtype: tuple
     """
     try:
-        filtered_value = re.sub('"', '', str(field_value.split()[0])).strip()
-        # print '[' + filtered_value + ']'
-    except (IndexError, AttributeError):
+        link = parse_link(field_value)
+    except (TypeError, AttributeError):
         return None, None  # something is rotten in my kingdom
 
-    # Check whether the filtered value "looks like" a record name.
-    # If that's the case, split the record name and the field name.
-    if compiled_pattern.search(filtered_value):
-        lst = filtered_value.split('.')
-        if len(lst) > 1:
-            return lst[0], lst[1]
-        else:
-            return lst[0], 'VAL'  # field specification was missing, assume VAL
+    # Check whether the record name "looks like" a record name.
+    # The field name is VAL if it's missing.
+    if link.kind == LINK_PV and compiled_pattern.search(link.record):
+        return link.record, link.get_field()
     else:
         return None, None  # not a record name
 
@@ -137,12 +218,12 @@ def remove_duplicates(input_list):
     :return: list without duplicate channel names
     :rtype: list
     """
-    temp_list = []
+    seen = set()
     output_list = []
     for a, b, c in input_list:
-        if a not in temp_list:
+        if a not in seen:
             output_list.append((a, b, c))
-            temp_list.append(a)
+            seen.add(a)
     # print input_list
     return output_list
 
@@ -178,44 +259,306 @@ def read_subs_file(database_name):
         return None
 
 
-def create_index_file(index_file_name, database_list):
+def file_hash(file_name):
+    """
+    Return the SHA1 hash of a file contents.
+    :param file_name: file name
+    :type file_name: str
+    :return: hash (hex digest)
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_state(database_name):
+    """
+    Return the modification time and size of a database file and its macro substitution file.
+    These values are used to detect changes without reading the files. The absolute file name
+    is included as well, for the programs that use the manifest from a different directory.
+    :param database_name: database file name
+    :type database_name: str
+    :return: dictionary with the file state
+    :rtype: dict
+    """
+    st = stat(database_name)
+    subs_filename = splitext(database_name)[0] + '.subs'
+    if exists(subs_filename):
+        subs_st = stat(subs_filename)
+        subs_state = [subs_st.st_mtime_ns, subs_st.st_size]
+    else:
+        subs_state = None
+    return {'mtime': st.st_mtime_ns, 'size': st.st_size, 'subs': subs_state, 'path': abspath(database_name)}
+
+
+def read_manifest(manifest_file_name):
+    """
+    Read the manifest for a system. The manifest is a dictionary indexed by database file name.
+    Each entry contains the file state (see file_state), the file hash and the list of records
+    in the database, as [record name, line number, raw record name] lists (see index_database).
+    An empty dictionary is returned if the manifest cannot be read or was written by a different
+    version of the program.
+    :param manifest_file_name: manifest file name
+    :type manifest_file_name: str
+    :return: manifest
+    :rtype: dict
+    """
+    try:
+        with open(manifest_file_name, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest['databases']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}
+
+
+def write_manifest(manifest_file_name, databases):
+    """
+    Write the manifest for a system
+    :param manifest_file_name: manifest file name
+    :type manifest_file_name: str
+    :param databases: manifest (see read_manifest)
+    :type databases: dict
+    :return: None
+    """
+    with open(manifest_file_name, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'databases': databases}, f)
+
+
+def index_database(database_name):
+    """
+    Return the list of record names in a database file, with the line number where each record starts
+    and the record name as it appears in the file.
+    Macros in the record names are replaced using the macro substitution file (if any).
+    There's no need to replace macros in the record fields since only record names are
+    written to the index files.
+    :param database_name: database file name
+    :type database_name: str
+    :return: list of [record name, line number, raw record name] lists
+    :rtype: list
+    """
+    db = DatabaseFile(file_name=database_name)
+    m = read_subs_file(database_name)
+    record_list = [[r[0], db.record_line_number] for r in db.next_record_name()]
+    db.close()
+    if m is not None:
+        return [[m.replace_macros(r).strip(), n, r] for r, n in record_list]
+    return [[r.strip(), n, r] for r, n in record_list]
+
+
+def plan_index_update(index_file_name, manifest_file_name, database_list, rebuild):
     """
-    Write the index (list of records) for a given system to a disk file.
+    Compare the databases for a given system with its manifest and return the new manifest.
+    Entries for databases that were added or changed since the manifest was written have no
+    record list, and have to be read before calling write_index_file. A database whose
+    modification time or size changed, but whose contents are the same, is not read again.
     :param index_file_name: index file name
     :type index_file_name: str
+    :param manifest_file_name: manifest file name
+    :type manifest_file_name: str
     :param database_list: list of databases for the given system
     :type database_list: list
-    :return:
+    :param rebuild: ignore the manifest and read all the databases
+    :type rebuild: bool
+    :return: new manifest, list of databases to read and list of databases removed
+    :rtype: tuple
     """
-    record_name_list = []
+    old_manifest = {} if rebuild or not exists(index_file_name) else read_manifest(manifest_file_name)
+    new_manifest = {}
+    changed_list = []
     for database_name in database_list:
-        print(database_name)
+        state = file_state(database_name)
+        entry = old_manifest.get(database_name)
+        if entry is not None and all(entry.get(k) == v for k, v in state.items()):
+            new_manifest[database_name] = entry
+            continue
+        digest = file_hash(database_name)
+        if entry is not None and entry.get('hash') == digest and entry.get('subs') == state['subs']:
+            entry.update(state)
+            new_manifest[database_name] = entry
+            continue
+        new_manifest[database_name] = dict(state, hash=digest, records=None)
+        changed_list.append(database_name)
+
+    removed_list = [d for d in old_manifest if d not in new_manifest]
+    return new_manifest, changed_list, removed_list
+
+
+def write_index_file(index_file_name, manifest_file_name, database_list, manifest, changed):
+    """
+    Write the index file for a system from its manifest, so the records in databases that
+    didn't change are kept as they were. The index file is only written if any database was
+    added, changed or removed. The manifest is also written when only the file state changed
+    to avoid computing the hash again.
+    :param index_file_name: index file name
+    :type index_file_name: str
+    :param manifest_file_name: manifest file name
+    :type manifest_file_name: str
+    :param database_list: list of databases for the given system
+    :type database_list: list
+    :param manifest: manifest with the records for all databases
+    :type manifest: dict
+    :param changed: were any databases added, changed or removed?
+    :type changed: bool
+    :return: None
+    """
+    if changed or not exists(index_file_name):
+        f = open(index_file_name, 'w')
+        f.write("\n".join(format_index_line(r[0], d, r[1]) for d in database_list for r in manifest[d]['records']))
+        f.close()
+    if manifest != read_manifest(manifest_file_name):
+        write_manifest(manifest_file_name, manifest)
 
-        # Open database and macro substitution file (if any)
-        db = DatabaseFile(file_name=database_name)
-        m = read_subs_file(database_name)
 
-        # Create a list with all records in the databases
-        record_name_list.extend([r[0] for r in db.next_record_name()])
-        # print record_name_list
+def update_index_file(index_file_name, manifest_file_name, database_list, rebuild):
+    """
+    Bring the index (list of records) for a given system up to date.
+    Only the databases that were added or changed since the manifest was written are read.
+    :param index_file_name: index file name
+    :type index_file_name: str
+    :param manifest_file_name: manifest file name
+    :type manifest_file_name: str
+    :param database_list: list of databases for the given system
+    :type database_list: list
+    :param rebuild: ignore the manifest and read all the databases
+    :type rebuild: bool
+    :return: list of databases read and list of databases removed
+    :rtype: tuple
+    """
+    manifest, changed_list, removed_list = plan_index_update(index_file_name, manifest_file_name,
+                                                             database_list, rebuild)
+    for database_name in changed_list:
+        manifest[database_name]['records'] = index_database(database_name)
+    write_index_file(index_file_name, manifest_file_name, database_list, manifest,
+                     bool(changed_list or removed_list))
+    return changed_list, removed_list
 
-        # Substitute macros if the macro substitution file was defined.
-        # There's no need to replace macros in the record fields since
-        # only record names are written to the index files.
-        if m is not None:
-            record_name_list = [m.replace_macros(r) for r in record_name_list]
 
-    # Write the index file
-    f = open(index_file_name, 'w')
-    f.write("\n".join(str(x.strip()) for x in record_name_list))
-    f.close()
+def scan_database(database_name):
+    """
+    Read a database file and return its record names and the references found in its fields.
+    Macros are replaced using the database macro substitution file (if any).
+    :param database_name: database file name
+    :type database_name: str
+    :return: tuple with the list of [record name, line number, raw record name] lists (see index_database)
+             and the list of (record, field, target record, target field) tuples
+    :rtype: tuple
+    """
+    record_list = []
+    link_list = []
+    db = DatabaseFile(file_name=database_name)
+    m = read_subs_file(database_name)
+    for record in db.next_record():
+        raw_name = record.get_name()
+        record_name = (m.replace_macros(raw_name) if m is not None else raw_name).strip()
+        record_list.append([record_name, db.record_line_number, raw_name])
+        for field_name, field_value in record.get_fields():
+            if m is not None:
+                field_value = m.replace_macros(field_value)
+            target_record_name, target_record_field = parse_field_value(field_value)
+            if target_record_name is not None:
+                link_list.append((record_name, field_name, target_record_name, target_record_field))
+    db.close()
+    return record_list, link_list
 
 
-def build_indices(sys_list, data_directory, index_directory, rebuild):
+def read_database(task):
+    """
+    Worker routine used to read the databases in parallel while building the indices.
+    The links are only extracted if they are needed for the cross reference store.
+    :param task: tuple with the database file name and whether to extract the links
+    :type task: tuple
+    :return: tuple with the database file name, the list of records (see index_database),
+             the list of links (or None) and an error message (or None)
+    :rtype: tuple
+    """
+    database_name, include_links = task
+    try:
+        if include_links:
+            record_list, link_list = scan_database(database_name)
+        else:
+            record_list, link_list = index_database(database_name), None
+        return database_name, record_list, link_list, None
+    except Exception as e:
+        return database_name, None, None, str(e)
+
+
+def read_databases(database_list, include_links, jobs, verbose=True):
+    """
+    Read a list of databases in a process pool. Each database is read by a different worker,
+    so the time to read all the databases is close to the time to read the largest ones.
+    The databases are read in this process, without a pool, if jobs is 1.
+    Progress is reported to the standard error.
+    :param database_list: list of database file names
+    :type database_list: list
+    :param include_links: extract the links as well as the record names?
+    :type include_links: bool
+    :param jobs: number of worker processes (None for the number of cpus)
+    :type jobs: int
+    :param verbose: report progress?
+    :type verbose: bool
+    :return: dictionary indexed by database file name with the values returned by read_database
+    :rtype: dict
+    """
+    output_dict = {}
+    if not database_list:
+        return output_dict
+    tasks = [(database_name, include_links) for database_name in database_list]
+    if jobs == 1:
+        results = map(read_database, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = as_completed([executor.submit(read_database, task) for task in tasks])
+    try:
+        for count, result in enumerate(results, 1):
+            database_name, record_list, link_list, error = result if executor is None else result.result()
+            if verbose:
+                print('[{0}/{1}] {2}'.format(count, len(tasks), database_name), file=sys.stderr)
+            if error is not None:
+                print('Could not read', database_name, error)
+            output_dict[database_name] = (record_list, link_list)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return output_dict
+
+
+def make_index_directory(index_directory):
+    """
+    Make sure the index directory exists. Create it otherwise.
+    :param index_directory: directory where index files are stored/created
+    :type index_directory: str
+    :return: True if the directory exists or was created
+    :rtype: bool
+    """
+    if exists(index_directory):
+        if isfile(index_directory):
+            print('The index directory exists, but is a plain file')
+            return False
+    else:
+        try:
+            makedirs(index_directory)
+        except Exception as e:
+            print('Could not create index directory', str(e))
+            return False
+    return True
+
+
+def build_indices(sys_list, data_directory, index_directory, rebuild, store=None, jobs=None, changes=None,
+                  verbose=True):
     """
     Build the index files for each system in the input list.
-    It creates the index directory and/or index file if they don't exist,
-    or if the rebuild parameter is true.
+    It creates the index directory and/or index file if they don't exist.
+    Index files are updated with the databases that changed since they were built,
+    or built from scratch if the rebuild parameter is true. The cross reference store
+    is updated with the same databases, if specified (and cleared if rebuild is true),
+    and marked as built at the end (see CrossRefStore.is_built).
+    The databases that need to be read for all the systems are read in a process pool.
     :param sys_list: list of systems
     :type sys_list: list
     :param data_directory: directory where database files are stored
@@ -224,54 +567,107 @@ def build_indices(sys_list, data_directory, index_directory, rebuild):
     :type index_directory: str
     :param rebuild: rebuild indices?
     :type rebuild: bool
+    :param store: cross reference store
+    :type store: CrossRefStore
+    :param jobs: number of worker processes (None for the number of cpus)
+    :type jobs: int
+    :param changes: list where the names of the databases read or removed are appended
+    :type changes: list
+    :param verbose: print progress and the index files updated? (errors are always printed)
+    :type verbose: bool
     :return: dictionary with systems per channel
     :rtype: dict
     """
     # print index_directory
 
-    # Make sure the index directory exists. Create it otherwise.
-    # Raise an exception if the index directory cannot be created.
-    if exists(index_directory):
-        if isfile(index_directory):
-            print('The index directory exists, but is a plain file')
-            return None
-    else:
+    # Make sure the index directory exists.
+    if not make_index_directory(index_directory):
+        return None
+
+    # Find the databases that were added, changed or removed in each system.
+    # All databases are read if the index file doesn't exist or if the rebuild flag is set.
+    plans = {}
+    for system in sys_list:
+        database_list = get_database_names(system, data_directory)
+        # print database_list
+        index_file_name = get_index_file_name(system, index_directory)
         try:
-            makedirs(index_directory)
+            manifest, changed_list, removed_list = plan_index_update(index_file_name,
+                                                                     get_manifest_file_name(system, index_directory),
+                                                                     database_list, rebuild)
         except Exception as e:
-            print('Could not create index directory', str(e))
-            return None
+            print('Could not create index file for', system, str(e))
+            continue
+
+        # The store can be out of sync with the manifest if the indices were updated without it
+        # (e.g. with --scan). Databases whose contents differ from the store are read again.
+        if store is not None and not rebuild:
+            stored_hashes = store.get_database_hashes(system)
+            for database_name in database_list:
+                if database_name in manifest and database_name not in changed_list and \
+                        stored_hashes.get(database_name) != manifest[database_name].get('hash'):
+                    changed_list.append(database_name)
+            removed_list.extend([d for d in stored_hashes if d not in manifest and d not in removed_list])
+
+        plans[system] = (database_list, manifest, changed_list, removed_list)
+        if changes is not None:
+            changes.extend(changed_list + removed_list)
+
+    # Read the databases for all the systems at once
+    database_dict = read_databases([d for system in plans for d in plans[system][2]], store is not None, jobs,
+                                   verbose)
+
+    if store is not None and rebuild:
+        store.clear()
 
     channel_directory = {}
 
     # Loop over all systems
     for system in sys_list:
-
-        # Get database file names for the system.
-        # Skip systems with no databases and print a warning.
-        database_list = get_database_names(system, data_directory)
-        # print database_list
-        if not database_list:
-            print('No databases found for', system)
+        if system not in plans:
             continue
+        database_list, manifest, changed_list, removed_list = plans[system]
 
-        # Check whether the index file needs to be rebuilt.
-        # This can happen if it doesn't exist or if the rebuild flag is set.
+        # Update the index file and the store with the databases that were read.
+        # Databases that could not be read are left out of the index.
         index_file_name = get_index_file_name(system, index_directory)
-        if not exists(index_file_name) or rebuild:
-            try:
-                create_index_file(index_file_name, database_list)
-                print('created index file', index_file_name)
-            except Exception as e:
-                print('Could not create index file for', system, str(e))
+        for database_name in changed_list:
+            record_list, link_list = database_dict[database_name]
+            if record_list is None:
+                database_list.remove(database_name)
+                del manifest[database_name]
                 continue
+            manifest[database_name]['records'] = record_list
+            if store is not None:
+                store.remove_database(database_name)
+                store.add_database(system, database_name, [r[0] for r in record_list], link_list,
+                                   manifest[database_name]['hash'])
+        if store is not None:
+            for database_name in removed_list:
+                store.remove_database(database_name)
+            store.commit()
+        try:
+            write_index_file(index_file_name, get_manifest_file_name(system, index_directory),
+                             database_list, manifest, bool(changed_list or removed_list))
+            if verbose and (changed_list or removed_list):
+                print('updated index file', index_file_name, '(' + str(len(changed_list)) + ' read, ' +
+                      str(len(removed_list)) + ' removed)')
+        except Exception as e:
+            print('Could not create index file for', system, str(e))
+            continue
+
+        # Skip systems with no databases and print a warning.
+        if not database_list:
+            if verbose:
+                print('No databases found for', system)
+            continue
 
         # Check whether the index file exits.
         # Skip systems whose index file cannot be read and print a warning.
-        if exists(get_index_file_name(system, index_directory)):
+        if exists(index_file_name):
             try:
                 f = open(index_file_name, 'r')
-                record_name_list = f.read().splitlines()
+                record_name_list = [parse_index_line(line)[0] for line in f.read().splitlines()]
                 f.close()
             except Exception as e:
                 print('Could not read index file for', system, str(e))
@@ -284,9 +680,40 @@ def build_indices(sys_list, data_directory, index_directory, rebuild):
                 else:
                     channel_directory[item] = [system]
 
+    # The store is complete, even if the systems have no records or links
+    if store is not None:
+        store.set_built()
+        store.commit()
+
     return channel_directory
 
 
+def find_duplicates(sys_list, index_directory):
+    """
+    Find the record names defined in more than one system, reading each index file once.
+    :param sys_list: list of systems
+    :type sys_list: list
+    :param index_directory: directory where index files are stored
+    :type index_directory: str
+    :return: dictionary indexed by record name with the list of (system, database, line number)
+             tuples where the record is defined, for duplicate record names only
+    :rtype: dict
+    """
+    location_dict = {}
+    for system in sys_list:
+        index_file_name = get_index_file_name(system, index_directory)
+        if not exists(index_file_name):
+            continue
+        with open(index_file_name, 'r') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    record_name, database_name, line_number = parse_index_line(line)
+                    location_dict.setdefault(record_name, []).append((system, database_name, line_number))
+    return dict([(record_name, locations) for record_name, locations in location_dict.items()
+                 if len(set([location[0] for location in locations])) > 1])
+
+
 # -------------------------------------------------------------------------
 # Cross referencing routines
 # -------------------------------------------------------------------------
@@ -400,10 +827,11 @@ def others_to_system(system, sys_list, database_directory, channel_dict):
     return output_dict
 
 
-def process_system(system, sys_list, database_directory, channel_dict, include_fields):
+def process_system(system, sys_list, database_directory, channel_dict, include_fields, store=None):
     """
     Main cross reference routine.
     It calls the other two cross referencing routines and prints their output.
+    The cross reference store is used instead of scanning the databases if specified.
     :param system: system name
     :type system: str
     :param sys_list: system list
@@ -414,54 +842,317 @@ def process_system(system, sys_list, database_directory, channel_dict, include_f
     :type channel_dict: dict
     :param include_fields:
     :type include_fields: bool
+    :param store: cross reference store
+    :type store: CrossRefStore
     :return: nothing
     """
     # print 'process_system', system, sys_list
+    if store is not None:
+        print_system_to_others(system, store.system_to_others(system), include_fields)
+        print_others_to_system(system, store.others_to_system(system), include_fields)
+        return
     print_system_to_others(system, system_to_others(system, database_directory, channel_dict), include_fields)
     print_others_to_system(system, others_to_system(system, sys_list, database_directory, channel_dict), include_fields)
     return
 
 
+# -------------------------------------------------------------------------
+# Reference matrix routines
+# -------------------------------------------------------------------------
+
+class ReferenceMatrix:
+    """
+    Number of references between every pair of systems, and the list of references (edges).
+    Each edge is a tuple with the source system, source record and field, target system,
+    target record and field. A reference to a record that exists in more than one system
+    is counted once for each system. References to unknown records are ignored.
+    """
+
+    def __init__(self, systems):
+        """
+        :param systems: list of system names
+        :type systems: list
+        """
+        self.systems = sorted(systems)
+        self.counts = {}
+        self.edges = []
+
+    def add_link(self, source_system, record, field, target_record, target_field, channel_dict):
+        """
+        Classify a reference by source and target system and add it to the matrix
+        :param source_system: system containing the reference
+        :type source_system: str
+        :param record: source record name
+        :type record: str
+        :param field: source field name
+        :type field: str
+        :param target_record: target record name
+        :type target_record: str
+        :param target_field: target field name
+        :type target_field: str
+        :param channel_dict: dictionary with systems per channel
+        :type channel_dict: dict
+        """
+        # A system can be listed more than once for a channel (duplicate records), but
+        # the reference is only counted once for each target system
+        seen = set()
+        for target_system in channel_dict.get(target_record, []):
+            if target_system in seen:
+                continue
+            seen.add(target_system)
+            key = (source_system, target_system)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.edges.append((source_system, record, field, target_system, target_record, target_field))
+
+    def get_count(self, source_system, target_system):
+        """
+        :param source_system: system containing the references
+        :type source_system: str
+        :param target_system: system containing the records referenced
+        :type target_system: str
+        :return: number of references
+        :rtype: int
+        """
+        return self.counts.get((source_system, target_system), 0)
+
+    def write_csv(self, f_out=sys.stdout):
+        """
+        Write the matrix in CSV format. There's one row per source system and one column per target system.
+        :param f_out: output file
+        :type f_out: file
+        """
+        writer = csv.writer(f_out)
+        writer.writerow(['source'] + self.systems)
+        for source_system in self.systems:
+            writer.writerow([source_system] + [self.get_count(source_system, t) for t in self.systems])
+
+    def write_edges_csv(self, f_out=sys.stdout):
+        """
+        Write the list of references in CSV format
+        :param f_out: output file
+        :type f_out: file
+        """
+        writer = csv.writer(f_out)
+        writer.writerow(['source_system', 'record', 'field', 'target_system', 'target_record', 'target_field'])
+        writer.writerows(self.edges)
+
+    def write_json(self, f_out=sys.stdout):
+        """
+        Write the matrix and the list of references in JSON format
+        :param f_out: output file
+        :type f_out: file
+        """
+        json.dump({
+            'systems': self.systems,
+            'matrix': [[self.get_count(s, t) for t in self.systems] for s in self.systems],
+            'edges': [{'source_system': s, 'record': r, 'field': f,
+                       'target_system': ts, 'target_record': tr, 'target_field': tf}
+                      for s, r, f, ts, tr, tf in self.edges]
+        }, f_out, indent=2)
+        f_out.write('\n')
+
+    def write_dot(self, f_out=sys.stdout):
+        """
+        Write the matrix as a graphviz directed graph. References within a system are not included.
+        :param f_out: output file
+        :type f_out: file
+        """
+        f_out.write('digraph crossref {\n')
+        for system in self.systems:
+            f_out.write('  "{0}";\n'.format(system))
+        for source_system, target_system in sorted(self.counts):
+            if source_system != target_system:
+                f_out.write('  "{0}" -> "{1}" [label="{2}"];\n'.format(source_system, target_system,
+                                                                       self.counts[(source_system,
+                                                                                    target_system)]))
+        f_out.write('}\n')
+
+
+def build_matrix(sys_list, data_directory, channel_dict, store=None, jobs=None):
+    """
+    Build the reference matrix for all the systems. The links are read from the cross
+    reference store if specified. Otherwise all the databases are read, each one once.
+    :param sys_list: list of systems
+    :type sys_list: list
+    :param data_directory: directory where database files are stored
+    :type data_directory: str
+    :param channel_dict: dictionary with systems per channel
+    :type channel_dict: dict
+    :param store: cross reference store
+    :type store: CrossRefStore
+    :param jobs: number of worker processes (None for the number of cpus)
+    :type jobs: int
+    :return: reference matrix
+    :rtype: ReferenceMatrix
+    """
+    matrix = ReferenceMatrix(sys_list)
+    if store is not None:
+        for source_system, record, field, target_record, target_field in store.next_link():
+            matrix.add_link(source_system, record, field, target_record, target_field, channel_dict)
+    else:
+        database_systems = dict([(d, system) for system in sys_list
+                                 for d in get_database_names(system, data_directory)])
+        database_dict = read_databases(sorted(database_systems), True, jobs)
+        for database_name in sorted(database_dict):
+            link_list = database_dict[database_name][1] or []
+            for record, field, target_record, target_field in link_list:
+                matrix.add_link(database_systems[database_name], record, field, target_record, target_field,
+                                channel_dict)
+    return matrix
+
+
+def write_matrix(matrix, p_args):
+    """
+    Write the reference matrix in the format selected in the command line
+    :param matrix: reference matrix
+    :type matrix: ReferenceMatrix
+    :param p_args: command line arguments
+    :type p_args: argparse.Namespace
+    """
+    f_out = open(p_args.output, 'w') if p_args.output else sys.stdout
+    try:
+        if p_args.output_format == FORMAT_JSON:
+            matrix.write_json(f_out)
+        elif p_args.output_format == FORMAT_DOT:
+            matrix.write_dot(f_out)
+        else:
+            matrix.write_csv(f_out)
+    finally:
+        if f_out is not sys.stdout:
+            f_out.close()
+    if p_args.edges:
+        with open(p_args.edges, 'w') as f:
+            matrix.write_edges_csv(f)
+
+
 # -------------------------------------------------------------------------
 # Formatted output routines
 # -------------------------------------------------------------------------
 
-def print_system_to_others(system, input_list, include_fields):
+def format_system_to_others(system, input_list, include_fields):
     """
+    Generator that returns the output lines for the references from a system to other systems.
+    The references are sorted by target record name. Only the first reference to each target
+    record is included if the fields are not included.
     :param system: system name
     :type system: str
     :param input_list: list of tuples with cross references
     :type input_list: list
     :param include_fields: include fields in output?
     :type include_fields: bool
-    :return: nothing
+    :return: output line
+    :rtype: str
     """
-    print('-' * 80)
-    print('References from ' + system + ' to ' + 'other systems:')
-    if include_fields:
-        for target_record, target_field, source_record, source_field, sys_list in sorted(input_list,
-                                                                                         key=lambda t: t[0]):
-            # print target_record, target_field, source_record, source_field, system_list
-            # full_target = target_record + '.' + target_field
-            sys_names = ','.join(str(x) for x in sys_list)
-            print('  {0:35s} {1:35s} {2:s}'.format(target_record + '.' + target_field,
+    yield '-' * 80
+    yield 'References from ' + system + ' to ' + 'other systems:'
+    seen = set()
+    for target_record, target_field, source_record, source_field, sys_list in sorted(input_list,
+                                                                                     key=lambda t: t[0]):
+        sys_names = ','.join(str(x) for x in sys_list)
+        if include_fields:
+            yield '  {0:35s} {1:35s} {2:s}'.format(target_record + '.' + target_field,
                                                    source_record + '.' + source_field,
-                                                   sys_names))
-    else:
-        aux_list = []
-        for target_record, target_field, source_record, source_field, sys_list in sorted(input_list,
-                                                                                         key=lambda t: t[0]):
-            # print target_record, target_field, source_record, source_field, system_list
-            if target_record in aux_list:
-                continue
+                                                   sys_names)
+        elif target_record not in seen:
+            seen.add(target_record)
+            yield '  {0:30s} {1:s}'.format(target_record, sys_names)
+
+
+def format_others_to_system(system, input_dict, include_fields):
+    """
+    Generator that returns the output lines for the references to a system from other systems.
+    The references are grouped by system. Only the first reference to each target record in
+    each system is included if the fields are not included.
+    :param system: system name
+    :type system: str
+    :param input_dict: dictionary indexed by system name with lists of tuples with cross references
+    :type input_dict: dict
+    :param include_fields: include fields in output?
+    :type include_fields: bool
+    :return: output line
+    :rtype: str
+    """
+    yield '-' * 80
+    yield 'References to ' + system + ' from other systems:'
+    last_system = None
+    seen = set()
+    for other_system, target_record, target_field, source_record, source_field in \
+            sorted([(s,) + t for s in input_dict for t in input_dict[s]]):
+        if other_system != last_system:
+            yield other_system
+            last_system = other_system
+            seen = set()
+        if include_fields:
+            yield '  {0:35s}  {1:35s}'.format(target_record + '.' + target_field,
+                                              source_record + '.' + source_field)
+        elif target_record not in seen:
+            seen.add(target_record)
+            yield '  {0:s}'.format(target_record)
+
+
+def print_duplicates(duplicate_dict, f_out=sys.stdout):
+    """
+    Print the record names defined in more than one system, with their locations
+    :param duplicate_dict: dictionary returned by find_duplicates
+    :type duplicate_dict: dict
+    :param f_out: output file
+    :type f_out: file
+    :return: nothing
+    """
+    for record_name in sorted(duplicate_dict):
+        f_out.write(record_name + '\n')
+        for system, database_name, line_number in duplicate_dict[record_name]:
+            if database_name is None:
+                location = 'unknown location (rebuild the indices)'
             else:
-                aux_list.append(target_record)
-            sys_names = ','.join(str(x) for x in sys_list)
-            print('  {0:30s} {1:s}'.format(target_record, sys_names))
-    return
+                location = database_name if line_number is None else database_name + ':' + str(line_number)
+            f_out.write('  {0:10s} {1:s}\n'.format(system, location))
+
+
+def print_matching_records(record_index, pattern, f_out=sys.stdout):
+    """
+    Print the records matching a glob pattern, with the systems and databases where they are defined
+    :param record_index: record name index
+    :type record_index: RecordNameIndex
+    :param pattern: glob pattern
+    :type pattern: str
+    :param f_out: output file
+    :type f_out: file
+    :return: nothing
+    """
+    for record_name in record_index.glob(pattern):
+        for system, database_name, line_number in record_index.get(record_name):
+            f_out.write('{0:40s} {1:10s} {2:s}:{3}\n'.format(record_name, system, database_name, line_number))
+
+
+def write_lines(lines, f_out=sys.stdout):
+    """
+    Write the lines returned by a generator to the output file as they are produced
+    :param lines: iterable with output lines
+    :type lines: iterable
+    :param f_out: output file
+    :type f_out: file
+    """
+    for line in lines:
+        f_out.write(line + '\n')
+
+
+def print_system_to_others(system, input_list, include_fields, f_out=sys.stdout):
+    """
+    :param system: system name
+    :type system: str
+    :param input_list: list of tuples with cross references
+    :type input_list: list
+    :param include_fields: include fields in output?
+    :type include_fields: bool
+    :param f_out: output file
+    :type f_out: file
+    :return: nothing
+    """
+    write_lines(format_system_to_others(system, input_list, include_fields), f_out)
 
 
-def print_others_to_system(system, input_dict, include_fields):
+def print_others_to_system(system, input_dict, include_fields, f_out=sys.stdout):
     """
     :param system:
     :type system: str
@@ -469,29 +1160,11 @@ def print_others_to_system(system, input_dict, include_fields):
     :type input_dict: dict
     :param include_fields: include fields in output?
     :type include_fields: bool
+    :param f_out: output file
+    :type f_out: file
     :return:
     """
-    print('-' * 80)
-    # print input_dict
-    print('References to ' + system + ' from other systems:')
-    if include_fields:
-        for system in sorted(input_dict):
-            print(system)
-            for target_record, target_field, source_record, source_field in sorted(input_dict[system]):
-                print('  {0:35s}  {1:35s}'.format(target_record + '.' + target_field,
-                                                  source_record + '.' + source_field))
-    else:
-        for system in sorted(input_dict):
-            print(system)
-            aux_list = []
-            for target_record, target_field, source_record, source_field in sorted(input_dict[system]):
-                # print target_record, aux_list
-                if target_record in aux_list:
-                    continue
-                else:
-                    aux_list.append(target_record)
-                print('  {0:s}'.format(target_record))
-    return
+    write_lines(format_others_to_system(system, input_dict, include_fields), f_out)
 
 
 # -------------------------------------------------------------------------
@@ -510,11 +1183,48 @@ def get_args(argv):
     parser = ArgumentParser()
 
     parser.add_argument(action='store',
-                        nargs=1,
+                        nargs='?',
                         dest='system',
-                        default=[],
+                        default=None,
                         help='system name')
 
+    parser.add_argument('-a', '--all',
+                        action='store_true',
+                        dest='all',
+                        default=False,
+                        help='write the reference matrix for all systems instead default=(False)')
+
+    parser.add_argument('-m', '--match',
+                        action='store',
+                        dest='match',
+                        default='',
+                        help='list the records matching a glob pattern instead')
+
+    parser.add_argument('--duplicates',
+                        action='store_true',
+                        dest='duplicates',
+                        default=False,
+                        help='list the record names defined in more than one system instead')
+
+    parser.add_argument('--format',
+                        action='store',
+                        dest='output_format',
+                        choices=[FORMAT_CSV, FORMAT_JSON, FORMAT_DOT],
+                        default=FORMAT_CSV,
+                        help='reference matrix output format default=(' + FORMAT_CSV + ')')
+
+    parser.add_argument('-o', '--output',
+                        action='store',
+                        dest='output',
+                        default='',
+                        help='reference matrix output file default=(standard output)')
+
+    parser.add_argument('--edges',
+                        action='store',
+                        dest='edges',
+                        default='',
+                        help='write the list of references to a file in CSV format')
+
     parser.add_argument('-d', '--data_directory',
                         action='store',
                         dest='data',
@@ -533,6 +1243,19 @@ def get_args(argv):
                         default=False,
                         help='rebuild index files default=(False)')
 
+    parser.add_argument('-j', '--jobs',
+                        action='store',
+                        type=int,
+                        dest='jobs',
+                        default=None,
+                        help='number of worker processes used to build the indices [default=number of cpus]')
+
+    parser.add_argument('-s', '--scan',
+                        action='store_true',
+                        dest='scan',
+                        default=False,
+                        help='scan the database files instead of using the cross reference store default=(False)')
+
     parser.add_argument('-f', '--fields',
                         action='store_true',
                         dest='fields',
@@ -559,20 +1282,33 @@ if __name__ == '__main__':
     # print args
 
     # Get system name. This is the system that be cross checked.
-    system_name = args.system[0]
+    system_name = args.system
     # print system_name
+    if system_name is None and not (args.all or args.match or args.duplicates):
+        print('A system name, the --all, --match or --duplicates option is required')
+        exit(1)
 
     # Get system list from the data directory and check whether the
     # system name to run a crosscheck on is in that list
     system_list = get_system_list(args.data)
     # print system_list
-    if system_name not in system_list:
+    if not (args.all or args.match or args.duplicates) and system_name not in system_list:
         print('No data for that system found')
         exit(1)
 
+    # Open the cross reference store. It's updated along with the index files.
+    # Since all the databases have to be read to fill a store that was never built,
+    # the indices are rebuilt as well in that case.
+    xref_store = None
+    rebuild = args.rebuild
+    if not args.scan and make_index_directory(args.indices):
+        xref_store = CrossRefStore(get_store_file_name(args.indices))
+        rebuild = rebuild or not xref_store.is_built()
+
     # Read the index files for all systems in the system list.
     # The indices will be rebuilt if args.rebuild is true.
-    channel_indices = build_indices(system_list, args.data, args.indices, args.rebuild)
+    channel_indices = build_indices(system_list, args.data, args.indices, rebuild,
+                                    store=xref_store, jobs=args.jobs)
     if channel_indices is None:
         print('No index files could be read')
         exit(1)
@@ -581,7 +1317,16 @@ if __name__ == '__main__':
     # print len(channel_indices)
     # print_sorted_dictionary(channel_indices)
 
-    # Run the crosscheck
-    process_system(system_name, system_list, args.data, channel_indices, args.fields)
+    # Run the crosscheck, list the matching or duplicate records or build the matrix for all systems
+    if args.duplicates:
+        print_duplicates(find_duplicates(system_list, args.indices))
+    elif args.match:
+        print_matching_records(read_record_index(args.indices), args.match)
+    elif args.all:
+        write_matrix(build_matrix(system_list, args.data, channel_indices, store=xref_store, jobs=args.jobs), args)
+    else:
+        process_system(system_name, system_list, args.data, channel_indices, args.fields, store=xref_store)
+    if xref_store is not None:
+        xref_store.close()
 
     exit(0)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Cross reference query server.
+
+The server keeps the channel index (systems per record) and all the links between records in
+memory, and answers cross reference queries over a Unix socket. It uses the same index files
+and cross reference store as crossref, and it updates them in the background at regular
+intervals with the databases that were added, changed or removed.
+
+The protocol is one JSON object per line in both directions. Requests have a "query" key
+and the parameters for the query:
+
+  {"query": "references", "record": NAME}     references to a record from any system
+  {"query": "record", "record": NAME}         systems where a record is defined
+  {"query": "system_to_others", "system": S}  references from a system to other systems
+  {"query": "others_to_system", "system": S}  references to a system from other systems
+  {"query": "status"}                         number of records and links, last reload time
+  {"query": "reload"}                         update the indices now
+
+Responses contain a "result" key, or an "error" key with an error message.
+The same program can be used as a client to send a single query (--query option).
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import socketserver
+from os.path import exists, join
+from argparse import ArgumentParser, SUPPRESS
+from xrefstore import CrossRefStore
+from crossref import DEFAULT_DATABASE_DIRECTORY, DEFAULT_INDEX_DIRECTORY, get_system_list, get_store_file_name, \
+    make_index_directory, build_indices
+
+# Name of the socket file (in the index directory)
+SOCKET_FILE_NAME = 'crossrefd.sock'
+
+# Default time between background updates (seconds)
+DEFAULT_INTERVAL = 60
+
+# Variable used to control printing of debug output.
+debug_flag = False
+
+
+class CrossRefSnapshot:
+    """
+    In memory copy of the channel index and the links between records.
+    Snapshots are never modified after they are built. A new snapshot is built
+    when the databases change, and replaces the old one.
+    """
+
+    def __init__(self, channel_dict, store):
+        """
+        :param channel_dict: dictionary with systems per channel
+        :type channel_dict: dict
+        :param store: cross reference store with the links
+        :type store: CrossRefStore
+        """
+        self.channel_dict = channel_dict
+        self.links_by_source = {}
+        self.links_by_target = {}
+        self.links_by_target_system = {}  # target system -> source system -> list of links
+        self.link_count = 0
+        self.time = time.time()
+        for system, record, field, target_record, target_field in store.next_link():
+            self.links_by_source.setdefault(system, []).append((record, field, target_record, target_field))
+            self.links_by_target.setdefault(target_record, []).append((system, record, field, target_field))
+            for target_system in set(channel_dict.get(target_record, [])):
+                if target_system != system:
+                    self.links_by_target_system.setdefault(target_system, {}).setdefault(system, []).append(
+                        (target_record, target_field, record, field))
+            self.link_count += 1
+
+    def references(self, record_name):
+        """
+        :param record_name: record name
+        :type record_name: str
+        :return: list of references to the record
+        :rtype: list
+        """
+        return [{'system': system, 'record': record, 'field': field, 'target_field': target_field}
+                for system, record, field, target_field in self.links_by_target.get(record_name, [])]
+
+    def record(self, record_name):
+        """
+        :param record_name: record name
+        :type record_name: str
+        :return: list of systems where the record is defined
+        :rtype: list
+        """
+        return self.channel_dict.get(record_name, [])
+
+    def system_to_others(self, system):
+        """
+        Return the references from a system to records in other systems.
+        The output has the same format as crossref.system_to_others.
+        :param system: system name
+        :type system: str
+        :return: list of (target record, target field, source record, source field, list of systems)
+        :rtype: list
+        """
+        output_list = []
+        for record, field, target_record, target_field in self.links_by_source.get(system, []):
+            systems = self.channel_dict.get(target_record)
+            if systems and system not in systems:
+                output_list.append((target_record, target_field, record, field, systems))
+        return output_list
+
+    def others_to_system(self, system):
+        """
+        Return the references from other systems to records in a system.
+        The output has the same format as crossref.others_to_system.
+        The references are grouped by target system when the snapshot is built.
+        :param system: system name
+        :type system: str
+        :return: dictionary indexed by system name with lists of
+                 (target record, target field, source record, source field) tuples
+        :rtype: dict
+        """
+        return self.links_by_target_system.get(system, {})
+
+
+class CrossRefServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server that answers queries using the current snapshot.
+    The snapshot is updated by a background thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_file_name, data_directory, index_directory, interval):
+        """
+        Build the first snapshot and start listening on the socket.
+        :param socket_file_name: socket file name
+        :type socket_file_name: str
+        :param data_directory: directory where database files are stored
+        :type data_directory: str
+        :param index_directory: directory where index files are stored
+        :type index_directory: str
+        :param interval: time between background updates (seconds)
+        :type interval: float
+        """
+        self.data_directory = data_directory
+        self.index_directory = index_directory
+        self.interval = interval
+        self.snapshot = None
+        self.reload_lock = threading.Lock()
+        self.reload_event = threading.Event()
+        self.reload(rebuild=False, jobs=None, verbose=True)
+        if exists(socket_file_name):
+            os.remove(socket_file_name)
+        socketserver.UnixStreamServer.__init__(self, socket_file_name, CrossRefRequestHandler)
+
+    def reload(self, rebuild=False, jobs=1, verbose=False):
+        """
+        Update the index files and the store with the databases that changed, and build
+        a new snapshot if there were any changes. It runs in the thread that calls it, and
+        opens its own connection to the store since connections cannot be shared by threads.
+        By default the databases are read in the calling thread without any progress output,
+        since forking a process pool from the server threads is not safe. Only the first
+        load, before the server starts, uses a process pool.
+        :param rebuild: rebuild the indices from scratch?
+        :type rebuild: bool
+        :param jobs: number of worker processes (None for the number of cpus, 1 for no pool)
+        :type jobs: int
+        :param verbose: print progress and the index files updated?
+        :type verbose: bool
+        :return: number of databases read or removed
+        :rtype: int
+        """
+        with self.reload_lock:
+            if not make_index_directory(self.index_directory):
+                raise IOError('Could not create index directory ' + self.index_directory)
+            store = CrossRefStore(get_store_file_name(self.index_directory))
+            try:
+                rebuild = rebuild or not store.is_built()
+                changes = []
+                channel_dict = build_indices(get_system_list(self.data_directory), self.data_directory,
+                                             self.index_directory, rebuild, store=store, jobs=jobs,
+                                             changes=changes, verbose=verbose)
+                if channel_dict is None:
+                    raise IOError('No index files could be read')
+                if changes or self.snapshot is None:
+                    self.snapshot = CrossRefSnapshot(channel_dict, store)
+                    if debug_flag:
+                        print('new snapshot', len(channel_dict), 'records', self.snapshot.link_count, 'links')
+            finally:
+                store.close()
+            return len(changes)
+
+    def reload_loop(self):
+        """
+        Background thread that updates the snapshot at regular intervals.
+        Errors are printed and the previous snapshot is kept.
+        """
+        while not self.reload_event.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print('Could not update the indices', str(e))
+
+    def start_reload_thread(self):
+        """
+        Start the background update thread
+        """
+        thread = threading.Thread(target=self.reload_loop, daemon=True)
+        thread.start()
+
+    def server_close(self):
+        """
+        Stop the background update thread, close the socket and remove the socket file
+        """
+        self.reload_event.set()
+        socketserver.UnixStreamServer.server_close(self)
+        if exists(self.server_address):
+            os.remove(self.server_address)
+
+    def process_request_line(self, line):
+        """
+        Answer a single request
+        :param line: request (JSON)
+        :type line: str
+        :return: response
+        :rtype: dict
+        """
+        try:
+            request = json.loads(line)
+            query = request['query']
+            snapshot = self.snapshot
+            if query == 'references':
+                result = snapshot.references(request['record'])
+            elif query == 'record':
+                result = snapshot.record(request['record'])
+            elif query == 'system_to_others':
+                result = snapshot.system_to_others(request['system'])
+            elif query == 'others_to_system':
+                result = snapshot.others_to_system(request['system'])
+            elif query == 'status':
+                result = {'records': len(snapshot.channel_dict), 'links': snapshot.link_count,
+                          'time': snapshot.time}
+            elif query == 'reload':
+                result = {'changes': self.reload()}
+            else:
+                return {'error': 'unknown query ' + str(query)}
+            return {'result': result}
+        except (ValueError, TypeError) as e:
+            return {'error': 'invalid request ' + str(e)}
+        except KeyError as e:
+            return {'error': 'missing parameter ' + str(e)}
+        except Exception as e:
+            return {'error': str(e)}
+
+
+class CrossRefRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Read requests from a client, one per line, and write the responses
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.decode().strip()
+            if not line:
+                continue
+            if debug_flag:
+                print('request', line)
+            response = self.server.process_request_line(line)
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+def send_query(socket_file_name, request):
+    """
+    Send a request to the server and return the response
+    :param socket_file_name: socket file name
+    :type socket_file_name: str
+    :param request: request
+    :type request: dict
+    :return: response
+    :rtype: dict
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_file_name)
+        s.sendall((json.dumps(request) + '\n').encode())
+        f = s.makefile('rb')
+        return json.loads(f.readline().decode())
+    finally:
+        s.close()
+
+
+def get_args(argv):
+    """
+    Process command line arguments
+    :param argv: command line arguments from sys.argv
+    :type argv: list
+    :return: arguments
+    :rtype: argparse.Namespace
+    """
+
+    parser = ArgumentParser(epilog='Run the server if no query is specified')
+
+    parser.add_argument('-d', '--data_directory',
+                        action='store',
+                        dest='data',
+                        default=DEFAULT_DATABASE_DIRECTORY,
+                        help='data directory default=(' + DEFAULT_DATABASE_DIRECTORY + ')')
+
+    parser.add_argument('-i', '--index_directory',
+                        action='store',
+                        dest='indices',
+                        default=DEFAULT_INDEX_DIRECTORY,
+                        help='index directory default=(' + DEFAULT_INDEX_DIRECTORY + ')')
+
+    parser.add_argument('--socket',
+                        action='store',
+                        dest='socket',
+                        default='',
+                        help='socket file default=(index directory/' + SOCKET_FILE_NAME + ')')
+
+    parser.add_argument('--interval',
+                        action='store',
+                        type=float,
+                        dest='interval',
+                        default=DEFAULT_INTERVAL,
+                        help='seconds between index updates default=(' + str(DEFAULT_INTERVAL) + ')')
+
+    parser.add_argument('-q', '--query',
+                        action='store',
+                        nargs='+',
+                        dest='query',
+                        default=None,
+                        metavar='ARG',
+                        help='send a query to the server: references|record NAME, '
+                             'system_to_others|others_to_system SYSTEM, status or reload')
+
+    parser.add_argument('--debug',
+                        action='store_true',
+                        dest='debug',
+                        default=False,
+                        help=SUPPRESS)
+
+    return parser.parse_args(argv[1:])
+
+
+def query_request(query):
+    """
+    Convert the query arguments from the command line into a request
+    :param query: query name followed by its parameter
+    :type query: list
+    :return: request
+    :rtype: dict
+    """
+    request = {'query': query[0]}
+    if len(query) > 1:
+        if query[0] in ('system_to_others', 'others_to_system'):
+            request['system'] = query[1]
+        else:
+            request['record'] = query[1]
+    return request
+
+
+if __name__ == '__main__':
+    args = get_args(sys.argv)
+    debug_flag = args.debug
+    socket_file = args.socket if args.socket else join(args.indices, SOCKET_FILE_NAME)
+
+    if args.query:
+        try:
+            print(json.dumps(send_query(socket_file, query_request(args.query)), indent=2))
+        except (OSError, IOError) as e:
+            print('Could not connect to the server', str(e), file=sys.stderr)
+            exit(2)
+        exit(0)
+
+    try:
+        server = CrossRefServer(socket_file, args.data, args.indices, args.interval)
+    except (OSError, IOError) as e:
+        print(e, file=sys.stderr)
+        exit(2)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server.start_reload_thread()
+    print('listening on', socket_file)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    exit(0)
@@ -28,16 +28,29 @@ There are three main routines that can be called from an application program:
 
   * read_database: Read the whole database into an EpicsDatabase object.
 
+  * next_sorted_record: returns the records in the file sorted by name. Large files are
+    sorted externally (in chunks written to temporary files) to keep memory usage bounded.
+
+The line number where the last record returned by next_record or next_record_name starts is
+kept in the record_line_number member.
+
 Field names and values and stored as tuples (there's no RecordField class).
 """
 import sys
 import re
+import heapq
+import hashlib
+import tempfile
 from io import IOBase
 
 # Values passed to tell the user defined filter routine what part of a record is being processed
 FILTER_RECORD = 1
 FILTER_FIELD = 2
 
+# Maximum number of records kept in memory by DatabaseFile.next_sorted_record().
+# Larger files are sorted in chunks of this size that are merged afterwards.
+SORT_CHUNK_SIZE = 10000
+
 
 def format_record_start(record_name, record_type):
     """
@@ -109,6 +122,8 @@ class DatabaseFile:
             self.f = open(str(file_name), 'r')
         self.file_name = file_name
         self.filter = filter_function
+        self.line_number = 0
+        self.record_line_number = 0
 
     def __str__(self):
         """
@@ -223,11 +238,13 @@ class DatabaseFile:
         :rtype: tuple
         """
         for line in self.f:
+            self.line_number += 1
             line = line.rstrip('\n')
             # print '--', line
             record_name, record_type = self._extract_record_name_and_type(line)
             # print '++', record_name, record_type
             if record_name and record_type:
+                self.record_line_number = self.line_number
                 yield record_name, record_type
 
     def next_record(self):
@@ -243,8 +260,10 @@ class DatabaseFile:
         """
         record = None
         state = self.STATE_START
+        start_line_number = 0
 
         for line in self.f:
+            self.line_number += 1
             line = line.rstrip()
             # print '--', line
 
@@ -257,6 +276,7 @@ class DatabaseFile:
                     # print record_name, record_type
                     state = self.STATE_RECORD
                     record = EpicsRecord(record_name, record_type)  # create record object
+                    start_line_number = self.line_number
 
             elif state == self.STATE_RECORD:
                 # If the line contains a field definition then add the field name and value
@@ -267,10 +287,65 @@ class DatabaseFile:
                     record.add_field(field_name, field_value)  # found a field declaration
                 elif self._record_end(line):
                     state = self.STATE_START
+                    self.record_line_number = start_line_number
                     yield record
                 else:
                     pass  # unknown line, ignore
 
+    def next_sorted_record(self, chunk_size=SORT_CHUNK_SIZE):
+        """
+        Read the records from the database file and return them sorted by record name.
+        At most chunk_size records are kept in memory at any time. Each chunk is sorted and
+        written to a temporary file, and the chunks are merged when the end of the file is reached.
+        Records with the same name are returned in the same order as they appear in the file.
+        This routine is implemented as a Python generator to allow using it in loops.
+        :param chunk_size: maximum number of records sorted in memory
+        :type chunk_size: int
+        :return: next record in sorted order
+        :rtype: EpicsRecord
+        """
+        chunk_files = []
+        chunk = []
+        try:
+            for record in self.next_record():
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    chunk_files.append(self._write_chunk(chunk))
+                    chunk = []
+
+            # Avoid temporary files altogether when the whole file fits in one chunk
+            if not chunk_files:
+                for record in sorted(chunk, key=EpicsRecord.get_name):
+                    yield record
+                return
+
+            if chunk:
+                chunk_files.append(self._write_chunk(chunk))
+                chunk = []
+
+            iterators = [DatabaseFile(f_in=f).next_record() for f in chunk_files]
+            for record in heapq.merge(*iterators, key=EpicsRecord.get_name):
+                yield record
+        finally:
+            for f in chunk_files:
+                f.close()
+
+    @staticmethod
+    def _write_chunk(record_list):
+        """
+        Auxiliary routine used by next_sorted_record() to sort a list of records
+        and write them to a temporary file. The file is deleted when closed.
+        :param record_list: list of records
+        :type record_list: list
+        :return: temporary file, positioned at the beginning
+        :rtype: file
+        """
+        f = tempfile.TemporaryFile(mode='w+')
+        for record in sorted(record_list, key=EpicsRecord.get_name):
+            record.write_record(f_out=f)
+        f.seek(0)
+        return f
+
     def read_database(self):
         """
         Read the entire database file into memory.
@@ -392,6 +467,7 @@ class EpicsRecord:
             raise TypeError('the record name and type must be strings')
         self.field_names = []
         self.field_values = {}
+        self.hash = None
 
     def get_name(self):
         """
@@ -449,6 +525,23 @@ class EpicsRecord:
         """
         self.field_names.append(field_name)
         self.field_values[field_name] = field_value
+        self.hash = None
+
+    def get_hash(self):
+        """
+        Return a hash of the record contents (record type, field names and field values).
+        The record name and the order of the fields are not included, so records with the
+        same contents will have the same hash even if they were renamed or their fields
+        were reordered. The hash is computed once and cached until a field is added.
+        :return: record hash (hexadecimal string)
+        :rtype: str
+        """
+        if self.hash is None:
+            h = hashlib.sha1(self.type.encode())
+            for field_name in sorted(self.field_values):
+                h.update(b'\0' + field_name.encode() + b'\0' + self.field_values[field_name].encode())
+            self.hash = h.hexdigest()
+        return self.hash
 
     def write_record(self, f_out=sys.stdout):
         """
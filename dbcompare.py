@@ -0,0 +1,758 @@
+"""
+This module implements the database comparison engine used by dbdiff.
+
+1. DiffResult:
+
+This class stores the differences between two databases. It provides the routines to render
+the differences as text (the traditional dbdiff output), JSON or CSV. The following differences
+are stored:
+(1) Records that are present only in one of the databases
+(2) Records common to the two databases that have a different record type
+(3) Fields that are not common for the same record
+(4) Differences in the field values
+
+2. Comparison routines:
+
+  * compare_records: compare two records with the same name.
+
+  * compare_databases: compare two EpicsDatabase objects.
+
+  * compare_sorted_records: compare two streams of records sorted by name (merge join).
+
+Each common record is walked only once. Records whose hashes are equal are counted as
+identical and skipped without comparing their fields.
+
+3. FieldNormalizer:
+
+An optional normalization stage used by the comparison routines. All the field values in a record
+are normalized in one pass: numeric values are parsed and compared numerically within a tolerance
+(e.g. 0.000000000000000e+00 and 0 are equal), and fields set to the default value for the record
+type (from a dbd file) are treated as absent.
+
+4. TreeDiffResult:
+
+This class collects the DiffResult objects for all the database files in two directory trees.
+It detects records that were moved between files or renamed by comparing the records that
+are present in only one of the trees, using the record hashes as content fingerprints.
+
+5. MergeResult and merge_databases:
+
+Three-way merge of two databases (ours and theirs) derived from a common base database.
+Records are merged using their hashes, so only records changed in both databases are
+merged field by field. Conflicts are stored in MergeResult and can be printed as text or JSON.
+"""
+import re
+import sys
+import csv
+import json
+import math
+from db import EpicsDatabase, EpicsRecord
+from dbd import DbdFile, LINK_FIELD_TYPES
+
+# Indentation used when printing differences
+FIRST_INDENT = ' ' * 2
+SECOND_INDENT = ' ' * 5
+
+# Default tolerance used to compare numeric field values (relative and absolute)
+DEFAULT_TOLERANCE = 1e-9
+
+# Regular expression used to recognize numeric field values. It's precompiled for speed.
+NUMBER_PATTERN = re.compile(r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+
+# Types of merge conflicts
+CONFLICT_FIELD = 'field'  # field value changed in both databases
+CONFLICT_TYPE = 'type'  # record type changed in both databases
+CONFLICT_DELETE = 'delete'  # record deleted in one database and changed in the other
+
+# Values used in the first column of the CSV output to identify the type of difference
+CSV_ONLY_IN_1 = 'only_in_1'
+CSV_ONLY_IN_2 = 'only_in_2'
+CSV_TYPE = 'type'
+CSV_FIELD_ONLY_IN_1 = 'field_only_in_1'
+CSV_FIELD_ONLY_IN_2 = 'field_only_in_2'
+CSV_VALUE = 'value'
+CSV_MOVED = 'moved'
+CSV_RENAMED = 'renamed'
+CSV_FILE_ONLY_IN_1 = 'file_only_in_1'
+CSV_FILE_ONLY_IN_2 = 'file_only_in_2'
+CSV_ERROR = 'error'
+
+# CSV output header
+CSV_HEADER = ['difference', 'record', 'field', 'value1', 'value2']
+
+
+class DiffResult:
+    """
+    This class stores the differences between two databases.
+    The differences are stored in lists that are sorted by record name when rendered.
+    """
+
+    def __init__(self, file_name1='', file_name2=''):
+        """
+        :param file_name1: name of the first database (for messages)
+        :type file_name1: str
+        :param file_name2: name of the second database (for messages)
+        :type file_name2: str
+        """
+        self.file_name1 = file_name1
+        self.file_name2 = file_name2
+        self.only_in_1 = []  # record names
+        self.only_in_2 = []  # record names
+        self.type_differences = []  # (record name, type 1, type 2)
+        self.field_name_differences = []  # (record name, fields only in 1, fields only in 2)
+        self.field_value_differences = []  # (record name, field name, value 1, value 2)
+        self.identical_count = 0  # number of common records with the same contents
+
+    def __str__(self):
+        """
+        Return the string representation of the diff result object
+        :return: string representation
+        :rtype: str
+        """
+        return '<DiffResult ' + self.file_name1 + ' ' + self.file_name2 + \
+               ' only_in_1=' + str(len(self.only_in_1)) + \
+               ' only_in_2=' + str(len(self.only_in_2)) + \
+               ' types=' + str(len(self.type_differences)) + \
+               ' fields=' + str(len(self.field_name_differences)) + \
+               ' values=' + str(len(self.field_value_differences)) + '>'
+
+    def is_empty(self):
+        """
+        Check whether any differences were found
+        :return: True if there are no differences
+        :rtype: bool
+        """
+        return not (self.only_in_1 or self.only_in_2 or self.type_differences or
+                    self.field_name_differences or self.field_value_differences)
+
+    def to_dict(self):
+        """
+        Return the differences as a dictionary of lists (sorted by record name).
+        This is the representation used for the JSON output.
+        :return: differences
+        :rtype: dict
+        """
+        return {
+            'file1': self.file_name1,
+            'file2': self.file_name2,
+            'only_in_1': sorted(self.only_in_1),
+            'only_in_2': sorted(self.only_in_2),
+            'type_differences': [{'record': r, 'type1': t1, 'type2': t2}
+                                 for r, t1, t2 in sorted(self.type_differences)],
+            'field_name_differences': [{'record': r, 'only_in_1': f1, 'only_in_2': f2}
+                                       for r, f1, f2 in sorted(self.field_name_differences)],
+            'field_value_differences': [{'record': r, 'field': f, 'value1': v1, 'value2': v2}
+                                        for r, f, v1, v2 in sorted(self.field_value_differences)],
+            'identical_records': self.identical_count
+        }
+
+    def write_text(self, f_out=sys.stdout):
+        """
+        Print the differences in the traditional dbdiff format.
+        Each type of difference is printed in its own section. Empty sections are not printed.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        for record_name_list, file_name in [(self.only_in_1, self.file_name1), (self.only_in_2, self.file_name2)]:
+            if record_name_list:
+                f_out.write('\nRecords only in ' + file_name + '\n')
+                for record_name in sorted(record_name_list):
+                    f_out.write(FIRST_INDENT + ' ' + record_name + '\n')
+
+        if self.type_differences:
+            f_out.write('\nRecords that are of different type\n')
+            for record_name, _, _ in sorted(self.type_differences):
+                f_out.write(FIRST_INDENT + ' ' + record_name + '\n')
+
+        if self.field_name_differences:
+            f_out.write('\nFields that are not common in the same record\n')
+            for record_name, fields_1, fields_2 in sorted(self.field_name_differences):
+                f_out.write(FIRST_INDENT + ' ' + record_name + ': ' + ' '.join(sorted(fields_1 + fields_2)) + '\n')
+
+        if self.field_value_differences:
+            f_out.write('\nDifferences in field values\n')
+            last_record_name = None
+            for record_name, field_name, value_1, value_2 in sorted(self.field_value_differences):
+                if record_name != last_record_name:
+                    f_out.write(FIRST_INDENT + ' in ' + record_name + '\n')
+                    last_record_name = record_name
+                f_out.write(SECOND_INDENT + ' ' + field_name + ' "' + value_1 + '" "' + value_2 + '"\n')
+
+    def write_json(self, f_out=sys.stdout):
+        """
+        Print the differences as a JSON document
+        :param f_out: output file object
+        :type f_out: file
+        """
+        json.dump(self.to_dict(), f_out, indent=2)
+        f_out.write('\n')
+
+    def write_csv(self, f_out=sys.stdout):
+        """
+        Print the differences in CSV format, one difference per line.
+        The columns are: difference type, record name, field name, value 1 and value 2.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        writer = csv.writer(f_out)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(self.csv_rows())
+
+    def csv_rows(self):
+        """
+        Return the differences as a list of CSV rows (without header).
+        :return: list of rows
+        :rtype: list
+        """
+        rows = []
+        for record_name in sorted(self.only_in_1):
+            rows.append([CSV_ONLY_IN_1, record_name, '', '', ''])
+        for record_name in sorted(self.only_in_2):
+            rows.append([CSV_ONLY_IN_2, record_name, '', '', ''])
+        for record_name, type_1, type_2 in sorted(self.type_differences):
+            rows.append([CSV_TYPE, record_name, '', type_1, type_2])
+        for record_name, fields_1, fields_2 in sorted(self.field_name_differences):
+            for field_name in fields_1:
+                rows.append([CSV_FIELD_ONLY_IN_1, record_name, field_name, '', ''])
+            for field_name in fields_2:
+                rows.append([CSV_FIELD_ONLY_IN_2, record_name, field_name, '', ''])
+        for record_name, field_name, value_1, value_2 in sorted(self.field_value_differences):
+            rows.append([CSV_VALUE, record_name, field_name, value_1, value_2])
+        return rows
+
+
+class FieldNormalizer:
+    """
+    This class normalizes the field values in a record before they are compared.
+    Numeric values are converted to float and compared within a tolerance. When a dbd file
+    is supplied, fields whose value is the default for the record type are dropped.
+    Link fields containing a numeric constant equal to zero are treated as empty links.
+    """
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, dbd=None):
+        """
+        :param tolerance: relative and absolute tolerance used to compare numbers
+        :type tolerance: float
+        :param dbd: database definitions used to look up default values (optional)
+        :type dbd: DbdFile
+        """
+        self.tolerance = tolerance
+        self.dbd = dbd
+        self.defaults = {}  # normalized default values per record type
+
+    @staticmethod
+    def _to_numbers(value_list):
+        """
+        Convert the values in a list to float when they look like numbers.
+        :param value_list: list of field values
+        :type value_list: list
+        :return: list of normalized values (float or str)
+        :rtype: list
+        """
+        match = NUMBER_PATTERN.match
+        return [float(v) if match(v) else v for v in value_list]
+
+    def _get_defaults(self, record_type):
+        """
+        Return the normalized default values for a record type.
+        The values are computed once per record type and kept in memory.
+        :param record_type: record type
+        :type record_type: str
+        :return: dictionary with the (normalized default, is link field) tuples indexed by field name
+        :rtype: dict
+        """
+        if record_type not in self.defaults:
+            fields = self.dbd.record_types.get(record_type, {}) if self.dbd is not None else {}
+            names = [f for f in fields if fields[f][1] is not None]
+            values = self._to_numbers([fields[f][1] for f in names])
+            self.defaults[record_type] = dict([(f, (v, fields[f][0] in LINK_FIELD_TYPES))
+                                               for f, v in zip(names, values)])
+        return self.defaults[record_type]
+
+    def equal(self, value1, value2):
+        """
+        Compare two normalized values
+        :param value1: value 1
+        :type value1: float or str
+        :param value2: value 2
+        :type value2: float or str
+        :return: True if the values are equal
+        :rtype: bool
+        """
+        if isinstance(value1, float) and isinstance(value2, float):
+            return math.isclose(value1, value2, rel_tol=self.tolerance, abs_tol=self.tolerance)
+        return value1 == value2
+
+    def normalize(self, record):
+        """
+        Normalize all the field values in a record.
+        :param record: record
+        :type record: EpicsRecord
+        :return: dictionary with (original value, normalized value) tuples indexed by field name
+        :rtype: dict
+        """
+        fields = record.get_fields()
+        values = self._to_numbers([v for _, v in fields])
+        defaults = self._get_defaults(record.get_type())
+        output = {}
+        for (field_name, original), value in zip(fields, values):
+            if field_name in defaults:
+                default, is_link = defaults[field_name]
+                if self.equal(value, default) or (is_link and default == '' and self.equal(value, 0.0)):
+                    continue
+            output[field_name] = (original, value)
+        return output
+
+
+def compare_records(record1, record2, result, normalizer=None):
+    """
+    Compare two records with the same name and store the differences in the result object.
+    Records with different type are not compared any further. Records with the same hash
+    are identical and their fields are not compared.
+    :param record1: record from database 1
+    :type record1: EpicsRecord
+    :param record2: record from database 2
+    :type record2: EpicsRecord
+    :param result: object where the differences are stored
+    :type result: DiffResult
+    :param normalizer: object used to normalize the field values (optional)
+    :type normalizer: FieldNormalizer
+    """
+    record_name = record1.get_name()
+    if record1.get_type() != record2.get_type():
+        result.type_differences.append((record_name, record1.get_type(), record2.get_type()))
+        return
+
+    if record1.get_hash() == record2.get_hash():
+        result.identical_count += 1
+        return
+
+    if normalizer is None:
+        fields_1 = dict(record1.get_fields())
+        fields_2 = dict(record2.get_fields())
+    else:
+        fields_1 = normalizer.normalize(record1)
+        fields_2 = normalizer.normalize(record2)
+
+    only_in_1 = sorted(f for f in fields_1 if f not in fields_2)
+    only_in_2 = sorted(f for f in fields_2 if f not in fields_1)
+    if only_in_1 or only_in_2:
+        result.field_name_differences.append((record_name, only_in_1, only_in_2))
+
+    for field_name in sorted(f for f in fields_1 if f in fields_2):
+        if normalizer is None:
+            if fields_1[field_name] != fields_2[field_name]:
+                result.field_value_differences.append((record_name, field_name,
+                                                       fields_1[field_name], fields_2[field_name]))
+        else:
+            value_1, normalized_1 = fields_1[field_name]
+            value_2, normalized_2 = fields_2[field_name]
+            if not normalizer.equal(normalized_1, normalized_2):
+                result.field_value_differences.append((record_name, field_name, value_1, value_2))
+
+
+def compare_databases(db1, db2, file_name1='', file_name2='', normalizer=None):
+    """
+    Compare two databases in memory.
+    :param db1: database 1
+    :type db1: EpicsDatabase
+    :param db2: database 2
+    :type db2: EpicsDatabase
+    :param file_name1: file name 1 (for messages)
+    :type file_name1: str
+    :param file_name2: file name 2 (for messages)
+    :type file_name2: str
+    :param normalizer: object used to normalize the field values (optional)
+    :type normalizer: FieldNormalizer
+    :return: differences
+    :rtype: DiffResult
+    """
+    result = DiffResult(file_name1, file_name2)
+    record_names_in_2 = set(db2.get_record_names())
+    for record_name in set(db1.get_record_names()):
+        if record_name in record_names_in_2:
+            compare_records(db1.get_record(record_name), db2.get_record(record_name), result, normalizer)
+        else:
+            result.only_in_1.append(record_name)
+    record_names_in_1 = set(db1.get_record_names())
+    result.only_in_2 = [r for r in record_names_in_2 if r not in record_names_in_1]
+    return result
+
+
+def compare_sorted_records(iterator1, iterator2, file_name1='', file_name2='', normalizer=None):
+    """
+    Compare two streams of records sorted by record name, walking them in lockstep (merge join).
+    Only one record from each stream is kept in memory at a time.
+    :param iterator1: records from database 1, sorted by name, without repeated names
+    :type iterator1: iterator
+    :param iterator2: records from database 2, sorted by name, without repeated names
+    :type iterator2: iterator
+    :param file_name1: file name 1 (for messages)
+    :type file_name1: str
+    :param file_name2: file name 2 (for messages)
+    :type file_name2: str
+    :param normalizer: object used to normalize the field values (optional)
+    :type normalizer: FieldNormalizer
+    :return: differences
+    :rtype: DiffResult
+    """
+    result = DiffResult(file_name1, file_name2)
+    record1 = next(iterator1, None)
+    record2 = next(iterator2, None)
+    while record1 is not None or record2 is not None:
+        if record2 is None or (record1 is not None and record1.get_name() < record2.get_name()):
+            result.only_in_1.append(record1.get_name())
+            record1 = next(iterator1, None)
+        elif record1 is None or record2.get_name() < record1.get_name():
+            result.only_in_2.append(record2.get_name())
+            record2 = next(iterator2, None)
+        else:
+            compare_records(record1, record2, result, normalizer)
+            record1 = next(iterator1, None)
+            record2 = next(iterator2, None)
+    return result
+
+
+class TreeDiffResult:
+    """
+    This class stores the differences between the database files in two directory trees.
+    Files are identified by their path relative to the top directory of each tree.
+    Records only in one of the trees are matched first by name (records moved to another file)
+    and then by hash (renamed records). Matched records are removed from the per file results.
+    """
+
+    def __init__(self, directory1='', directory2=''):
+        """
+        :param directory1: first top directory (for messages)
+        :type directory1: str
+        :param directory2: second top directory (for messages)
+        :type directory2: str
+        """
+        self.directory1 = directory1
+        self.directory2 = directory2
+        self.results = []  # (relative file name, DiffResult)
+        self.files_only_in_1 = []  # relative file names
+        self.files_only_in_2 = []  # relative file names
+        self.errors = []  # (relative file name, error message)
+        self.moved = []  # (record name, relative file 1, relative file 2, same contents)
+        self.renamed = []  # (record name 1, relative file 1, record name 2, relative file 2)
+        self.fingerprints_1 = []  # (record name, relative file name, hash) for records only in 1
+        self.fingerprints_2 = []  # (record name, relative file name, hash) for records only in 2
+
+    def add_result(self, relative_name, result, fingerprints_1, fingerprints_2):
+        """
+        Add the differences for a pair of files. A missing file is represented by an empty
+        file name in the result object.
+        :param relative_name: file name relative to the top directories
+        :type relative_name: str
+        :param result: differences between the two files
+        :type result: DiffResult
+        :param fingerprints_1: list of (record name, hash) for the records only in file 1
+        :type fingerprints_1: list
+        :param fingerprints_2: list of (record name, hash) for the records only in file 2
+        :type fingerprints_2: list
+        """
+        if not result.file_name2:
+            self.files_only_in_1.append(relative_name)
+        elif not result.file_name1:
+            self.files_only_in_2.append(relative_name)
+        else:
+            self.results.append((relative_name, result))
+        self.fingerprints_1.extend([(r, relative_name, h) for r, h in fingerprints_1])
+        self.fingerprints_2.extend([(r, relative_name, h) for r, h in fingerprints_2])
+
+    def add_error(self, relative_name, message):
+        """
+        Record a file pair that could not be compared.
+        :param relative_name: file name relative to the top directories
+        :type relative_name: str
+        :param message: error message
+        :type message: str
+        """
+        self.errors.append((relative_name, message))
+
+    def find_moved_and_renamed(self):
+        """
+        Match the records that are present in only one of the trees.
+        Records with the same name in different files were moved. Records with different
+        name and the same hash were renamed (and possibly moved). Each record is matched once.
+        The matched records are removed from the list of records only in one file.
+        """
+        names_2 = {}
+        for index, (record_name, _, _) in enumerate(self.fingerprints_2):
+            names_2.setdefault(record_name, []).append(index)
+
+        matched_1 = set()
+        matched_2 = set()
+        for index_1, (record_name, file_1, hash_1) in enumerate(self.fingerprints_1):
+            if names_2.get(record_name):
+                index_2 = names_2[record_name].pop(0)
+                _, file_2, hash_2 = self.fingerprints_2[index_2]
+                self.moved.append((record_name, file_1, file_2, hash_1 == hash_2))
+                matched_1.add(index_1)
+                matched_2.add(index_2)
+
+        hashes_2 = {}
+        for index, (_, _, record_hash) in enumerate(self.fingerprints_2):
+            if index not in matched_2:
+                hashes_2.setdefault(record_hash, []).append(index)
+
+        for index_1, (record_name, file_1, hash_1) in enumerate(self.fingerprints_1):
+            if index_1 not in matched_1 and hashes_2.get(hash_1):
+                index_2 = hashes_2[hash_1].pop(0)
+                record_name_2, file_2, _ = self.fingerprints_2[index_2]
+                self.renamed.append((record_name, file_1, record_name_2, file_2))
+                matched_1.add(index_1)
+                matched_2.add(index_2)
+
+        # Remove the matched records from the individual results
+        matched_1 = set([self.fingerprints_1[i][:2] for i in matched_1])
+        matched_2 = set([self.fingerprints_2[i][:2] for i in matched_2])
+        for relative_name, result in self.results:
+            result.only_in_1 = [r for r in result.only_in_1 if (r, relative_name) not in matched_1]
+            result.only_in_2 = [r for r in result.only_in_2 if (r, relative_name) not in matched_2]
+
+    def write_text(self, f_out=sys.stdout):
+        """
+        Print the consolidated report in text format. The differences for each file pair are
+        printed in the traditional dbdiff format, preceded by the relative file name.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        for relative_name in sorted(self.files_only_in_1):
+            f_out.write('\nFile only in ' + self.directory1 + ': ' + relative_name + '\n')
+        for relative_name in sorted(self.files_only_in_2):
+            f_out.write('\nFile only in ' + self.directory2 + ': ' + relative_name + '\n')
+        for relative_name, message in sorted(self.errors):
+            f_out.write('\nCould not compare ' + relative_name + ': ' + message + '\n')
+
+        for relative_name, result in sorted(self.results, key=lambda t: t[0]):
+            if not result.is_empty():
+                f_out.write('\n' + '=' * 80 + '\n' + relative_name + '\n')
+                result.write_text(f_out=f_out)
+
+        if self.moved:
+            f_out.write('\nRecords moved between files\n')
+            for record_name, file_1, file_2, same in sorted(self.moved):
+                f_out.write(FIRST_INDENT + ' ' + record_name + ': ' + file_1 + ' -> ' + file_2 +
+                            ('' if same else ' (modified)') + '\n')
+
+        if self.renamed:
+            f_out.write('\nRecords renamed\n')
+            for record_name_1, file_1, record_name_2, file_2 in sorted(self.renamed):
+                f_out.write(FIRST_INDENT + ' ' + file_1 + ':' + record_name_1 + ' -> ' +
+                            file_2 + ':' + record_name_2 + '\n')
+
+    def write_json(self, f_out=sys.stdout):
+        """
+        Print the consolidated report as a JSON document.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        files = []
+        for relative_name, result in sorted(self.results, key=lambda t: t[0]):
+            if not result.is_empty():
+                d = result.to_dict()
+                d['file'] = relative_name
+                files.append(d)
+        json.dump({
+            'directory1': self.directory1,
+            'directory2': self.directory2,
+            'files_only_in_1': sorted(self.files_only_in_1),
+            'files_only_in_2': sorted(self.files_only_in_2),
+            'errors': [{'file': f, 'message': m} for f, m in sorted(self.errors)],
+            'files': files,
+            'moved': [{'record': r, 'file1': f1, 'file2': f2, 'modified': not same}
+                      for r, f1, f2, same in sorted(self.moved)],
+            'renamed': [{'record1': r1, 'file1': f1, 'record2': r2, 'file2': f2}
+                        for r1, f1, r2, f2 in sorted(self.renamed)]
+        }, f_out, indent=2)
+        f_out.write('\n')
+
+    def write_csv(self, f_out=sys.stdout):
+        """
+        Print the consolidated report in CSV format. The first column is the relative file name.
+        Moved records use value1 and value2 for the old and new file names. Renamed records
+        use value1 for the new record name and value2 for the new file name. Files present in
+        only one tree and files that could not be compared have one row each, with the error
+        message in value1.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        writer = csv.writer(f_out)
+        writer.writerow(['file'] + CSV_HEADER)
+        for relative_name in sorted(self.files_only_in_1):
+            writer.writerow([relative_name, CSV_FILE_ONLY_IN_1, '', '', '', ''])
+        for relative_name in sorted(self.files_only_in_2):
+            writer.writerow([relative_name, CSV_FILE_ONLY_IN_2, '', '', '', ''])
+        for relative_name, message in sorted(self.errors):
+            writer.writerow([relative_name, CSV_ERROR, '', '', message, ''])
+        for relative_name, result in sorted(self.results, key=lambda t: t[0]):
+            for row in result.csv_rows():
+                writer.writerow([relative_name] + row)
+        for record_name, file_1, file_2, _ in sorted(self.moved):
+            writer.writerow([file_1, CSV_MOVED, record_name, '', file_1, file_2])
+        for record_name_1, file_1, record_name_2, file_2 in sorted(self.renamed):
+            writer.writerow([file_1, CSV_RENAMED, record_name_1, '', record_name_2, file_2])
+
+
+class MergeResult:
+    """
+    This class stores the result of a three-way merge: the merged database and the list
+    of conflicts. Each conflict is stored as a tuple with the conflict type, record name,
+    field name (empty for record conflicts) and the base, ours and theirs values (None if absent).
+    When there's a conflict the merged database keeps our version, except when we deleted
+    the record, in which case their version is kept.
+    """
+
+    def __init__(self):
+        self.database = EpicsDatabase()
+        self.conflicts = []  # (conflict type, record name, field name, base, ours, theirs)
+        self.changed_count = 0  # number of records changed in both databases
+
+    def write_conflicts_text(self, f_out=sys.stderr):
+        """
+        Print the list of conflicts in text format, one per line.
+        :param f_out: output file object
+        :type f_out: file
+        """
+        for conflict_type, record_name, field_name, base, ours, theirs in self.conflicts:
+            name = record_name + '.' + field_name if field_name else record_name
+            f_out.write('CONFLICT (' + conflict_type + ') ' + name + ': base=' + _quoted(base) +
+                        ' ours=' + _quoted(ours) + ' theirs=' + _quoted(theirs) + '\n')
+
+    def write_conflicts_json(self, f_out=sys.stdout):
+        """
+        Print the list of conflicts as a JSON document
+        :param f_out: output file object
+        :type f_out: file
+        """
+        json.dump([{'conflict': c, 'record': r, 'field': f, 'base': b, 'ours': o, 'theirs': t}
+                   for c, r, f, b, o, t in self.conflicts], f_out, indent=2)
+        f_out.write('\n')
+
+
+def _quoted(value):
+    """
+    Auxiliary routine used to print values in conflict messages
+    :param value: value or None
+    :type value: str
+    :return: quoted value, or - if None
+    :rtype: str
+    """
+    return '-' if value is None else '"' + value + '"'
+
+
+def _merge_value(base, ours, theirs):
+    """
+    Three-way merge of a single value (None means absent).
+    :return: tuple with the merged value and a flag set to True if there's a conflict
+    :rtype: tuple
+    """
+    if ours == theirs or theirs == base:
+        return ours, False
+    elif ours == base:
+        return theirs, False
+    else:
+        return ours, True
+
+
+def _merge_record(record_name, base, ours, theirs, result):
+    """
+    Merge a record changed in both databases field by field.
+    The record type is merged like a field. Our field order is preserved and
+    the fields added only in their record are appended at the end.
+    :param record_name: record name
+    :type record_name: str
+    :param base: base record, or None if the record was added in both databases
+    :type base: EpicsRecord
+    :param ours: our record
+    :type ours: EpicsRecord
+    :param theirs: their record
+    :type theirs: EpicsRecord
+    :param result: merge result
+    :type result: MergeResult
+    :return: merged record
+    :rtype: EpicsRecord
+    """
+    base_type = base.get_type() if base is not None else None
+    record_type, conflict = _merge_value(base_type, ours.get_type(), theirs.get_type())
+    if conflict:
+        result.conflicts.append((CONFLICT_TYPE, record_name, '', base_type, ours.get_type(), theirs.get_type()))
+
+    base_fields = dict(base.get_fields()) if base is not None else {}
+    our_fields = dict(ours.get_fields())
+    their_fields = dict(theirs.get_fields())
+
+    field_names = list(our_fields) + [f for f in their_fields if f not in our_fields] + \
+        [f for f in base_fields if f not in our_fields and f not in their_fields]
+
+    record = EpicsRecord(record_name, record_type)
+    for field_name in field_names:
+        base_value = base_fields.get(field_name)
+        our_value = our_fields.get(field_name)
+        their_value = their_fields.get(field_name)
+        value, conflict = _merge_value(base_value, our_value, their_value)
+        if conflict:
+            result.conflicts.append((CONFLICT_FIELD, record_name, field_name, base_value, our_value, their_value))
+        if value is not None:
+            record.add_field(field_name, value)
+    return record
+
+
+def merge_databases(base, ours, theirs):
+    """
+    Three-way merge of two databases derived from a common base database.
+    A record changed only in one of the databases (compared by hash) is taken from that database.
+    Records changed in both databases are merged field by field. The merged database has our
+    record order, followed by the records added only in their database.
+    The run time is linear in the number of records.
+    :param base: base database
+    :type base: EpicsDatabase
+    :param ours: our database
+    :type ours: EpicsDatabase
+    :param theirs: their database
+    :type theirs: EpicsDatabase
+    :return: merge result
+    :rtype: MergeResult
+    """
+    result = MergeResult()
+
+    # List of record names in the output order, without repetitions
+    record_names = []
+    seen = set()
+    for record_name in ours.get_record_names() + theirs.get_record_names():
+        if record_name not in seen:
+            seen.add(record_name)
+            record_names.append(record_name)
+
+    for record_name in record_names:
+        b = base.get_record(record_name)
+        o = ours.get_record(record_name)
+        t = theirs.get_record(record_name)
+        hash_b = b.get_hash() if b is not None else None
+        hash_o = o.get_hash() if o is not None else None
+        hash_t = t.get_hash() if t is not None else None
+
+        if hash_o == hash_t or hash_t == hash_b:
+            record = o
+        elif hash_o == hash_b:
+            record = t
+        elif o is None or t is None:
+            record = o if o is not None else t
+            result.conflicts.append((CONFLICT_DELETE, record_name, '',
+                                     b.get_type() if b is not None else None,
+                                     o.get_type() if o is not None else None,
+                                     t.get_type() if t is not None else None))
+        else:
+            result.changed_count += 1
+            record = _merge_record(record_name, b, o, t, result)
+
+        if record is not None:
+            result.database.add_record(record)
+
+    return result
+
+
+if __name__ == '__main__':
+    pass
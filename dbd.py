@@ -0,0 +1,233 @@
+"""
+This module defines the DbdFile class.
+
+DbdFile reads an EPICS database definition file (.dbd) and extracts the information needed to
+interpret the records in a database file: the menus and, for each record type, the field types
+and default values. Other definitions (device, driver, registrar, variable, etc.) are ignored.
+
+The default value of a field is the value in its initial() declaration. Fields with no
+initial value default to the first choice for menu fields, zero for numeric fields and
+an empty string for string and link fields.
+
+The routine read_dbd_file() should be used by application programs. It parses each file only
+once per program run, and it can keep the parsed definitions in the cache between runs.
+
+Note: the parser is not a full dbd parser and it does not check for a valid syntax.
+"""
+import os
+import re
+import functools
+from cache import cache_key, read_cache, write_cache
+
+# Field types that have a numeric value
+NUMERIC_FIELD_TYPES = {'DBF_CHAR', 'DBF_UCHAR', 'DBF_SHORT', 'DBF_USHORT', 'DBF_LONG', 'DBF_ULONG',
+                       'DBF_INT64', 'DBF_UINT64', 'DBF_FLOAT', 'DBF_DOUBLE', 'DBF_ENUM'}
+
+# Field types that contain links
+LINK_FIELD_TYPES = {'DBF_INLINK', 'DBF_OUTLINK', 'DBF_FWDLINK'}
+
+# Regular expression used to split a dbd file into tokens: quoted strings, words and punctuation.
+# Comments (#) and C declarations (%) are matched separately and discarded.
+TOKEN_PATTERN = re.compile(r'\s+|#[^\n]*|%[^\n]*|"((?:[^"\\]|\\.)*)"|([^\s(){},"#]+)|([(){},])')
+
+
+class DbdFile:
+    """
+    This class reads the menu and record type definitions from a dbd file.
+    The definitions are stored in the following class members:
+
+    menus: dictionary indexed by menu name with the list of choice strings for each menu
+
+    record_types: dictionary indexed by record type with a dictionary for each record type.
+                  The dictionary is indexed by field name and contains (field type, default value)
+                  tuples. The default value is None when it cannot be determined.
+    """
+
+    def __init__(self, file_name):
+        """
+        Read and parse the dbd file. Included files are read if they can be found in the
+        same directory as the file including them.
+        :param file_name: dbd file name
+        :type file_name: str
+        """
+        self.file_name = file_name
+        self.menus = {}
+        self.record_types = {}
+        self._read(file_name)
+
+    def __str__(self):
+        """
+        Return the string representation of the dbd file object
+        :return: string representation
+        :rtype: str
+        """
+        return '<DbdFile file_name=' + str(self.file_name) + ', menus=' + str(len(self.menus)) + \
+               ', record_types=' + str(len(self.record_types)) + '>'
+
+    @staticmethod
+    def _tokenize(text):
+        """
+        Split the dbd file contents into a list of tokens.
+        Quoted strings are returned as ('"', value) tuples and any other token as (token, token).
+        :param text: file contents
+        :type text: str
+        :return: token list
+        :rtype: list
+        """
+        token_list = []
+        for m in TOKEN_PATTERN.finditer(text):
+            quoted, word, symbol = m.groups()
+            if quoted is not None:
+                token_list.append(('"', quoted))
+            elif word is not None:
+                token_list.append((word, word))
+            elif symbol is not None:
+                token_list.append((symbol, symbol))
+        return token_list
+
+    def _parse(self, token_list, pos=0):
+        """
+        Parse a list of tokens into a list of (keyword, arguments, children) tuples.
+        A definition is a keyword followed by an argument list in parenthesis and an optional
+        body in braces, which is parsed recursively. The include statement has a single argument
+        that is not enclosed in parenthesis.
+        :param token_list: list of tokens from _tokenize
+        :type token_list: list
+        :param pos: position of the first token to parse
+        :type pos: int
+        :return: tuple with the list of definitions and the position of the next token
+        :rtype: tuple
+        """
+        definitions = []
+        while pos < len(token_list):
+            token, value = token_list[pos]
+            if token == '}':
+                return definitions, pos + 1
+            pos += 1
+            if token in ('(', ')', '{', ',', '"'):
+                continue  # unexpected token, ignore
+            keyword = value
+            arguments = []
+            children = []
+            if pos < len(token_list) and token_list[pos][0] == '"':
+                arguments.append(token_list[pos][1])
+                pos += 1
+            elif pos < len(token_list) and token_list[pos][0] == '(':
+                pos += 1
+                while pos < len(token_list) and token_list[pos][0] != ')':
+                    if token_list[pos][0] != ',':
+                        arguments.append(token_list[pos][1])
+                    pos += 1
+                pos += 1
+                if pos < len(token_list) and token_list[pos][0] == '{':
+                    children, pos = self._parse(token_list, pos + 1)
+            definitions.append((keyword, arguments, children))
+        return definitions, pos
+
+    def _read(self, file_name):
+        """
+        Read a dbd file and process the definitions in it
+        :param file_name: dbd file name
+        :type file_name: str
+        """
+        with open(file_name, 'r') as f:
+            definitions, _ = self._parse(self._tokenize(f.read()))
+
+        for keyword, arguments, children in definitions:
+            if keyword == 'include' and arguments:
+                include_file_name = os.path.join(os.path.dirname(file_name), arguments[0])
+                if os.path.exists(include_file_name):
+                    self._read(include_file_name)
+            elif keyword == 'menu' and arguments:
+                self.menus[arguments[0]] = [a[1] for k, a, _ in children if k == 'choice' and len(a) > 1]
+
+        # Record types are processed last since they can reference menus defined anywhere
+        for keyword, arguments, children in definitions:
+            if keyword == 'recordtype' and arguments:
+                fields = self.record_types.setdefault(arguments[0], {})
+                for field_keyword, field_arguments, field_children in children:
+                    if field_keyword == 'field' and len(field_arguments) > 1:
+                        fields[field_arguments[0]] = (field_arguments[1],
+                                                      self._default_value(field_arguments[1], field_children))
+
+    def _default_value(self, field_type, field_children):
+        """
+        Determine the default value of a field
+        :param field_type: field type (e.g. DBF_DOUBLE)
+        :type field_type: str
+        :param field_children: list of definitions in the field body
+        :type field_children: list
+        :return: default value, or None if it cannot be determined
+        :rtype: str
+        """
+        attributes = dict([(k, a[0]) for k, a, _ in field_children if a])
+        if 'initial' in attributes:
+            return attributes['initial']
+        elif field_type == 'DBF_MENU':
+            choices = self.menus.get(attributes.get('menu'))
+            return choices[0] if choices else None
+        elif field_type in NUMERIC_FIELD_TYPES:
+            return '0'
+        elif field_type == 'DBF_STRING' or field_type in LINK_FIELD_TYPES:
+            return ''
+        else:
+            return None
+
+    def get_field_type(self, record_type, field_name):
+        """
+        Return the type of a field in a record type
+        :param record_type: record type
+        :type record_type: str
+        :param field_name: field name
+        :type field_name: str
+        :return: field type, or None if not defined
+        :rtype: str
+        """
+        try:
+            return self.record_types[record_type][field_name][0]
+        except KeyError:
+            return None
+
+    def get_field_default(self, record_type, field_name):
+        """
+        Return the default value of a field in a record type
+        :param record_type: record type
+        :type record_type: str
+        :param field_name: field name
+        :type field_name: str
+        :return: default value, or None if not defined
+        :rtype: str
+        """
+        try:
+            return self.record_types[record_type][field_name][1]
+        except KeyError:
+            return None
+
+
+@functools.lru_cache(maxsize=None)
+def read_dbd_file(file_name, cache_directory=None):
+    """
+    Read a dbd file. The file is parsed only once per program run. The parsed definitions
+    are also kept in the cache directory between runs if one is specified.
+    Changes in included files are not detected by the cache.
+    :param file_name: dbd file name
+    :type file_name: str
+    :param cache_directory: cache directory, or None to disable the cache
+    :type cache_directory: str
+    :return: dbd definitions
+    :rtype: DbdFile
+    """
+    key = None
+    if cache_directory:
+        key = cache_key('dbd', [file_name])
+        dbd = read_cache(key, cache_directory)
+        if isinstance(dbd, DbdFile):
+            return dbd
+    dbd = DbdFile(file_name)
+    if key is not None:
+        write_cache(key, dbd, cache_directory)
+    return dbd
+
+
+if __name__ == '__main__':
+    pass
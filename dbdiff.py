@@ -6,21 +6,44 @@ It checks for the following possible differences:
 (2) Records common to the two input files that have a different record type
 (3) Fields that are not common for the same record
 (4) Differences in the field values
+
+The streaming mode (--stream) walks the two databases in lockstep, sorted by record name,
+in the same way as a merge join. Only one record from each database is kept in memory at
+a time, so it can be used on databases that are too large to be read fully into memory.
+
+The tree mode (--tree) compares all the database files in two directory trees. Files are
+paired by their path relative to the top directories and each pair is compared in a pool of
+worker processes. Records that were moved between files or renamed are detected using the
+record hashes, and a single consolidated report is printed.
+
+The differences are computed by the routines in dbcompare and can be printed as text,
+JSON or CSV (--format).
+
+Field values are compared as strings by default. The --numeric option compares numeric values
+as numbers (within a tolerance), so values like 0.000000000000000e+00 and 0 are equal. The --dbd
+option also treats fields that are set to the default value for the record type as absent.
 """
 import sys
 import os
-import time
+import tempfile
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from argparse import ArgumentParser, SUPPRESS, Namespace
+from files import list_tree
+from cache import DEFAULT_CACHE_DIRECTORY, cache_key, read_cache, write_cache
 from db import DatabaseFile, EpicsDatabase, EpicsMacro, FILTER_RECORD, FILTER_FIELD
+from dbcompare import TreeDiffResult, FieldNormalizer, DEFAULT_TOLERANCE
+from dbcompare import compare_databases, compare_sorted_records
+from dbd import read_dbd_file
+from dblink import LINK_PV, parse_link
 
-# Indentation used when printing differences
-FIRST_INDENT = ' ' * 2
-SECOND_INDENT = ' ' * 5
+# Output formats
+OUTPUT_TEXT = 'text'
+OUTPUT_JSON = 'json'
+OUTPUT_CSV = 'csv'
 
-# Name of the directory where (temporary) sorted files will be written to
-TEMP_DIRECTORY = os.path.join(os.path.sep, 'tmp')
-# TEMP_DIRECTORY = './tmp'
+# Default pattern used to select database files in tree mode
+DEFAULT_TREE_PATTERN = '*.db'
 
 # Variable used to control printing of debug output.
 # A global variable was used for code simplicity.
@@ -52,12 +75,11 @@ def diff_filter(what, name, attribute):
         return output_name.strip(), attribute.strip()
     elif what == FILTER_FIELD:
         output_attr = attribute if diff_macros is None else diff_macros.replace_macros(attribute)
-        output_attr = output_attr.replace('.NPP', 'NPP')
-        output_attr = output_attr.replace('.PP', 'PP')
-        output_attr = output_attr.replace('.CPP', 'CPP')
-        output_attr = output_attr.replace('.CP', 'CP')
-        output_attr = output_attr.replace('.NMS', ' NMS')
-        output_attr = output_attr.replace('.MS', ' MS')
+        # Write links in canonical form, so the process and severity modifiers written
+        # in different ways (e.g. rec.VAL.PP or rec.VAL PP) are considered equal
+        link = parse_link(output_attr)
+        if link.kind == LINK_PV:
+            output_attr = link.canonical()
         # Handle description differences between different versions of EPICS
         if name == 'DESC':
             output_attr = output_attr.replace('Gemini ', '')
@@ -69,113 +91,7 @@ def diff_filter(what, name, attribute):
         raise(ValueError, 'Unknown what to filter value')
 
 
-def print_only_in_one(record_name_list, file_name):
-    """
-    Auxiliary function to print records present in only one database.
-    The main purpose of this function is to avoid duplication of code.
-    :param record_name_list: list of record names
-    :type record_name_list: list
-    :param file_name: database file name (for message)
-    :type file_name: str
-    :return: None
-    """
-    if debug_flag:
-        print('\n-- print_only_in_one', record_name_list, file_name)
-    if len(record_name_list):
-        print('\nRecords only in', file_name)
-        for record_name in sorted(record_name_list):
-            print(FIRST_INDENT, record_name)
-
-
-def print_record_type_differences(record_name_list):
-    """
-    Auxiliary routine to print the list of records that have the same name and different type.
-    The main purpose of this function is to improve code readability.
-    :param record_name_list: list of record names that have different type
-    :type record_name_list: list
-    :return: None
-    """
-    if debug_flag:
-        print('\n-- print_record_type_differences', record_name_list)
-    section_title = True
-    for record_name in sorted(record_name_list):
-        if section_title:
-            print('\nRecords that are of different type')
-            section_title = False
-        print(FIRST_INDENT, record_name)
-
-
-def print_field_name_differences(db1, db2, record_name_list):
-    """
-    Auxiliary routine to print the list fields in all records that are present
-    only in one of the instances of the same record. This routine is intended to
-    detect the following cases:
-    (1) misspelled field names (typos)
-    (2) missing fields because of editing with two different tools
-    (3) corrupted databases
-    :param db1: database 1
-    :param db1: EpicsDatabase
-    :param db2: database 2
-    :type db2: EpicsDatabase
-    :param record_name_list: list of record names common to the two databases with the same type
-    :type record_name_list: list
-    :return: None
-    """
-    if debug_flag:
-        print('\n-- print_field_name_differences', db1, db2, record_name_list)
-
-    section_title = True
-    for record_name in sorted(record_name_list):
-        # field_names_in_1 = set(db1[record_name].keys())
-        # field_names_in_2 = set(db2[record_name].keys())
-        field_names_in_1 = set(db1.get_record(record_name).get_field_names())
-        field_names_in_2 = set(db2.get_record(record_name).get_field_names())
-        # print field_names_in_1
-        non_common_fields = field_names_in_1 ^ field_names_in_2
-        if len(non_common_fields):
-            if section_title:
-                print('\nFields that are not common in the same record')
-                section_title = False
-            print(FIRST_INDENT, record_name + ':', ' '.join(non_common_fields))
-
-
-def print_field_value_differences(db1, db2, record_name_list):
-    """
-    Print differences in the value of fields for the same record.
-    This is the most common case of database differences in a project.
-    :param db1: database 1
-    :param db1: EpicsDatabase
-    :param db2: database 2
-    :type db2: EpicsDatabase
-    :param record_name_list: list of record names common to the two databases with the same type
-    :type record_name_list: list
-    :return:
-    """
-    if debug_flag:
-        print('\n-- print_field_value_differences', db1, db2, record_name_list)
-
-    section_title = True
-    for record_name in sorted(record_name_list):
-        field_names_in_1 = set(db1.get_record(record_name).get_field_names())
-        field_names_in_2 = set(db2.get_record(record_name).get_field_names())
-        record_title = True
-        for field_name in sorted(field_names_in_1 & field_names_in_2):
-            value_1 = db1.get_record(record_name).get_field_value(field_name)
-            value_2 = db2.get_record(record_name).get_field_value(field_name)
-            # print record_name, field_name, value_1, value_2
-            if value_1 != value_2:
-                if section_title:
-                    print('\nDifferences in field values')
-                    section_title = False
-                if record_title:
-                    print(FIRST_INDENT, 'in', record_name)
-                    record_title = False
-                    print(SECOND_INDENT, field_name, '"' + value_1 + '"', '"' + value_2 + '"')
-
-    return
-
-
-def diff_databases(df1, df2, file_name1, file_name2):
+def diff_databases(df1, df2, file_name1, file_name2, normalizer=None):
     """
     Determine the differences between two databases files.
     This is the routine where the actual work is done.
@@ -189,61 +105,220 @@ def diff_databases(df1, df2, file_name1, file_name2):
     :type file_name1: str
     :param file_name2: file name 2 (for messages)
     :type file_name2: str
-    :return:
+    :param normalizer: object used to normalize the field values (optional)
+    :type normalizer: FieldNormalizer
+    :return: differences, or None if the databases could not be read
+    :rtype: DiffResult
     """
     if debug_flag:
-        print('\n-- print_field_value_differences', df1, df2, file_name1, file_name2)
+        print('\n-- diff_databases', df1, df2, file_name1, file_name2)
 
     try:
         db1 = df1.read_database()
         db2 = df2.read_database()
     except Exception as ex:
         print(ex)
-        return
+        return None
 
     # These are here to help PyCharm with the object types
     # TODO: check whether this is still true
     assert (isinstance(db1, EpicsDatabase))
     assert (isinstance(db2, EpicsDatabase))
 
-    # Use set operations and list comprehensions to efficiently determine
-    # what records are common to the two databases, what records of the common
-    # set have the same and different types, and what records are present in
-    # only one of the databases
-    record_names_in_1 = set(db1.get_record_names())
-    record_names_in_2 = set(db2.get_record_names())
-    common_record_names = record_names_in_1 & record_names_in_2
-    # common_record_types = set([r for r in common_record_names if db1[r][TYPE_KEY] == db2[r][TYPE_KEY]])
-    common_record_types = set(
-        [r for r in common_record_names if db1.get_record(r).get_type() == db2.get_record(r).get_type()])
-    different_record_types = common_record_names ^ common_record_types
-    only_in_1 = common_record_names ^ record_names_in_1
-    only_in_2 = common_record_names ^ record_names_in_2
+    result = compare_databases(db1, db2, file_name1, file_name2, normalizer)
 
     # Handy debug code
     if debug_flag:
-        print('database 1:  ', sorted(record_names_in_1))
-        print('database 2:  ', sorted(record_names_in_2))
-        print('common names:', sorted(common_record_names))
-        print('common types:', sorted(common_record_types))
-        print('diff. types: ', sorted(different_record_types))
-        print('only in 1:   ', sorted(only_in_1))
-        print('only in 2:   ', sorted(only_in_2))
-        print('\n')
-
-    # Print records present in only one of the databases
-    print_only_in_one(list(only_in_1), file_name1)
-    print_only_in_one(list(only_in_2), file_name2)
-
-    # Print records that have different type
-    print_record_type_differences(list(different_record_types))
-
-    # Print field name and field type mismatches for the same record
-    # These routines require the list of records with common types as argument
-    print_field_name_differences(db1, db2, list(common_record_types))
-    print_field_value_differences(db1, db2, list(common_record_types))
+        print(result)
 
-    return
+    return result
+
+
+def sorted_unique_records(df, file_name, presorted):
+    """
+    Return the records in a database file sorted by record name, with only the last
+    record kept when a record name is repeated (the same as EpicsDatabase does).
+    Presorted files are read sequentially and their order is verified as they are read.
+    Otherwise the file is sorted using an external sort.
+    This routine is implemented as a Python generator.
+    :param df: database file
+    :type df: DatabaseFile
+    :param file_name: file name (for messages)
+    :type file_name: str
+    :param presorted: is the file already sorted by record name?
+    :type presorted: bool
+    :return: next record
+    :rtype: EpicsRecord
+    :raises: ValueError if a presorted file is not sorted
+    """
+    iterator = df.next_record() if presorted else df.next_sorted_record()
+    previous = None
+    for record in iterator:
+        if previous is not None:
+            if record.get_name() < previous.get_name():
+                raise ValueError(file_name + ' is not sorted (' + record.get_name() + ')')
+            if record.get_name() != previous.get_name():
+                yield previous
+        previous = record
+    if previous is not None:
+        yield previous
+
+
+def diff_databases_streaming(df1, df2, file_name1, file_name2, presorted=False, normalizer=None):
+    """
+    Determine the differences between two database files without reading them into memory.
+    Both files are walked in lockstep in record name order (merge join).
+    :param df1: file handle 1
+    :type df1: DatabaseFile
+    :param df2: file handle 2
+    :type df2: DatabaseFile
+    :param file_name1: file name 1 (for messages)
+    :type file_name1: str
+    :param file_name2: file name 2 (for messages)
+    :type file_name2: str
+    :param presorted: are the files already sorted by record name (e.g. by dbsort)?
+    :type presorted: bool
+    :param normalizer: object used to normalize the field values (optional)
+    :type normalizer: FieldNormalizer
+    :return: differences, or None if the databases could not be read
+    :rtype: DiffResult
+    """
+    if debug_flag:
+        print('\n-- diff_databases_streaming', df1, df2, file_name1, file_name2, presorted)
+
+    try:
+        result = compare_sorted_records(sorted_unique_records(df1, file_name1, presorted),
+                                        sorted_unique_records(df2, file_name2, presorted),
+                                        file_name1, file_name2, normalizer)
+    except ValueError as ex:
+        print(ex)
+        return None
+
+    if debug_flag:
+        print(result)
+
+    return result
+
+
+def make_normalizer(p_args):
+    """
+    Create the object used to normalize field values, if requested in the command line.
+    The dbd file is read only once per process.
+    :param p_args: command line arguments
+    :type p_args: Namespace
+    :return: normalizer, or None if field values should be compared as strings
+    :rtype: FieldNormalizer
+    """
+    if not (p_args.numeric or p_args.dbd):
+        return None
+    dbd = None
+    if p_args.dbd:
+        dbd = read_dbd_file(p_args.dbd, None if p_args.nocache else p_args.cache)
+    return FieldNormalizer(tolerance=p_args.tolerance, dbd=dbd)
+
+
+def read_database_file(file_name, filter_function):
+    """
+    Read a database file into memory and close it.
+    :param file_name: file name
+    :type file_name: str
+    :param filter_function: filter function passed to DatabaseFile
+    :type filter_function: func
+    :return: database
+    :rtype: EpicsDatabase
+    """
+    df = DatabaseFile(file_name=file_name, filter_function=filter_function)
+    db = df.read_database()
+    df.close()
+    return db
+
+
+def diff_tree_pair(task):
+    """
+    Compare a pair of files from two directory trees. This is the routine executed by the
+    worker processes in tree mode. A missing file (None) is treated as an empty database.
+    The macros are passed explicitly since worker processes do not necessarily inherit
+    the global variables from the main program.
+    :param task: tuple with relative file name, file name 1, file name 2 and command line arguments
+    :type task: tuple
+    :return: tuple with the relative file name, differences (None on error), error message,
+             and the (record name, hash) lists for the records present in only one of the files
+    :rtype: tuple
+    """
+    global diff_macros
+    relative_name, file_name1, file_name2, p_args = task
+    diff_macros = EpicsMacro(p_args.macros, add_undefined=True) if p_args.macros else None
+    my_filter = diff_filter if p_args.clean else None
+    try:
+        normalizer = make_normalizer(p_args)
+        db1 = read_database_file(file_name1, my_filter) if file_name1 else EpicsDatabase()
+        db2 = read_database_file(file_name2, my_filter) if file_name2 else EpicsDatabase()
+    except (OSError, IOError, KeyError) as ex:
+        return relative_name, None, str(ex), [], []
+
+    result = compare_databases(db1, db2, file_name1 or '', file_name2 or '', normalizer)
+    fingerprints_1 = [(r, db1.get_record(r).get_hash()) for r in result.only_in_1]
+    fingerprints_2 = [(r, db2.get_record(r).get_hash()) for r in result.only_in_2]
+    return relative_name, result, '', fingerprints_1, fingerprints_2
+
+
+def diff_trees(directory1, directory2, p_args):
+    """
+    Compare all the database files in two directory trees and print a consolidated report.
+    :param directory1: top directory 1
+    :type directory1: str
+    :param directory2: top directory 2
+    :type directory2: str
+    :param p_args: command line arguments
+    :type p_args: Namespace
+    :return: None
+    """
+    if debug_flag:
+        print('\n-- diff_trees', directory1, directory2)
+    try:
+        files1 = dict([(os.path.relpath(f, directory1), f) for f in list_tree(directory1, p_args.pattern)])
+        files2 = dict([(os.path.relpath(f, directory2), f) for f in list_tree(directory2, p_args.pattern)])
+    except IOError as ex:
+        print(ex)
+        return
+
+    tasks = [(relative_name, files1.get(relative_name), files2.get(relative_name), p_args)
+             for relative_name in sorted(set(files1) | set(files2))]
+
+    if p_args.jobs == 1:
+        pair_results = [diff_tree_pair(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=p_args.jobs) as executor:
+            pair_results = list(executor.map(diff_tree_pair, tasks))
+
+    tree_result = TreeDiffResult(directory1, directory2)
+    for relative_name, result, message, fingerprints_1, fingerprints_2 in pair_results:
+        if result is None:
+            tree_result.add_error(relative_name, message)
+        else:
+            tree_result.add_result(relative_name, result, fingerprints_1, fingerprints_2)
+    tree_result.find_moved_and_renamed()
+
+    write_result(tree_result, p_args)
+
+
+def write_result(result, p_args, f_out=sys.stdout):
+    """
+    Print the differences in the output format selected in the command line.
+    :param result: differences
+    :type result: DiffResult or TreeDiffResult
+    :param p_args: command line arguments
+    :type p_args: Namespace
+    :param f_out: output file object
+    :type f_out: file
+    :return: None
+    """
+    if p_args.output_format == OUTPUT_JSON:
+        result.write_json(f_out=f_out)
+    elif p_args.output_format == OUTPUT_CSV:
+        result.write_csv(f_out=f_out)
+    else:
+        result.write_text(f_out=f_out)
 
 
 def diff_files_internal(file_name1, file_name2, p_args):
@@ -264,68 +339,116 @@ def diff_files_internal(file_name1, file_name2, p_args):
         # f2 = open(file2, 'r')
         # diff_databases(f1, f2, file1, file2)
         my_filter = diff_filter if p_args.clean else None
+        normalizer = make_normalizer(p_args)
         df1 = DatabaseFile(file_name=file_name1, filter_function=my_filter)
         df2 = DatabaseFile(file_name=file_name2, filter_function=my_filter)
-        diff_databases(df1, df2, file_name1, file_name2)
+        if p_args.stream:
+            result = diff_databases_streaming(df1, df2, file_name1, file_name2, presorted=p_args.presorted,
+                                              normalizer=normalizer)
+        else:
+            result = diff_databases(df1, df2, file_name1, file_name2, normalizer=normalizer)
         df1.close()
         df2.close()
+        if result is not None:
+            write_result(result, p_args)
     except (OSError, IOError) as ex:
         print(ex)
 
 
+def read_cached_database(file_name, clean, macros, cache_directory):
+    """
+    Read a database file, using the parsed-database cache when possible.
+    The cache key includes the options that change the way the database is parsed.
+    :param file_name: database file name
+    :type file_name: str
+    :param clean: clean up differences with legacy databases?
+    :type clean: bool
+    :param macros: list of (macro, value) pairs
+    :type macros: list
+    :param cache_directory: cache directory, or None to disable the cache
+    :type cache_directory: str
+    :return: database
+    :rtype: EpicsDatabase
+    """
+    global diff_macros
+    key = None
+    if cache_directory:
+        key = cache_key('database', [file_name], clean, macros)
+        db = read_cache(key, cache_directory)
+        if isinstance(db, EpicsDatabase):
+            return db
+
+    diff_macros = EpicsMacro(macros, add_undefined=True) if macros else None
+    db = read_database_file(file_name, diff_filter if clean else None)
+    if key is not None:
+        write_cache(key, db, cache_directory)
+    return db
+
+
+def render_sorted_database(task):
+    """
+    Write the sorted rendering of a database file to an output file.
+    This is the routine executed by the worker processes in diff_files_external.
+    :param task: tuple with file name, output file name, clean flag, macro list and cache directory
+    :type task: tuple
+    :return: error message, or an empty string if successful
+    :rtype: str
+    """
+    file_name, output_file_name, clean, macros, cache_directory = task
+    try:
+        db = read_cached_database(file_name, clean, macros, cache_directory)
+        with open(output_file_name, 'w') as f:
+            db.write_sorted_database(f_out=f)
+    except (OSError, IOError, KeyError) as ex:
+        return str(ex)
+    return ''
+
+
 def diff_files_external(file_name1, file_name2, p_args):
     """
-    Open the two database files, sort them and call the external difference program.
+    Sort the two database files and call the external difference program.
+    The sorted databases are written to temporary files with unique names, that are
+    removed after the external program exits. Both databases are sorted concurrently.
     :param file_name1: file name 1
     :param file_name2: file name 2
     :param p_args: command line arguments
     :return: None
     """
-    # Read databases into memory
-    try:
-        my_filter = diff_filter if p_args.clean else None
-        df1 = DatabaseFile(file_name=file_name1, filter_function=my_filter)
-        df2 = DatabaseFile(file_name=file_name2, filter_function=my_filter)
-        db1 = df1.read_database()
-        db2 = df2.read_database()
-        df1.close()
-        df2.close()
-    except (OSError, IOError) as ex:
-        print(ex)
-        return
+    # Create the temporary files. The names are unique, so concurrent runs will not collide.
+    output_file_names = []
+    for file_name, suffix in [(file_name1, '_1'), (file_name2, '_2')]:
+        fd, output_file_name = tempfile.mkstemp(prefix=os.path.basename(file_name) + '_', suffix=suffix)
+        os.close(fd)
+        output_file_names.append(output_file_name)
 
-    # Create output file names by appending a time stamp
-    time_stamp = str(int(time.time()))
-    output_file_name1 = os.path.join(TEMP_DIRECTORY, os.path.basename(file_name1) + '_' + time_stamp + '_1')
-    output_file_name2 = os.path.join(TEMP_DIRECTORY, os.path.basename(file_name2) + '_' + time_stamp + '_2')
+    try:
+        # Write the sorted databases to disk
+        cache_directory = None if p_args.nocache else p_args.cache
+        tasks = [(file_name1, output_file_names[0], p_args.clean, p_args.macros, cache_directory),
+                 (file_name2, output_file_names[1], p_args.clean, p_args.macros, cache_directory)]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            messages = [m for m in executor.map(render_sorted_database, tasks) if m]
+        if messages:
+            for message in messages:
+                print(message)
+            return
 
-    # Write the sorted databases to disk
-    for db, file_name in [(db1, output_file_name1), (db2, output_file_name2)]:
-        # print db, file_name
-        assert (isinstance(db, EpicsDatabase))
+        # Call external program to diff the files
+        external_program = p_args.program[0]
+        print('calling', external_program, 'with', output_file_names[0], 'and', output_file_names[1])
         try:
-            f = open(file_name, 'w')
-            db.write_sorted_database(f_out=f)
-            f.close()
-        except (OSError, IOError) as ex:
+            subprocess.call([external_program, output_file_names[0], output_file_names[1]])
+        except OSError as ex:
+            print('error while calling ' + external_program)
             print(ex)
-            return
 
-    # Call external program to diff the files
-    external_program = p_args.program[0]
-    print('calling', external_program, 'with', output_file_name1, 'and', output_file_name2)
-    try:
-        subprocess.call([external_program, output_file_name1, output_file_name2])
-    except subprocess.CalledProcessError as ex:
-        print('error while calling' + external_program)
-        print(ex)
-
-    # Remove temporary files
-    try:
-        os.remove(output_file_name1)
-        os.remove(output_file_name2)
-    except OSError as ex:
-        print(ex)
+    finally:
+        # Remove temporary files
+        for output_file_name in output_file_names:
+            try:
+                os.remove(output_file_name)
+            except OSError as ex:
+                print(ex)
 
     return
 
@@ -338,7 +461,9 @@ def diff_files(file_name1, file_name2, p_args):
     :param p_args: command line arguments
     :return:
     """
-    if p_args.program:
+    if p_args.tree:
+        diff_trees(file_name1, file_name2, p_args)
+    elif p_args.program:
         diff_files_external(file_name1, file_name2, p_args)
     else:
         diff_files_internal(file_name1, file_name2, p_args)
@@ -374,6 +499,76 @@ def get_args(argv):
                         default=False,
                         help='clean up differences with legacy databases')
 
+    parser.add_argument('-s', '--stream',
+                        action='store_true',
+                        dest='stream',
+                        default=False,
+                        help='compare the databases as a stream, using bounded memory')
+
+    parser.add_argument('--sorted',
+                        action='store_true',
+                        dest='presorted',
+                        default=False,
+                        help='input files are already sorted by record name (streaming mode only)')
+
+    parser.add_argument('-n', '--numeric',
+                        action='store_true',
+                        dest='numeric',
+                        default=False,
+                        help='compare numeric field values as numbers')
+
+    parser.add_argument('--tolerance',
+                        action='store',
+                        type=float,
+                        dest='tolerance',
+                        default=DEFAULT_TOLERANCE,
+                        help='tolerance used to compare numbers [default=' + str(DEFAULT_TOLERANCE) + ']')
+
+    parser.add_argument('--dbd',
+                        action='store',
+                        dest='dbd',
+                        default='',
+                        help='dbd file used to ignore fields set to their default value (implies --numeric)')
+
+    parser.add_argument('--cache',
+                        action='store',
+                        dest='cache',
+                        default=DEFAULT_CACHE_DIRECTORY,
+                        help='directory used to cache parsed databases [default=' + DEFAULT_CACHE_DIRECTORY + ']')
+
+    parser.add_argument('--nocache',
+                        action='store_true',
+                        dest='nocache',
+                        default=False,
+                        help='do not use the parsed-database cache')
+
+    parser.add_argument('-t', '--tree',
+                        action='store_true',
+                        dest='tree',
+                        default=False,
+                        help='compare all the database files in two directory trees')
+
+    parser.add_argument('-j', '--jobs',
+                        action='store',
+                        type=int,
+                        dest='jobs',
+                        default=None,
+                        help='number of worker processes in tree mode [default=number of cpus]')
+
+    parser.add_argument('--pattern',
+                        action='store',
+                        dest='pattern',
+                        default=DEFAULT_TREE_PATTERN,
+                        help='pattern used to select database files in tree mode [default=' +
+                             DEFAULT_TREE_PATTERN + ']')
+
+    parser.add_argument('--format',
+                        action='store',
+                        dest='output_format',
+                        choices=[OUTPUT_TEXT, OUTPUT_JSON, OUTPUT_CSV],
+                        default=OUTPUT_TEXT,
+                        help='output format [default=' + OUTPUT_TEXT + ']')
+
     parser.add_argument('-m', '--macro',
                         action='append',
                         nargs=2,
@@ -22,13 +22,20 @@ The following rules are used when matching:
 * The file name will be printed as a comment ('#') when the file name option is selected or
   when greping more than one file
 
+When matching record names only, the index directory created by crossref can be used to search
+only the database files that contain matching records (--index option). The database files in
+the index are used if no input files are specified. Anchored patterns (e.g. ^tcs:drives) are
+looked up in the index without checking all the record names.
+
 """
 import sys
 import re
+from os.path import realpath
 from argparse import ArgumentParser, SUPPRESS, Namespace
 from files import process_file_list
 from db import DatabaseFile, EpicsRecord
 from db import format_record_start, format_record_end, format_field
+from recordindex import read_record_index
 
 # Variable used to control printing of debug output.
 # A global variable was used for code readability.
@@ -58,6 +65,32 @@ def print_all_fields(record):
     return
 
 
+def indexed_file_list(p_args):
+    """
+    Return the list of database files that contain records matching the pattern,
+    according to the record name index. The index is searched with the record names
+    as they appear in the files, so the results are the same as without the index.
+    If input files were specified, only the input files that contain matching records
+    are returned, plus the input files not covered by the index (e.g. from an old
+    manifest), which are scanned. Otherwise the absolute file names are returned.
+    :param p_args: command line arguments
+    :type p_args: Namespace
+    :return: list of database files
+    :rtype: list
+    """
+    indexed_set = set()
+    record_index = read_record_index(p_args.index, indexed_set, raw=True)
+    names = record_index.search(p_args.pattern, re.IGNORECASE if p_args.ignorecase else 0)
+    database_list = sorted(set([d for name in names for _, d, _ in record_index.get(name)]))
+    if debug_flag:
+        print('indexed matches', len(names), database_list)
+    if p_args.files:
+        database_set = set([realpath(d) for d in database_list])
+        indexed_set = set([realpath(d) for d in indexed_set])
+        return [f for f in p_args.files if realpath(f) in database_set or realpath(f) not in indexed_set]
+    return database_list
+
+
 def grep_file(f, file_name, p_args):
     """
     This routine looks for matches in the record name, record type, field name and/or field value.
@@ -244,6 +277,12 @@ def get_args(argv):
                         default=False,
                         help='print file names only')
 
+    parser.add_argument('-x', '--index',
+                        action='store',
+                        dest='index',
+                        default='',
+                        help='crossref index directory used to find the files to search (with -r only)')
+
     parser.add_argument(action='store',
                         dest='pattern',
                         default='')
@@ -285,6 +324,16 @@ if __name__ == '__main__':
         if debug_flag:
             print(args.record_name, args.record_type, args.field_name, args.field_value)
 
+        # Use the index to find the files to search when matching record names only.
+        # There's nothing to do if there are no files with matching records.
+        if args.index:
+            if args.record_type or args.field_name or args.field_value:
+                print('The index can only be used when matching record names (-r)')
+                sys.exit(1)
+            args.files = indexed_file_list(args)
+            if not args.files:
+                sys.exit(0)
+
         process_file_list(args.files, grep_file, args=args)
 
     except Exception as e:
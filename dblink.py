@@ -0,0 +1,140 @@
+"""
+Routines used to parse the value of link fields (INP, OUT, DOL, FLNK, SDIS, etc.) in EPICS databases.
+
+The routine parse_link() converts a field value into a DbLink object. Link values can be:
+
+  * empty (null link)
+
+  * numeric constants (e.g. 1.5) or JSON constants and links (e.g. [1, 2] or {"calc": ...})
+
+  * hardware addresses, starting with # (VME, CAMAC, etc.) or @ (instrument i/o)
+
+  * process variable links: a record name with an optional field name, followed by the
+    optional process mode (NPP, PP, CA, CP or CPP) and maximize severity (NMS, MS, MSS or MSI)
+    modifiers, e.g. "tcs:pos.VAL CP MS". The modifiers can also be written after the field
+    name separated by a dot (e.g. "tcs:pos.VAL.PP"), as some schematic tools do.
+
+Values that don't match any of the above (e.g. a DESC field) are classified as strings.
+The field type is not known when parsing, so any single word is considered a process variable.
+
+Link values repeat a lot in large databases, so the results are cached.
+"""
+import re
+import functools
+from collections import namedtuple
+
+# Link kinds
+LINK_NULL = 'null'
+LINK_CONSTANT = 'constant'
+LINK_JSON = 'json'
+LINK_HARDWARE = 'hardware'
+LINK_PV = 'pv'
+LINK_STRING = 'string'
+
+# Process mode and maximize severity modifiers
+PROCESS_MODES = frozenset(['NPP', 'PP', 'CA', 'CP', 'CPP'])
+SEVERITY_MODES = frozenset(['NMS', 'MS', 'MSS', 'MSI'])
+
+# Process modes that imply a channel access link
+CA_MODES = frozenset(['CA', 'CP', 'CPP'])
+
+# Regular expression used to recognize numeric constants
+NUMBER_PATTERN = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$|^[+-]?0[xX][0-9a-fA-F]+$')
+
+# Maximum number of link values kept in the cache
+CACHE_SIZE = 65536
+
+
+class DbLink(namedtuple('DbLink', ['kind', 'record', 'field', 'process', 'severity', 'value'])):
+    """
+    Parsed link value. The record, field, process and severity members are only defined
+    for process variable links, and are None otherwise (or when not specified in the link).
+    The value member contains the original value without surrounding spaces.
+    """
+    __slots__ = ()
+
+    def is_pv(self):
+        """
+        :return: True if the link is a process variable link
+        :rtype: bool
+        """
+        return self.kind == LINK_PV
+
+    def is_channel_access(self):
+        """
+        :return: True if the link is a channel access link (CA, CP or CPP)
+        :rtype: bool
+        """
+        return self.process in CA_MODES
+
+    def get_field(self):
+        """
+        :return: target field name, VAL if not specified in the link
+        :rtype: str
+        """
+        return self.field if self.field else 'VAL'
+
+    def canonical(self):
+        """
+        Return the link value in canonical form. Modifiers are separated by single spaces and
+        written in the same order (process mode first). Values that are not process variable
+        links are returned as they are.
+        :return: canonical link value
+        :rtype: str
+        """
+        if self.kind != LINK_PV:
+            return self.value
+        output = self.record if self.field is None else self.record + '.' + self.field
+        if self.process is not None:
+            output += ' ' + self.process
+        if self.severity is not None:
+            output += ' ' + self.severity
+        return output
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_link(value):
+    """
+    Parse a link value.
+    :param value: field value
+    :type value: str
+    :return: parsed link
+    :rtype: DbLink
+    """
+    value = value.strip()
+    text = value.replace('"', '').strip()
+    if not text:
+        return DbLink(LINK_NULL, None, None, None, None, value)
+    first = text[0]
+    if first == '#' or first == '@':
+        return DbLink(LINK_HARDWARE, None, None, None, None, value)
+    if first == '[' or first == '{':
+        return DbLink(LINK_JSON, None, None, None, None, value)
+    if NUMBER_PATTERN.match(text):
+        return DbLink(LINK_CONSTANT, None, None, None, None, value)
+
+    words = text.split()
+    parts = words[0].split('.')
+    modifiers = words[1:]
+
+    # Modifiers written after the field name (e.g. rec.VAL.PP.MS, or rec.PP when there's no field)
+    while len(parts) > 1 and (parts[-1] in PROCESS_MODES or parts[-1] in SEVERITY_MODES):
+        modifiers.insert(0, parts.pop())
+    if len(parts) > 2 or not parts[0]:
+        return DbLink(LINK_STRING, None, None, None, None, value)
+
+    process = None
+    severity = None
+    for word in modifiers:
+        if word in PROCESS_MODES and process is None:
+            process = word
+        elif word in SEVERITY_MODES and severity is None:
+            severity = word
+        else:
+            return DbLink(LINK_STRING, None, None, None, None, value)
+
+    return DbLink(LINK_PV, parts[0], parts[1] if len(parts) > 1 and parts[1] else None, process, severity, value)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Three-way merge of EPICS database files.
+
+Merge the changes made to a base database in two different versions of it (ours and theirs),
+in the same way as a version control system would do with text files, but taking into account
+the database structure. Records changed in only one of the versions are taken from that version.
+Records changed in both versions are merged field by field.
+
+A conflict is reported when the same field (or the record type) was changed in both versions
+to different values, or when a record was deleted in one version and changed in the other.
+Our version is kept in the output when there's a conflict.
+
+The merged database is written to the standard output (or to the output file). Conflicts are
+printed to the standard error, and can also be written to a file in JSON format. The program
+exits with status 1 if there are conflicts.
+"""
+import sys
+from argparse import ArgumentParser, SUPPRESS, Namespace
+from db import DatabaseFile, EpicsDatabase
+from dbcompare import MergeResult, merge_databases
+
+# Variable used to control printing of debug output.
+debug_flag = False
+
+
+def read_database_file(file_name):
+    """
+    Read a database file into memory and close it.
+    :param file_name: file name
+    :type file_name: str
+    :return: database
+    :rtype: EpicsDatabase
+    """
+    df = DatabaseFile(file_name=file_name)
+    db = df.read_database()
+    df.close()
+    return db
+
+
+def merge_files(base_file_name, our_file_name, their_file_name, p_args):
+    """
+    Read the three database files, merge them and write the output.
+    :param base_file_name: base database file name
+    :type base_file_name: str
+    :param our_file_name: our database file name
+    :type our_file_name: str
+    :param their_file_name: their database file name
+    :type their_file_name: str
+    :param p_args: command line arguments
+    :type p_args: Namespace
+    :return: True if the merge had no conflicts
+    :rtype: bool
+    """
+    if debug_flag:
+        print('\n-- merge_files', base_file_name, our_file_name, their_file_name, file=sys.stderr)
+
+    result = merge_databases(read_database_file(base_file_name),
+                             read_database_file(our_file_name),
+                             read_database_file(their_file_name))
+    assert (isinstance(result, MergeResult))
+
+    if debug_flag:
+        print('records merged field by field:', result.changed_count, file=sys.stderr)
+
+    if p_args.output:
+        with open(p_args.output, 'w') as f:
+            result.database.write_database(f_out=f)
+    else:
+        result.database.write_database()
+
+    result.write_conflicts_text()
+    if p_args.conflicts:
+        with open(p_args.conflicts, 'w') as f:
+            result.write_conflicts_json(f_out=f)
+
+    return len(result.conflicts) == 0
+
+
+def get_args(argv):
+    """
+    Process command line arguments
+    :param argv: command line arguments from sys.argv
+    :type argv: list
+    :return: arguments
+    :rtype: Namespace
+    """
+
+    parser = ArgumentParser(epilog='The merged database is written to the standard output by default')
+
+    parser.add_argument(action='store',
+                        dest='base',
+                        help='base database file')
+
+    parser.add_argument(action='store',
+                        dest='ours',
+                        help='our database file')
+
+    parser.add_argument(action='store',
+                        dest='theirs',
+                        help='their database file')
+
+    parser.add_argument('-o', '--output',
+                        action='store',
+                        dest='output',
+                        default='',
+                        help='output file [default=standard output]')
+
+    parser.add_argument('--conflicts',
+                        action='store',
+                        dest='conflicts',
+                        default='',
+                        help='write the list of conflicts to a file in JSON format')
+
+    parser.add_argument('--debug',
+                        action='store_true',
+                        dest='debug',
+                        default=False,
+                        help=SUPPRESS)
+
+    return parser.parse_args(argv[1:])
+
+
+if __name__ == '__main__':
+    try:
+        args = get_args(sys.argv)
+        debug_flag = args.debug
+        if debug_flag:
+            print(args, file=sys.stderr)
+        if not merge_files(args.base, args.ours, args.theirs, args):
+            sys.exit(1)
+    except (OSError, IOError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
@@ -3,6 +3,7 @@ File handling routines.
 """
 import sys
 import os
+import fnmatch
 from argparse import Namespace
 
 
@@ -97,6 +98,27 @@ def list_directories(directory_list=None, skip_directories=True):
     return file_list
 
 
+def list_tree(directory='.', pattern='*'):
+    """
+    Return the list of files in a directory and all its subdirectories whose name
+    matches a shell pattern (e.g. '*.db'). The files returned will have the directory
+    name prepended to them. The list is sorted to make the output reproducible.
+    :param directory: top directory name
+    :type directory: str
+    :param pattern: shell pattern used to select files
+    :type pattern: str
+    :return: file list
+    :rtype: list
+    """
+    if not os.path.isdir(directory):
+        raise IOError(directory + ' is not a directory')
+    output_list = []
+    for dir_path, dir_names, file_names in os.walk(directory):
+        for file_name in fnmatch.filter(file_names, pattern):
+            output_list.append(os.path.join(dir_path, file_name))
+    return sorted(output_list)
+
+
 def _callback_test(f, file_name, args):
     """
     Callback function used to test process_file_list
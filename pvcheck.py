@@ -1,7 +1,188 @@
 #!/usr/bin/env python
+"""
+Check the syntax and consistency of pvload/pvsave files.
+
+Files and directories (searched recursively for files matching a pattern) can be specified
+in the command line. The files are checked in a process pool, and the errors and warnings
+found are printed in the same order as the files, followed by the totals. The report can
+also be written in JSON format.
+
+When a database directory is specified, the process variables in the files are also checked
+against the records defined in the databases (see pvdb).
+
+The exit status is 1 if any errors were found, 0 otherwise.
+"""
 import sys
+import json
+from os.path import isdir
 from argparse import ArgumentParser, SUPPRESS
-from pvparser import PvParser
+from concurrent.futures import ProcessPoolExecutor
+from files import list_tree
+from cache import DEFAULT_CACHE_DIRECTORY
+from dbd import read_dbd_file
+from pvdb import read_record_table, check_model
+from pvparser import PvParser, Diagnostic, SEVERITY_ERROR, SEVERITY_WARNING
+from pvtrace import ProfileHook
+
+# Default pattern used to select files in directories
+DEFAULT_PATTERN = '*.pv'
+
+# Number of files sent to a worker process at a time
+CHUNK_SIZE = 16
+
+# Record table and dbd definitions used to check the process variables (None if not checking).
+# They are set once in each worker process by init_worker.
+check_record_table = None
+check_dbd = None
+
+
+def expand_file_list(file_list, pattern):
+    """
+    Replace the directories in a file list by the files in them (and their subdirectories)
+    that match a pattern
+    :param file_list: list of file and directory names
+    :type file_list: list
+    :param pattern: shell pattern used to select files in directories
+    :type pattern: str
+    :return: list of file names
+    :rtype: list
+    """
+    output_list = []
+    for file_name in file_list:
+        if isdir(file_name):
+            output_list.extend(list_tree(file_name, pattern))
+        else:
+            output_list.append(file_name)
+    return output_list
+
+
+def init_worker(record_table, dbd):
+    """
+    Set the record table and dbd definitions used to check the process variables
+    :param record_table: dictionary indexed by record name with RecordInfo tuples, or None
+    :type record_table: dict
+    :param dbd: dbd definitions, or None
+    :type dbd: DbdFile
+    """
+    global check_record_table, check_dbd
+    check_record_table = record_table
+    check_dbd = dbd
+
+
+def check_file(task):
+    """
+    Check a single file. This routine runs in the worker processes.
+    The process variables are checked against the record table if one was set by init_worker.
+    :param task: file name, and whether to profile the parser
+    :type task: tuple
+    :return: file name, list of diagnostics and profile hook (None if not profiling)
+    :rtype: tuple
+    """
+    file_name, profile = task
+    hook = ProfileHook() if profile else None
+    pv_parser = PvParser(hook=hook, model=check_record_table is not None)
+    if pv_parser.pv_file(file_name):
+        diagnostics = pv_parser.diagnostics
+        if check_record_table is not None:
+            diagnostics = sorted(diagnostics + check_model(pv_parser.model, check_record_table, check_dbd),
+                                 key=lambda d: d.line)
+    else:
+        diagnostics = [Diagnostic(file_name, 0, 0, SEVERITY_ERROR, 'could not open file', '')]
+    return file_name, diagnostics, hook
+
+
+def check_files(file_list, jobs, profile=False, record_table=None, dbd=None):
+    """
+    Check a list of files in a process pool.
+    The diagnostics are returned in the same order as the files.
+    :param file_list: list of file names
+    :type file_list: list
+    :param jobs: number of worker processes (None for the number of cpus)
+    :type jobs: int
+    :param profile: profile the parser?
+    :type profile: bool
+    :param record_table: dictionary indexed by record name with RecordInfo tuples (None to skip the check)
+    :type record_table: dict
+    :param dbd: dbd definitions used to check the field types, or None
+    :type dbd: DbdFile
+    :return: list of diagnostics and profile hook (None if not profiling)
+    :rtype: tuple
+    """
+    tasks = [(file_name, profile) for file_name in file_list]
+    profile_hook = ProfileHook() if profile else None
+    diagnostics = []
+    if jobs == 1 or len(tasks) < 2:
+        init_worker(record_table, dbd)
+        results = map(check_file, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(record_table, dbd))
+        results = executor.map(check_file, tasks, chunksize=CHUNK_SIZE)
+    try:
+        for file_name, file_diagnostics, hook in results:
+            diagnostics.extend(file_diagnostics)
+            if profile_hook is not None:
+                profile_hook.merge(hook)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return diagnostics, profile_hook
+
+
+def count_diagnostics(diagnostics):
+    """
+    Count the errors and warnings
+    :param diagnostics: list of diagnostics
+    :type diagnostics: list
+    :return: number of errors and warnings
+    :rtype: tuple
+    """
+    errors = sum(1 for d in diagnostics if d.severity == SEVERITY_ERROR)
+    warnings = sum(1 for d in diagnostics if d.severity == SEVERITY_WARNING)
+    return errors, warnings
+
+
+def print_report(file_list, diagnostics, verbose, f_out=sys.stdout):
+    """
+    Print the diagnostics followed by the totals
+    :param file_list: list of file names checked
+    :type file_list: list
+    :param diagnostics: list of diagnostics
+    :type diagnostics: list
+    :param verbose: print the file names?
+    :type verbose: bool
+    :param f_out: output file
+    :type f_out: file
+    """
+    last_file = None
+    for diagnostic in diagnostics:
+        if verbose and diagnostic.file != last_file:
+            print(diagnostic.file, file=f_out)
+            last_file = diagnostic.file
+        print(diagnostic, file=f_out)
+    errors, warnings = count_diagnostics(diagnostics)
+    print('{0} files, {1} errors, {2} warnings'.format(len(file_list), errors, warnings), file=f_out)
+
+
+def write_json_report(file_list, diagnostics, f_out=sys.stdout):
+    """
+    Write the diagnostics and totals in JSON format
+    :param file_list: list of file names checked
+    :type file_list: list
+    :param diagnostics: list of diagnostics
+    :type diagnostics: list
+    :param f_out: output file
+    :type f_out: file
+    """
+    errors, warnings = count_diagnostics(diagnostics)
+    json.dump({
+        'files': len(file_list),
+        'errors': errors,
+        'warnings': warnings,
+        'diagnostics': [d._asdict() for d in diagnostics]
+    }, f_out, indent=2)
+    f_out.write('\n')
+
 
 if __name__ == '__main__':
     """
@@ -9,18 +190,69 @@ if __name__ == '__main__':
     """
 
     # Command line arguments
-    parser = ArgumentParser(epilog='')
+    parser = ArgumentParser(epilog='Directories are searched recursively for files matching the pattern')
 
     parser.add_argument(action='store',
                         nargs='*',
                         dest='file_list',
                         default=[],
-                        help='list of input files')
+                        help='list of input files or directories')
+
+    parser.add_argument('-p', '--pattern',
+                        action='store',
+                        dest='pattern',
+                        default=DEFAULT_PATTERN,
+                        help='pattern used to select files in directories [default=' + DEFAULT_PATTERN + ']')
+
+    parser.add_argument('-j', '--jobs',
+                        action='store',
+                        type=int,
+                        dest='jobs',
+                        default=None,
+                        help='number of worker processes [default=number of cpus]')
+
+    parser.add_argument('--db',
+                        action='store',
+                        dest='db',
+                        default='',
+                        metavar='DIR',
+                        help='check the process variables against the databases (.db) in this directory')
+
+    parser.add_argument('--dbd',
+                        action='store',
+                        dest='dbd',
+                        default='',
+                        help='dbd file used to check the field names and types (requires --db)')
+
+    parser.add_argument('--cache',
+                        action='store',
+                        dest='cache',
+                        default=DEFAULT_CACHE_DIRECTORY,
+                        help='directory used to cache the database records [default=' + DEFAULT_CACHE_DIRECTORY + ']')
+
+    parser.add_argument('--nocache',
+                        action='store_true',
+                        dest='nocache',
+                        default=False,
+                        help='do not use the cache')
+
+    parser.add_argument('--json',
+                        action='store_true',
+                        dest='json',
+                        default=False,
+                        help='write the report in JSON format')
 
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         dest='verbose',
-                        default=False)
+                        default=False,
+                        help='print the file name before its errors and warnings')
+
+    parser.add_argument('--profile',
+                        action='store_true',
+                        dest='profile',
+                        default=False,
+                        help='print the calls and time spent in each grammar rule')
 
     parser.add_argument('-d', '--debug',
                         action='store_true',
@@ -30,8 +262,40 @@ if __name__ == '__main__':
 
     args = parser.parse_args(sys.argv[1:])
 
-    pv_parser = PvParser(args.debug, args.verbose)
-    # pv_parser.set_debug(args.debug)
+    try:
+        input_files = expand_file_list(args.file_list, args.pattern)
+    except IOError as e:
+        print(e, file=sys.stderr)
+        exit(2)
+
+    if args.debug:
+        # Trace output only makes sense when the files are checked one at a time in this process
+        pv_parser = PvParser(debug=True)
+        for input_file in input_files:
+            pv_parser.pv_file(input_file)
+            for d in pv_parser.diagnostics:
+                print(d)
+        exit(0)
+
+    table = None
+    dbd_file = None
+    if args.db:
+        cache_dir = None if args.nocache else args.cache
+        try:
+            table = read_record_table(args.db, cache_dir)
+            dbd_file = read_dbd_file(args.dbd, cache_dir) if args.dbd else None
+        except (OSError, IOError) as e:
+            print(e, file=sys.stderr)
+            exit(2)
+
+    diagnostic_list, profile_hook = check_files(input_files, args.jobs, args.profile, table, dbd_file)
+
+    if args.json:
+        write_json_report(input_files, diagnostic_list)
+    else:
+        print_report(input_files, diagnostic_list, args.verbose)
+
+    if profile_hook is not None:
+        profile_hook.report(sys.stderr)
 
-    for file_name in args.file_list:
-        pv_parser.pv_file(file_name)
+    exit(1 if count_diagnostics(diagnostic_list)[0] else 0)
@@ -0,0 +1,236 @@
+"""
+Routines used to check the process variables in pvload files against the EPICS databases.
+
+The record table is a dictionary indexed by record name with a RecordInfo tuple for each record
+(record type, number of elements and element type for array records). It's built from all
+the database files in a directory tree, and it's kept in the cache one database file at a
+time, so only the files that changed are read again.
+
+The routine check_model() compares the single statements in a pvload file model with the
+record table:
+
+  * the record must be defined in one of the databases (error otherwise)
+
+  * the type declared in the statement must be compatible with the field type (warning)
+
+  * the statement count must not exceed the number of elements of the record (warning)
+
+Field types are taken from the dbd file when one is given. Otherwise only the VAL field of
+the record types in DEFAULT_VAL_TYPES and array records (FTVL) can be checked.
+"""
+import sys
+from collections import namedtuple
+from files import list_tree
+from db import DatabaseFile
+from cache import cache_key, read_cache, write_cache
+from pvmodel import next_single
+from pvparser import PvParser, Diagnostic, SEVERITY_ERROR, SEVERITY_WARNING
+from pvparser import TYPE_NONE, TYPE_INTEGER, TYPE_FLOAT, TYPE_STRING
+
+# Pattern used to select database files
+DATABASE_PATTERN = '*.db'
+
+# Basic pvload type for each field type. Enumerated and menu fields accept both
+# numbers and strings, so they are not checked.
+FIELD_TYPES = {
+    'DBF_STRING': TYPE_STRING,
+    'DBF_INLINK': TYPE_STRING,
+    'DBF_OUTLINK': TYPE_STRING,
+    'DBF_FWDLINK': TYPE_STRING,
+    'DBF_CHAR': TYPE_INTEGER,
+    'DBF_UCHAR': TYPE_INTEGER,
+    'DBF_SHORT': TYPE_INTEGER,
+    'DBF_USHORT': TYPE_INTEGER,
+    'DBF_LONG': TYPE_INTEGER,
+    'DBF_ULONG': TYPE_INTEGER,
+    'DBF_INT64': TYPE_INTEGER,
+    'DBF_UINT64': TYPE_INTEGER,
+    'DBF_FLOAT': TYPE_FLOAT,
+    'DBF_DOUBLE': TYPE_FLOAT
+}
+
+# Type of the VAL field for common record types, used when no dbd file is available
+DEFAULT_VAL_TYPES = {
+    'ai': 'DBF_DOUBLE',
+    'ao': 'DBF_DOUBLE',
+    'calc': 'DBF_DOUBLE',
+    'calcout': 'DBF_DOUBLE',
+    'sel': 'DBF_DOUBLE',
+    'sub': 'DBF_DOUBLE',
+    'longin': 'DBF_LONG',
+    'longout': 'DBF_LONG',
+    'int64in': 'DBF_INT64',
+    'int64out': 'DBF_INT64',
+    'stringin': 'DBF_STRING',
+    'stringout': 'DBF_STRING'
+}
+
+# Basic pvload types that can be written into a field of each basic type
+COMPATIBLE_TYPES = {
+    TYPE_STRING: frozenset([TYPE_STRING]),
+    TYPE_INTEGER: frozenset([TYPE_INTEGER]),
+    TYPE_FLOAT: frozenset([TYPE_INTEGER, TYPE_FLOAT])
+}
+
+# Names used for the basic types in messages
+TYPE_NAMES = {TYPE_INTEGER: 'integer', TYPE_FLOAT: 'float', TYPE_STRING: 'string'}
+
+RecordInfo = namedtuple('RecordInfo', ['record_type', 'nelm', 'ftvl'])
+
+
+def read_database_records(file_name, cache_directory=None):
+    """
+    Read the records defined in a database file
+    :param file_name: database file name
+    :type file_name: str
+    :param cache_directory: cache directory, or None to disable the cache
+    :type cache_directory: str
+    :return: list of (record name, RecordInfo) tuples
+    :rtype: list
+    """
+    key = None
+    if cache_directory:
+        key = cache_key('records', [file_name])
+        record_list = read_cache(key, cache_directory)
+        if isinstance(record_list, list):
+            return record_list
+
+    # The NELM and FTVL fields are needed, so the whole record is read
+    record_list = []
+    db = DatabaseFile(file_name=file_name)
+    try:
+        for record in db.next_record():
+            nelm = record.get_field_value('NELM')
+            ftvl = record.get_field_value('FTVL')
+            try:
+                nelm = int(nelm.strip()) if nelm is not None else None
+            except ValueError:
+                nelm = None  # macro or invalid value
+            record_list.append((record.get_name(),
+                                RecordInfo(record.get_type(), nelm, ftvl.strip() if ftvl is not None else None)))
+    finally:
+        db.close()
+
+    if key is not None:
+        write_cache(key, record_list, cache_directory)
+    return record_list
+
+
+def read_record_table(directory, cache_directory=None):
+    """
+    Build the record table from all the database files in a directory and its subdirectories.
+    The first definition is used for records defined in more than one file.
+    :param directory: top directory name
+    :type directory: str
+    :param cache_directory: cache directory, or None to disable the cache
+    :type cache_directory: str
+    :return: dictionary indexed by record name with RecordInfo tuples
+    :rtype: dict
+    """
+    record_table = {}
+    for file_name in list_tree(directory, DATABASE_PATTERN):
+        try:
+            record_list = read_database_records(file_name, cache_directory)
+        except (OSError, IOError) as e:
+            print('Could not read', file_name, str(e), file=sys.stderr)
+            continue
+        for record_name, info in record_list:
+            record_table.setdefault(record_name, info)
+    return record_table
+
+
+def split_pv_name(pv_name):
+    """
+    Split a process variable name into record name and field name
+    :param pv_name: process variable name (e.g. tcs:pos.VAL)
+    :type pv_name: str
+    :return: record name and field name (VAL if not specified)
+    :rtype: tuple
+    """
+    record_name, _, field_name = pv_name.partition('.')
+    return record_name, field_name if field_name else 'VAL'
+
+
+def get_field_type(info, field_name, dbd=None):
+    """
+    Return the type of a record field
+    :param info: record information
+    :type info: RecordInfo
+    :param field_name: field name
+    :type field_name: str
+    :param dbd: dbd definitions, or None
+    :type dbd: DbdFile
+    :return: field type (e.g. DBF_DOUBLE), or None if not known
+    :rtype: str
+    """
+    if field_name == 'VAL' and info.ftvl is not None:
+        return 'DBF_' + info.ftvl.replace('DBF_', '')
+    field_type = dbd.get_field_type(info.record_type, field_name) if dbd is not None else None
+    if field_type is None and field_name == 'VAL':
+        return DEFAULT_VAL_TYPES.get(info.record_type)
+    return field_type
+
+
+def check_single(single, record_table, dbd=None):
+    """
+    Check a single statement against the record table
+    :param single: single statement
+    :type single: PvSingle
+    :param record_table: dictionary indexed by record name with RecordInfo tuples
+    :type record_table: dict
+    :param dbd: dbd definitions, or None
+    :type dbd: DbdFile
+    :return: list of (severity, message) tuples
+    :rtype: list
+    """
+    record_name, field_name = split_pv_name(single.name)
+    info = record_table.get(record_name)
+    if info is None:
+        return [(SEVERITY_ERROR, 'record ' + record_name + ' not found in the databases')]
+
+    output_list = []
+    fields = dbd.record_types.get(info.record_type) if dbd is not None else None
+    if fields is not None and field_name not in fields:
+        output_list.append((SEVERITY_WARNING, 'field ' + field_name + ' not defined for record type ' +
+                            info.record_type))
+
+    # Type check, only when the statement declares a type and the field type is known
+    data_type = PvParser.map_type_name(single.type) if single.type is not None else TYPE_NONE
+    field_type = FIELD_TYPES.get(get_field_type(info, field_name, dbd))
+    if data_type != TYPE_NONE and field_type is not None and data_type not in COMPATIBLE_TYPES[field_type]:
+        output_list.append((SEVERITY_WARNING, 'type {0} does not match {1} field {2}.{3}'.format(
+            single.type, TYPE_NAMES[field_type], record_name, field_name)))
+
+    # Array size check
+    if field_name == 'VAL' and single.count > 1:
+        if info.nelm is None and info.ftvl is None:
+            output_list.append((SEVERITY_WARNING, 'array of {0} elements for scalar record {1}'.format(
+                single.count, record_name)))
+        elif info.nelm is not None and single.count > info.nelm:
+            output_list.append((SEVERITY_WARNING, 'array of {0} elements larger than NELM={1} in {2}'.format(
+                single.count, info.nelm, record_name)))
+    return output_list
+
+
+def check_model(model, record_table, dbd=None):
+    """
+    Check all the single statements in a pvload file model against the record table.
+    Each process variable is looked up in constant time.
+    :param model: model of the file
+    :type model: PvFile
+    :param record_table: dictionary indexed by record name with RecordInfo tuples
+    :type record_table: dict
+    :param dbd: dbd definitions, or None
+    :type dbd: DbdFile
+    :return: list of diagnostics
+    :rtype: list
+    """
+    output_list = []
+    for single in next_single(model.items):
+        for severity, message in check_single(single, record_table, dbd):
+            output_list.append(Diagnostic(model.file_name, single.line, 0, severity, message, ''))
+    return output_list
+
+
+if __name__ == '__main__':
+    pass
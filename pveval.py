@@ -0,0 +1,150 @@
+"""
+Routines used to compute the values assigned by the single statements in a pvload file.
+
+The evaluator takes the model built by the parser (see pvmodel) and converts each numeric
+single statement into an array of doubles with the size of the statement count, with the
+values placed at their indices and the scale factors and units applied.
+
+Units are converted to SI units (radians and metres) using the factors in UNIT_FACTORS.
+Array elements that are not assigned by a statement are set to NaN.
+
+The values are converted in bulk: the factor for each distinct scale in a statement is
+computed only once, and the results are stored in compact arrays (array module).
+"""
+import math
+from array import array
+from pvmodel import SCALE_DIVIDE, next_single
+from pvparser import STRING_TYPE_NAMES
+
+# Conversion factors for the units recognized by the lexer
+UNIT_FACTORS = {
+    'arcsec': math.pi / (180.0 * 3600.0),
+    'deg': math.pi / 180.0,
+    'microns': 1e-6,
+    'um': 1e-6,
+    'millimeters': 1e-3,
+    'millimetres': 1e-3,
+    'mm': 1e-3,
+    'meters': 1.0,
+    'metres': 1.0,
+    'm': 1.0
+}
+
+# Value used for the array elements not assigned by a statement
+NOT_ASSIGNED = float('nan')
+
+
+def to_float(value):
+    """
+    Convert a numeric value from a pvload file into a float. Hexadecimal integers and
+    a leading decimal comma (e.g. ',5', accepted by the lexer) are allowed.
+    :param value: value as it appears in the file
+    :type value: str
+    :return: value
+    :rtype: float
+    :raises: ValueError if the value is not a number
+    """
+    try:
+        return float(value)
+    except ValueError:
+        if ',' in value:
+            return float(value.replace(',', '.'))
+        return float(int(value, 0))
+
+
+def scale_factor(scale):
+    """
+    Return the factor used to multiply a value for a given scale
+    :param scale: (operator, factor or unit) tuple, or None
+    :type scale: tuple
+    :return: factor
+    :rtype: float
+    :raises: ValueError if the factor is not a number or a known unit
+    """
+    if scale is None:
+        return 1.0
+    operator, operand = scale
+    factor = UNIT_FACTORS[operand] if operand in UNIT_FACTORS else to_float(operand)
+    return 1.0 / factor if operator == SCALE_DIVIDE else factor
+
+
+def is_numeric(single):
+    """
+    Check whether a single statement assigns numeric values
+    :param single: single statement
+    :type single: PvSingle
+    :return: False if the statement has a string type or any string value
+    :rtype: bool
+    """
+    if single.type in STRING_TYPE_NAMES:
+        return False
+    return not any(value.startswith('"') for value in single.values)
+
+
+def evaluate_single(single):
+    """
+    Compute the values assigned by a single statement
+    :param single: single statement
+    :type single: PvSingle
+    :return: array of values with the statement count size, or None if the statement is not numeric
+    :rtype: array.array
+    :raises: ValueError if the values, scales or indices are not valid
+    """
+    if not is_numeric(single):
+        return None
+
+    # Factors are computed once for each distinct scale
+    factors = {}
+    for scale in single.scales:
+        if scale not in factors:
+            factors[scale] = scale_factor(scale)
+    values = array('d', [to_float(v) * factors[s] for v, s in zip(single.values, single.scales)])
+
+    count = single.count
+    if single.indices:
+        if len(single.indices) != len(values):
+            raise ValueError(single.name + ': missing indices')
+        if min(single.indices) < 0 or max(single.indices) >= count:
+            raise ValueError(single.name + ': index out of range')
+        output = array('d', [NOT_ASSIGNED]) * count
+        for index, value in zip(single.indices, values):
+            output[index] = value
+        return output
+
+    if len(values) > count:
+        raise ValueError(single.name + ': too many values')
+    if len(values) < count:
+        values.extend(array('d', [NOT_ASSIGNED]) * (count - len(values)))
+    return values
+
+
+def evaluate_model(model):
+    """
+    Compute the final values assigned to each process variable in a file. When the same
+    process variable is assigned more than once, the elements assigned by the later
+    statements replace the previous ones. Statements that are not numeric are skipped.
+    :param model: model of the file
+    :type model: PvFile
+    :return: dictionary indexed by process variable name with the array of values
+    :rtype: dict
+    :raises: ValueError if the values, scales or indices of any statement are not valid
+    """
+    output_dict = {}
+    for single in next_single(model.items):
+        values = evaluate_single(single)
+        if values is None:
+            continue
+        previous = output_dict.get(single.name)
+        if previous is None:
+            output_dict[single.name] = values
+            continue
+        if len(previous) < len(values):
+            previous.extend(array('d', [NOT_ASSIGNED]) * (len(values) - len(previous)))
+        for i, value in enumerate(values):
+            if not math.isnan(value):
+                previous[i] = value
+    return output_dict
+
+
+if __name__ == '__main__':
+    pass
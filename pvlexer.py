@@ -1,4 +1,16 @@
+"""
+Lexical analyzer for EPICS pvload/pvsave files.
+
+The lexer reads the input file one line at a time and splits each line into tokens.
+Only the tokens for the current line are kept in memory, so files of any size can be
+processed. Tokens include the line and column where they were found, for error messages.
+
+The parser reads one token at a time with next_token(). The tokens() generator can be
+used by other programs to process all the tokens in a file.
+"""
 import re
+import sys
+from collections import deque
 from pvtoken import PvToken
 
 # Token definitions
@@ -36,136 +48,164 @@ TOKEN_ERROR = -1
 class PvLexer:
     # Lexer regular expressions. The order matters!
     # In general, regular expressions are ordered with the most complex ones first.
+    # All the expressions are combined into a single regular expression with one named
+    # group per expression. The alternatives are tried in order, so the first expression
+    # that matches at a given position wins, as if they were tried one at a time.
+    # Number constants have subgroups for the fraction, leading decimal point and exponent,
+    # which are used to tell integers from reals. A leading decimal comma (e.g. ',5') is not
+    # accepted right after a value, where the comma is the separator in a list (e.g. {1,2}).
     lexer_patterns = [
-        (r'[\s]+', TOKEN_WHITESPACE),
-        (r'-?0[xX][\da-fA-F]+', TOKEN_INTEGER),
-        (r'[-+]?(\d+([.]\d*)?|[.,]\d+)([eE][-+]?\d+)?', TOKEN_NUMBER),
-        (r'".+"', TOKEN_STRING),
-        (r'string|int|short|float|enum|char|long|double', TOKEN_TYPE),
-        (r'arcsec|deg', TOKEN_UNIT),
-        (r'microns|um', TOKEN_UNIT),
-        (r'millimeters|millimetres|mm', TOKEN_UNIT),
-        (r'meters|metres|m', TOKEN_UNIT),
-        (r'group', TOKEN_GROUP),
-        (r'sleep', TOKEN_SLEEP),
-        (r'[\w:\(\)\$]+(\.[\w]+)?', TOKEN_PVNAME),
-        (r'#', TOKEN_COMMENT),
-        (r';', TOKEN_SEMICOLON),
-        (r'=', TOKEN_EQUALS),
-        (r',', TOKEN_COMMA),
-        (r'\*', TOKEN_TIMES),
-        (r'/', TOKEN_DIVIDED),
-        (r'%', TOKEN_PERCENT),
-        (r'{', TOKEN_LEFT_BRACE),
-        (r'}', TOKEN_RIGHT_BRACE),
-        (r'\[', TOKEN_LEFT_BRACKET),
-        (r'\]', TOKEN_RIGHT_BRACKET),
+        ('whitespace', r'[\s]+', TOKEN_WHITESPACE),
+        ('hex', r'-?0[xX][\da-fA-F]+', TOKEN_INTEGER),
+        ('number', r'[-+]?(?:\d+(?P<fraction>[.]\d*)?|(?P<leading>(?:[.]|(?<![\w."\]]),)\d+))'
+                   r'(?P<exponent>[eE][-+]?\d+)?', TOKEN_NUMBER),
+        ('string', r'".+"', TOKEN_STRING),
+        ('type', r'string|int|short|float|enum|char|long|double', TOKEN_TYPE),
+        ('unit', r'arcsec|deg|microns|um|millimeters|millimetres|mm|meters|metres|m', TOKEN_UNIT),
+        ('group', r'group', TOKEN_GROUP),
+        ('sleep', r'sleep', TOKEN_SLEEP),
+        ('pvname', r'[\w:\(\)\$]+(?:\.[\w]+)?', TOKEN_PVNAME),
+        ('comment', r'#', TOKEN_COMMENT),
+        ('semicolon', r';', TOKEN_SEMICOLON),
+        ('equals', r'=', TOKEN_EQUALS),
+        ('comma', r',', TOKEN_COMMA),
+        ('times', r'\*', TOKEN_TIMES),
+        ('divided', r'/', TOKEN_DIVIDED),
+        ('percent', r'%', TOKEN_PERCENT),
+        ('left_brace', r'{', TOKEN_LEFT_BRACE),
+        ('right_brace', r'}', TOKEN_RIGHT_BRACE),
+        ('left_bracket', r'\[', TOKEN_LEFT_BRACKET),
+        ('right_bracket', r'\]', TOKEN_RIGHT_BRACKET),
+        ('error', r'.', TOKEN_ERROR),
     ]
 
+    # Combined regular expression and map from group name to token id.
+    # They are class members since they're the same for all the lexer objects.
+    master_pattern = re.compile('|'.join(['(?P<' + name + '>' + pattern + ')' for name, pattern, _ in lexer_patterns]))
+    group_map = dict([(name, token_id) for name, _, token_id in lexer_patterns])
+
     def __init__(self):
         """
         Initialize a lex object.
-        Compile all the lexer regular expressions for speed.
         """
         self.last_line = ''
         self.line_number = 0
-        self.token_list = []
-        self.compiled_patterns = []
-        for pattern, token_id in self.lexer_patterns:
-            self.compiled_patterns.append((re.compile(pattern), token_id))
+        self.token_list = deque()
+        self.f_in = None
+        self.line_lists = None
 
-    def _get_token_list(self, line):
+    def _get_token_list(self, line, line_number=0):
         """
         Split a line into tokens. This is where most of the lexical analysing
         is done. White spaces and comments are stripped down in this routine.
         :param line:
         :type line: str
+        :param line_number: line number (stored in the tokens)
+        :type line_number: int
         :return: list of Tokens
         :rtype: list
         """
-        # print '_get_token_list'
-        m = None
-        line_pos = 0
-        line_length = len(line)
         token_list = []
-        # print line_length
-
-        # Traverse the line starting from the first character
-        while line_pos < line_length:
-
-            # Assign a default value so the IDE doesn't complain
-            t_id = TOKEN_NONE
-
-            # Loop over all the possible patterns looking for a match.
-            # Break the loop if one is found and proceed to the next step.
-            # Comments and whitespaces are ignored at this point.
-            # In the case of number contants, the type is reassigned to make
-            # the distincton between an integer and a real.
-            for t_pat, t_id in self.compiled_patterns:
-                # print str(line_pos) + ': [' + str(line[line_pos:]) + ']'
-                m = t_pat.match(line, line_pos)
-                if m:
-                    # print '+ [' + m.group() + '] ' + str(t_id)
-                    if t_id != TOKEN_WHITESPACE and t_id != TOKEN_COMMENT:
-                        if t_id == TOKEN_NUMBER:
-                            try:
-                                int(m.group(0))
-                                t_id = TOKEN_INTEGER
-                            except ValueError:
-                                t_id = TOKEN_FLOAT
-                        token_list.append(PvToken(t_id, m.group(0)))
-                    break
-
-            # If a match was found then move the character counter
-            # to the next non-processed character in the line.
-            # The rest of the comment line is stripped at this point.
-            if m:
-                if t_id != TOKEN_COMMENT:
-                    line_pos += len(m.group())
+        group_map = self.group_map
+        intern = sys.intern
+
+        # The combined expression always matches (the error group matches any character),
+        # so scanning ends at the end of the line, a comment or an unknown character.
+        # In the case of number constants, the type is reassigned to make the distinction
+        # between an integer and a real. Values other than strings are interned, since
+        # keywords, units and process variable names repeat many times in large files.
+        for m in self.master_pattern.finditer(line):
+            t_id = group_map[m.lastgroup]
+            if t_id == TOKEN_WHITESPACE:
+                continue
+            elif t_id == TOKEN_COMMENT:
+                break  # skip the rest of the line after a comment
+            elif t_id == TOKEN_NUMBER:
+                if m.group('fraction') is None and m.group('leading') is None and m.group('exponent') is None:
+                    t_id = TOKEN_INTEGER
                 else:
-                    break  # skip the rest of the line after a comment
-            else:
-                token_list.append(PvToken(TOKEN_ERROR, line[line_pos]))
+                    t_id = TOKEN_FLOAT
+            value = m.group(m.lastgroup)
+            if t_id != TOKEN_STRING:
+                value = intern(value)
+            token_list.append(PvToken(t_id, value, line_number, m.start() + 1))
+            if t_id == TOKEN_ERROR:
                 break
 
         # print '-', token_list
         return token_list
 
     def get_last_line(self):
+        """
+        Return the line number and contents of the last line read
+        :return: line number and line (tuple)
+        :rtype: tuple
+        """
         return self.line_number, self.last_line
 
+    def _next_token_list(self, f_in):
+        """
+        Generator that returns the list of tokens for each line in the file that contains any.
+        Lines with only white spaces and/or comments are skipped.
+        :param f_in: input file
+        :type f_in: file
+        :return: list of tokens
+        :rtype: list
+        """
+        for line in f_in:
+            self.line_number += 1
+            token_list = self._get_token_list(line, self.line_number)
+            if token_list:
+                self.last_line = line.strip()
+                yield token_list
+
     def next_token(self, f_in):
         """
         Return next token in the file.
         This is the main routine that will be called by the parser.
-        It was not implemented as an iterator because of the parser requirements.
+        The tokens for the current line are buffered in a queue. The state is reset
+        when a different file is passed. The end of file token is returned once the
+        end of the file is reached, and for every call after that.
         :param f_in: input file
         :type f_in: file
         :return: next token
         :rtype: PvToken
         """
-        if len(self.token_list) == 0:
-            # print 'empty'
+        if f_in is not self.f_in:
+            self.f_in = f_in
+            self.line_lists = self._next_token_list(f_in)
+            self.line_number = 0
+            self.last_line = ''
+            self.token_list.clear()
+
+        if not self.token_list:
             try:
-                # Look for the next non comment and non white line in the line
-                while True:
-                    line = f_in.next().strip()
-                    self.line_number += 1
-                    if re.search(r'^#', line) is None and len(line) > 0:
-                        break
-                self.token_list = self._get_token_list(line)
-                self.last_line = line
+                self.token_list.extend(next(self.line_lists))
             except StopIteration:
-                self.token_list = [PvToken(TOKEN_EOF, '')]
+                return PvToken(TOKEN_EOF, '', self.line_number + 1, 1)
+
+        return self.token_list.popleft()
 
-        return self.token_list.pop(0)
+    def tokens(self, f_in):
+        """
+        Generator that returns all the tokens in a file, including the end of file token.
+        :param f_in: input file
+        :type f_in: file
+        :return: next token
+        :rtype: PvToken
+        """
+        while True:
+            token = self.next_token(f_in)
+            yield token
+            if token.id == TOKEN_EOF:
+                break
 
     def flush(self):
         """
         Throw away the list of token that are buffered to force reading a new line.
         This routine is intended to recover from a syntax error and continue parsing.
         """
-        self.token_list = []
+        self.token_list.clear()
 
 
 if __name__ == '__main__':
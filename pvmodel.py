@@ -0,0 +1,172 @@
+"""
+Model of the contents of a pvload/pvsave file.
+
+The parser (PvParser with model=True) builds a PvFile object with the statements found in
+the file, in the same order, so other programs can use them without parsing the file again.
+The model is made of named tuples, which are small and can be pickled quickly (see cache.py):
+
+  * PvFile: file name and list of items (groups, single statements and sleep statements)
+
+  * PvGroup: line number and list of single statements in the group
+
+  * PvSingle: a single statement (assignment), with the line number, type name (None if not
+    specified), process variable name, count (array size, 1 for scalars), list of indices
+    (empty if not specified), list of values and list of scales, one per value.
+    Values are stored as they appear in the file (strings include the quotes).
+    A scale is a tuple with the operator ('*' or '/') and the factor or unit, or None.
+
+  * PvSleep: line number and sleep time (None if not specified)
+
+Statements with syntax errors are not included in the model.
+
+The parser reports the statements to handler objects (subclasses of PvHandler) as soon as
+they are parsed, in the same way as a SAX parser. The model is built by PvModelBuilder,
+which is one of these handlers. Other handlers can process the statements one at a time,
+without keeping the whole file in memory.
+"""
+from collections import namedtuple
+
+# Scale operators
+SCALE_MULTIPLY = '*'
+SCALE_DIVIDE = '/'
+
+PvFile = namedtuple('PvFile', ['file_name', 'items'])
+PvGroup = namedtuple('PvGroup', ['line', 'items'])
+PvSingle = namedtuple('PvSingle', ['line', 'type', 'name', 'count', 'indices', 'values', 'scales'])
+PvSleep = namedtuple('PvSleep', ['line', 'time'])
+
+
+class PvHandler:
+    """
+    Base class for the objects that receive the statements from the parser (see PvParser).
+    The methods are called in the same order the statements appear in the file.
+    Single statements inside a group are reported between on_group_start and on_group_end.
+    A group with a syntax error is never closed (on_error is called instead of on_group_end),
+    and the statements after the error are reported as if they were outside the group.
+    The methods in this class do nothing.
+    """
+
+    def on_file_start(self, file_name):
+        """
+        Called when the file is opened
+        :param file_name: file name
+        :type file_name: str
+        """
+        pass
+
+    def on_file_end(self, file_name):
+        """
+        Called when the end of the file is reached
+        :param file_name: file name
+        :type file_name: str
+        """
+        pass
+
+    def on_group_start(self, line):
+        """
+        Called at the start of a group
+        :param line: line number of the group statement
+        :type line: int
+        """
+        pass
+
+    def on_group_end(self, line):
+        """
+        Called at the end of a group
+        :param line: line number of the closing brace
+        :type line: int
+        """
+        pass
+
+    def on_single(self, single):
+        """
+        Called for every single statement without syntax errors
+        :param single: single statement
+        :type single: PvSingle
+        """
+        pass
+
+    def on_sleep(self, sleep):
+        """
+        Called for every sleep statement without syntax errors
+        :param sleep: sleep statement
+        :type sleep: PvSleep
+        """
+        pass
+
+    def on_warning(self, diagnostic):
+        """
+        Called when a warning is found
+        :param diagnostic: warning
+        :type diagnostic: Diagnostic
+        """
+        pass
+
+    def on_error(self, diagnostic):
+        """
+        Called when a syntax error is found. The parser skips the rest of the line.
+        :param diagnostic: error
+        :type diagnostic: Diagnostic
+        """
+        pass
+
+
+class PvModelBuilder(PvHandler):
+    """
+    Handler that builds the model of the file. The model is stored in the model
+    member when the end of the file is reached.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.file_items = []
+        self.item_list = self.file_items
+        self.group_line = 0
+
+    def on_file_start(self, file_name):
+        self.model = None
+        self.file_items = []
+        self.item_list = self.file_items
+
+    def on_file_end(self, file_name):
+        self.model = PvFile(file_name, tuple(self.file_items))
+        self.file_items = []
+        self.item_list = self.file_items
+
+    def on_group_start(self, line):
+        self.group_line = line
+        self.item_list = []
+
+    def on_group_end(self, line):
+        self.file_items.append(PvGroup(self.group_line, tuple(self.item_list)))
+        self.item_list = self.file_items
+
+    def on_single(self, single):
+        self.item_list.append(single)
+
+    def on_sleep(self, sleep):
+        self.item_list.append(sleep)
+
+    def on_error(self, diagnostic):
+        self.item_list = self.file_items  # the statements in an unfinished group are dropped
+
+
+def next_single(items):
+    """
+    Generator that returns all the single statements in a list of items, including
+    the ones inside groups, in the order they appear in the file
+    :param items: list of items (e.g. PvFile.items)
+    :type items: iterable
+    :return: single statement
+    :rtype: PvSingle
+    """
+    for item in items:
+        if isinstance(item, PvSingle):
+            yield item
+        elif isinstance(item, PvGroup):
+            for single in item.items:
+                yield single
+
+
+if __name__ == '__main__':
+    pass
@@ -145,8 +145,12 @@ single_index_or_count
     | /* empty */
     ;
 """
+from collections import namedtuple, Counter
 from pvtoken import PvToken
 from pvlexer import PvLexer
+from pvtrace import PrintTraceHook, install_hook
+from pvmodel import PvFile, PvSingle, PvSleep, PvHandler, PvModelBuilder, SCALE_MULTIPLY, SCALE_DIVIDE
+from cache import cache_key, read_cache, write_cache
 
 from pvlexer import TOKEN_NONE, TOKEN_EOF
 from pvlexer import TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_STRING, TOKEN_PVNAME
@@ -163,28 +167,118 @@ TYPE_INTEGER = 1
 TYPE_FLOAT = 2
 TYPE_STRING = 3
 
+# Pvload type names for each basic type
+STRING_TYPE_NAMES = frozenset(['string', 'char', 'enum'])
+INTEGER_TYPE_NAMES = frozenset(['short', 'int', 'long'])
+FLOAT_TYPE_NAMES = frozenset(['float', 'double'])
+
+# Sets of tokens used in membership checks
+VALUE_TOKENS = frozenset([TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_STRING])
+NUMBER_TOKENS = frozenset([TOKEN_INTEGER, TOKEN_FLOAT])
+SCALE_TOKENS = frozenset([TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_UNIT])
+
+# Value tokens allowed for each basic type
+TYPE_VALUE_TOKENS = {
+    TYPE_INTEGER: frozenset([TOKEN_INTEGER]),
+    TYPE_FLOAT: NUMBER_TOKENS,
+    TYPE_STRING: frozenset([TOKEN_STRING])
+}
+
+# Token used to mark that the latest token was consumed. Tokens are never modified, so it can be shared.
+NONE_TOKEN = PvToken(TOKEN_NONE, 'none')
+
+# Diagnostic severities
+SEVERITY_ERROR = 'error'
+SEVERITY_WARNING = 'warning'
+
+
+class Diagnostic(namedtuple('Diagnostic', ['file', 'line', 'column', 'severity', 'message', 'source'])):
+    """
+    Error or warning found in a pvload file. The column is zero when not known,
+    and the source is the text of the line where the problem was found.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        location = 'file {0}, line {1}'.format(self.file, self.line)
+        if self.column > 0:
+            location += ', column ' + str(self.column)
+        output = '{0}: {1} -> {2}'.format(self.severity.capitalize(), location, self.message)
+        return output + '\n>> ' + self.source if self.source else output
+
+
+class DiagnosticCollector(PvHandler):
+    """
+    Handler that keeps the list of errors and warnings found in the file
+    """
+
+    def __init__(self):
+        self.diagnostics = []
+
+    def on_warning(self, diagnostic):
+        self.diagnostics.append(diagnostic)
+
+    def on_error(self, diagnostic):
+        self.diagnostics.append(diagnostic)
+
+
+# Token routines that are traced in addition to the grammar rules (pv_* methods)
+TRACED_TOKEN_METHODS = ['get_token', 'flush_token', 'flush_and_get_token']
+
+# Parser methods starting with pv_ that are not grammar rules
+NON_RULE_METHODS = frozenset(['pv_error', 'pv_warning'])
+
 
 class PvParser:
     class PvSyntaxError(Exception):
-        def __init___(self, message):
-            Exception.__init__(self, message)
+        def __init__(self, diagnostic):
+            Exception.__init__(self, str(diagnostic))
+            self.diagnostic = diagnostic
 
-    def __init__(self, debug=False, verbose=False):
+    def __init__(self, debug=False, verbose=False, hook=None, model=False, handler=None):
+        """
+        :param debug: print the grammar rules as they are called (same as hook=PrintTraceHook())
+        :type debug: bool
+        :param verbose: print the file names
+        :type verbose: bool
+        :param hook: parser hook called on every grammar rule and token routine (see pvtrace)
+        :type hook: ParserHook
+        :param model: build the model of the file (see pvmodel)?
+        :type model: bool
+        :param handler: handler that receives the statements as they are parsed (see pvmodel).
+                        The errors and warnings are not kept in the diagnostics list if specified.
+        :type handler: PvHandler
+        """
         self.f_in = None
         self.file_name = ''
         self.lex = PvLexer()
         self.token = None
 
+        # Handlers that receive the statements and diagnostics. The errors and warnings are
+        # only collected when there's no other handler, so a streaming handler can process very
+        # large files without keeping anything in memory. The model is only built when requested.
+        self.collector = DiagnosticCollector() if handler is None else None
+        self.builder = PvModelBuilder() if model else None
+        self.handlers = [h for h in [self.collector, self.builder, handler] if h is not None]
+
+        # number of errors and warnings found in the last file parsed
+        self.error_count = 0
+        self.warning_count = 0
+
         # output control
         self.debug = debug
         self.verbose = verbose
 
         # the following variables are used for simple statement checks
+        self.single_line = 0
+        self.single_type_name = None
         self.single_data_type = TYPE_NONE
         self.single_name = ''
         self.single_count = 0
         self.single_value_list = []
+        self.single_value_id_list = []
         self.single_index_list = []
+        self.single_scale_list = []
 
         # initialize state
         self.flush_token()
@@ -193,6 +287,29 @@ class PvParser:
         # dictionary to map types to a string representation
         self.type_map = {TYPE_NONE: 'none', TYPE_INTEGER: 'int', TYPE_FLOAT: 'float', TYPE_STRING: 'string'}
 
+        # The methods are only wrapped when tracing, so there's no overhead otherwise
+        if hook is None and debug:
+            hook = PrintTraceHook()
+        self.hook = hook
+        if hook is not None:
+            install_hook(self, hook, self.rule_names() + TRACED_TOKEN_METHODS)
+
+    @property
+    def diagnostics(self):
+        """
+        :return: list of errors and warnings found in the last file parsed (empty if a handler was given)
+        :rtype: list
+        """
+        return self.collector.diagnostics if self.collector is not None else []
+
+    @property
+    def model(self):
+        """
+        :return: model of the last file parsed, or None if not enabled
+        :rtype: PvFile
+        """
+        return self.builder.model if self.builder is not None else None
+
     def __str__(self):
         return 'PvParser(' + \
                '[' + self.file_name + '] ' + \
@@ -209,11 +326,15 @@ class PvParser:
         Clear/reset the variables used to store the single statement elements.
         :return: None
         """
+        self.single_line = 0  # line number
+        self.single_type_name = None  # type name
         self.single_data_type = TYPE_NONE  # data type
         self.single_name = ''  # pv name
         self.single_count = 1  # array size
         self.single_value_list = []  # value list
+        self.single_value_id_list = []  # value token id list
         self.single_index_list = []  # index list
+        self.single_scale_list = []  # scale list (one per value)
 
     def check_single(self):
         """
@@ -227,35 +348,28 @@ class PvParser:
         if len(self.single_index_list) and (len(self.single_value_list) != len(self.single_index_list)):
             self.pv_warning('missing indices?')
 
-        # Check for type consistency
+        # Check for type consistency. The values are classified using the token ids
+        # from the lexer, and a single warning is reported for the whole statement.
         if self.single_data_type == TYPE_NONE:
             self.pv_warning('type not defined')
-        elif self.single_data_type == TYPE_INTEGER:
-            for value in self.single_value_list:
-                try:
-                    int(value)
-                except ValueError:
-                    self.pv_warning('type mismatch')
-                    break
-        elif self.single_data_type == TYPE_FLOAT:
-            for value in self.single_value_list:
-                try:
-                    float(value)
-                except ValueError:
-                    self.pv_warning('type mismatch')
-                    break
-        elif self.single_data_type == TYPE_STRING:
-            for value in self.single_value_list:
-                try:
-                    int(value)
-                    self.pv_warning('type mismatch')
-                except ValueError:
-                    pass
-                try:
-                    float(value)
-                    self.pv_warning('type mismatch')
-                except ValueError:
-                    pass
+        else:
+            allowed = TYPE_VALUE_TOKENS[self.single_data_type]
+            counts = Counter(self.single_value_id_list)
+            mismatches = sum(counts[token_id] for token_id in counts if token_id not in allowed)
+            if mismatches and len(self.single_value_id_list) == 1:
+                self.pv_warning('type mismatch')
+            elif mismatches:
+                self.pv_warning('type mismatch ({0} of {1} values)'.format(mismatches,
+                                                                            len(self.single_value_id_list)))
+
+    @classmethod
+    def rule_names(cls):
+        """
+        Return the names of the methods that implement the grammar rules
+        :return: list of method names
+        :rtype: list
+        """
+        return [name for name in dir(cls) if name.startswith('pv_') and name not in NON_RULE_METHODS]
 
     @staticmethod
     def map_type(token):
@@ -268,19 +382,29 @@ class PvParser:
         :return: token data type
         :rtype: int
         """
-        token_value = token.get_value()
-        if token_value in ['string', 'char', 'enum']:
+        return PvParser.map_type_name(token.get_value())
+
+    @staticmethod
+    def map_type_name(token_value):
+        """
+        Map a pvload data type name (e.g. double) into the basic data type
+        :param token_value: data type name
+        :type token_value: str
+        :return: data type
+        :rtype: int
+        """
+        if token_value in STRING_TYPE_NAMES:
             return TYPE_STRING
-        elif token_value in ['short', 'int', 'long']:
+        elif token_value in INTEGER_TYPE_NAMES:
             return TYPE_INTEGER
-        elif token_value in ['float', 'double']:
+        elif token_value in FLOAT_TYPE_NAMES:
             return TYPE_FLOAT
         else:
             return TYPE_NONE
 
     def pv_error(self, text=''):
         """
-        Print an error message. Used to report syntax errors in the pvload file.
+        Report a syntax error in the pvload file.
         It generates an exception. It is up to the caller to decide whether to
         abort of try to recover from it.
         :param text: error message
@@ -288,40 +412,23 @@ class PvParser:
         :raises: PvSyntaxError
         """
         line_number, line_text = self.lex.get_last_line()
-        token_value = self.token.get_value()
+        message = 'at \'' + self.token.get_value() + '\''
         if text:
-            format_string = 'Error: at \'{0}\', file {1}, line {2} -> {3}\n>> {4}'
-            message = format_string.format(token_value, self.file_name, line_number, text, line_text)
-        else:
-            format_string = 'Error: at \'{0}\', file {1}, line {2}\n>> {3}'
-            message = format_string.format(token_value, self.file_name, line_number, line_text)
-        raise self.PvSyntaxError(message)
+            message += ', ' + text
+        raise self.PvSyntaxError(Diagnostic(self.file_name, line_number, self.token.column, SEVERITY_ERROR,
+                                            message, line_text))
 
     def pv_warning(self, text=''):
         """
-        Print a warning message. Used to report minor inconsistencies in the pvload file.
-        :param text: error message
+        Report a minor inconsistency in the pvload file.
+        :param text: warning message
         :type text: str
         """
         line_number, line_text = self.lex.get_last_line()
-        if text:
-            format_string = 'Warning: file {0}, line {1} -> {2}\n>> {3}'
-            message = format_string.format(self.file_name, line_number, text, line_text)
-        else:
-            format_string = 'Warning: {0}, line {1}\n>> {2}'
-            message = format_string.format(self.file_name, line_number, line_text)
-        print(message)
-        return
-
-    def trace(self, text):
-        """
-        Routine used to print details about the program execution.
-        Used extensively during the implementation and testing of the parser.
-        Trace is enabled at object creation time.
-        :param text: text to print
-        """
-        if self.debug:
-            print('> ' + text, self.token)
+        diagnostic = Diagnostic(self.file_name, line_number, 0, SEVERITY_WARNING, text, line_text)
+        self.warning_count += 1
+        for handler in self.handlers:
+            handler.on_warning(diagnostic)
 
     def get_token(self):
         """
@@ -338,7 +445,6 @@ class PvParser:
             # trap lexer errors here
             if self.token.match(TOKEN_ERROR):
                 self.pv_error()
-        self.trace('+')
         return self.token
 
     def flush_token(self):
@@ -346,8 +452,7 @@ class PvParser:
         Clear the latest token read (marked it as consumed). This will force get_token()
         to read a new token from the lexer the next time is called.
         """
-        self.trace('flush_token')
-        self.token = PvToken(TOKEN_NONE, 'none')
+        self.token = NONE_TOKEN
 
     def flush_and_get_token(self):
         """
@@ -355,7 +460,6 @@ class PvParser:
         :return: next token
         :rtype: PvToken
         """
-        self.trace('flush_and_get_token')
         self.flush_token()
         return self.get_token()
 
@@ -377,12 +481,21 @@ class PvParser:
             | /* empty */
             ;
         ---
+        The statements are reported to the handlers as they are parsed. The errors and warnings
+        found are stored in the diagnostics list (unless a handler was given) and counted in
+        error_count and warning_count, which are cleared every time a new file is parsed.
+        The model of the file is stored in the model variable if enabled.
         :param input_file_name: input file name
         :type input_file_name: str
         :return: True if file found, False otherwise
         :rtype: bool
         """
-        self.trace('pv_file')
+        if self.collector is not None:
+            self.collector.diagnostics = []
+        self.error_count = 0
+        self.warning_count = 0
+        if self.builder is not None:
+            self.builder.model = None
         try:
             self.f_in = open(input_file_name, 'r')
             self.file_name = input_file_name
@@ -392,16 +505,24 @@ class PvParser:
         if self.verbose:
             print(self.file_name)
 
+        for handler in self.handlers:
+            handler.on_file_start(input_file_name)
+
         while True:
             try:
                 if not self.pv_item():
                     break
             except self.PvSyntaxError as e:
-                print(e)
+                self.error_count += 1
+                for handler in self.handlers:
+                    handler.on_error(e.diagnostic)
                 self.flush_token()
                 self.clear_single()
                 self.lex.flush()
 
+        for handler in self.handlers:
+            handler.on_file_end(input_file_name)
+
         self.f_in.close()
         self.f_in = None
         self.file_name = ''
@@ -426,7 +547,6 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_item')
         if self.pv_group():
             return True
         elif self.pv_sleep():
@@ -453,14 +573,19 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_group')
         if self.pv_group_head():
+            line_number = self.lex.get_last_line()[0]
             if self.get_token().match(TOKEN_LEFT_BRACE):
                 self.flush_token()
+                for handler in self.handlers:
+                    handler.on_group_start(line_number)
                 self.pv_group_body()
                 self.pv_group_tail()
                 if self.get_token().match(TOKEN_RIGHT_BRACE):
+                    end_line_number = self.token.line
                     self.flush_token()
+                    for handler in self.handlers:
+                        handler.on_group_end(end_line_number)
                     return True
                 else:
                     self.pv_error()
@@ -479,7 +604,6 @@ class PvParser:
         :return: True if start of group found, False otherwise
         :rtype: bool
         """
-        self.trace('pv_group_head')
         if self.get_token().match(TOKEN_GROUP):
             self.flush_token()
             return True
@@ -499,7 +623,6 @@ class PvParser:
         :return: Always true
         :rtype: bool
         """
-        self.trace('pv_group_body')
         while self.pv_single():
             pass
         return True
@@ -514,7 +637,6 @@ class PvParser:
             ;
         ---
         """
-        self.trace('pv_group_tail')
         if self.get_token().match(TOKEN_SEMICOLON):
             self.flush_token()
 
@@ -537,17 +659,23 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_sleep')
         if self.get_token().match(TOKEN_SLEEP):
+            line_number = self.token.line
             token = self.flush_and_get_token()
             if token.match(TOKEN_INTEGER) or token.match(TOKEN_FLOAT):
                 if self.flush_and_get_token().match(TOKEN_SEMICOLON):
                     self.flush_token()
+                    sleep = PvSleep(line_number, token.get_value())
+                    for handler in self.handlers:
+                        handler.on_sleep(sleep)
                 else:
                     self.pv_error('expected \';\'')
             elif token.match(TOKEN_SEMICOLON):
                 self.pv_warning('no time specified in sleep')
                 self.flush_token()
+                sleep = PvSleep(line_number, None)
+                for handler in self.handlers:
+                    handler.on_sleep(sleep)
             else:
                 self.pv_error('expected integer or float value')
             return True
@@ -567,7 +695,6 @@ class PvParser:
         :return: True if single statement, False otherwise
         :rtype: bool
         """
-        self.trace('pv_single')
         self.clear_single()
         if self.pv_single_head():
             if self.pv_single_equals():
@@ -575,6 +702,11 @@ class PvParser:
                     if self.get_token().match(TOKEN_SEMICOLON):
                         self.check_single()
                         self.flush_token()
+                        single = PvSingle(self.single_line, self.single_type_name, self.single_name,
+                                          self.single_count, tuple(self.single_index_list),
+                                          tuple(self.single_value_list), tuple(self.single_scale_list))
+                        for handler in self.handlers:
+                            handler.on_single(single)
                         return True
                     else:
                         self.pv_error('expected \';\'')
@@ -596,7 +728,6 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_head')
         return self.pv_single_start() and self.pv_single_type() and self.pv_single_name() and self.pv_single_count()
 
     def pv_single_start(self):
@@ -611,7 +742,6 @@ class PvParser:
         :return: always true; percent is optional
         :rtype: bool
         """
-        self.trace('pv_single_start')
         if self.get_token().match(TOKEN_PERCENT):
             self.flush_token()
         return True
@@ -628,9 +758,9 @@ class PvParser:
         :return: always true; type optional
         :rtype: bool
         """
-        self.trace('pv_single_type')
         token = self.get_token()
         if token.match(TOKEN_TYPE):
+            self.single_type_name = token.get_value()
             self.single_data_type = self.map_type(token)
             self.flush_token()
         return True
@@ -646,9 +776,9 @@ class PvParser:
         :return: True if name detected, False otherwise
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_name')
         token = self.get_token()
         if token.match(TOKEN_PVNAME):
+            self.single_line = token.line
             self.single_name = token.get_value()
             self.flush_token()
             return True
@@ -667,7 +797,6 @@ class PvParser:
         :return: Always True
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_count')
         count = self.pv_single_index_or_count()
         self.single_count = count if count is not None else 1
         return True
@@ -686,7 +815,6 @@ class PvParser:
         :return: True if equals detected, else raise exception
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_equals')
         if self.get_token().match(TOKEN_EQUALS):
             self.flush_token()
             return True
@@ -712,7 +840,6 @@ class PvParser:
         :return: True if single body
         :rtype: bool
         """
-        self.trace('pv_single_body')
         if self.get_token().match(TOKEN_LEFT_BRACE):
             self.flush_token()
             self.pv_single_value_list()
@@ -736,7 +863,6 @@ class PvParser:
         :return: Always true
         :rtype: bool
         """
-        self.trace('pv_single_value_list')
         while True:
             if self.pv_single_individual_value():
                 if self.get_token().match(TOKEN_COMMA):
@@ -764,7 +890,6 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_individual_value')
         return self.pv_single_index() and self.pv_single_value() and self.pv_single_scale()
 
     def pv_single_index(self):
@@ -779,7 +904,6 @@ class PvParser:
         :return: always true; index optional
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_index')
         index = self.pv_single_index_or_count()
         if index is not None:
             self.single_index_list.append(index)
@@ -799,10 +923,10 @@ class PvParser:
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_value')
         token = self.get_token()
-        if token.is_in([TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_STRING]):
+        if token.is_in(VALUE_TOKENS):
             self.single_value_list.append(token.get_value())
+            self.single_value_id_list.append(token.get_id())
             self.flush_token()
             return True
         else:
@@ -833,27 +957,34 @@ class PvParser:
             | /* empty */
             ;
         ---
+        The scale is added to the scale list as an (operator, factor or unit) tuple,
+        or None if not specified.
         :return: always true; scale optional
         :rtype: bool
         :raises: PvSyntaxError
         """
-        self.trace('pv_single_scale')
+        scale = None
         if self.get_token().match(TOKEN_TIMES):
             token = self.flush_and_get_token()
-            if token in [TOKEN_INTEGER, TOKEN_FLOAT]:
+            if token.is_in(NUMBER_TOKENS):
+                scale = (SCALE_MULTIPLY, token.get_value())
                 self.flush_token()
             else:
                 self.pv_error('expected integer or float value')
         elif self.get_token().match(TOKEN_DIVIDED):
             token = self.flush_and_get_token()
-            if token in [TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_UNIT]:
+            if token.is_in(SCALE_TOKENS):
+                scale = (SCALE_DIVIDE, token.get_value())
                 self.flush_token()
             else:
                 self.pv_error('expected integer/float value or unit qualifier')
         else:
+            # A number with a leading decimal comma (e.g. ',5') is never a factor without '*'
             token = self.get_token()
-            if token in [TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_UNIT]:
+            if token.is_in(SCALE_TOKENS) and not token.get_value().startswith(','):
+                scale = (SCALE_MULTIPLY, token.get_value())
                 self.flush_token()
+        self.single_scale_list.append(scale)
         return True
 
     def pv_single_index_or_count(self):
@@ -871,7 +1002,6 @@ class PvParser:
         :raises: PvSyntaxError
         """
         value = None
-        self.trace('pv_single_index_or_count')
         if self.get_token().match(TOKEN_LEFT_BRACKET):
             token = self.flush_and_get_token()
             if token.match(TOKEN_INTEGER):
@@ -885,6 +1015,34 @@ class PvParser:
         return value
 
 
+def read_model(file_name, cache_directory=None):
+    """
+    Parse a pvload file and return its model. The model is also kept in the cache
+    directory between runs if one is specified.
+    :param file_name: pvload file name
+    :type file_name: str
+    :param cache_directory: cache directory, or None to disable the cache
+    :type cache_directory: str
+    :return: model of the file, or None if the file cannot be read
+    :rtype: PvFile
+    """
+    key = None
+    if cache_directory:
+        try:
+            key = cache_key('pvmodel', [file_name])
+        except OSError:
+            return None
+        model = read_cache(key, cache_directory)
+        if isinstance(model, PvFile):
+            return model
+    parser = PvParser(model=True)
+    if not parser.pv_file(file_name):
+        return None
+    if key is not None:
+        write_cache(key, parser.model, cache_directory)
+    return parser.model
+
+
 if __name__ == '__main__':
 
     file_list = ['example1.pv']
@@ -893,3 +1051,5 @@ if __name__ == '__main__':
 
     for file_name in file_list:
         parser.pv_file(file_name)
+        for diagnostic in parser.diagnostics:
+            print(diagnostic)
@@ -1,14 +1,25 @@
 class PvToken:
+    """
+    Token returned by the lexer. Tokens are created for every word in the input files,
+    so the class uses slots to keep them small. Token values are always strings.
+    """
+    __slots__ = ('id', 'value', 'line', 'column')
 
-    def __init__(self, token_id, token_value):
+    def __init__(self, token_id, token_value, line=0, column=0):
         """
         :param token_id:
         :type token_id: int
         :param token_value: token value
         :type token_value: str
+        :param line: line number where the token was found (0 if unknown)
+        :type line: int
+        :param column: column where the token starts (0 if unknown)
+        :type column: int
         """
         self.id = token_id
         self.value = token_value
+        self.line = line
+        self.column = column
 
     def __str__(self):
         return 'Token(' + str(self.id) + ',' + str(self.value) + ')'
@@ -27,7 +38,7 @@ class PvToken:
         :return: token value
         :rtype: str
         """
-        return str(self.value)
+        return self.value
 
     def match(self, token_id):
         """
@@ -37,17 +48,18 @@ class PvToken:
         :return true if token id matches the specified id
         :rtype: bool
         """
-        return True if self.id == token_id else False
+        return self.id == token_id
 
     def is_in(self, token_id_list):
         """
-        Check whether a token id is in a list of possible id's
-        :param token_id_list: list of token id's
-        :type token_id_list: list
-        :return: true if the token id is in the list
+        Check whether a token id is in a set of possible id's.
+        Use a frozenset for the fastest lookup.
+        :param token_id_list: set of token id's
+        :type token_id_list: frozenset
+        :return: true if the token id is in the set
         :rtype: bool
         """
-        return True if self.id in token_id_list else False
+        return self.id in token_id_list
 
 
 if __name__ == '__main__':
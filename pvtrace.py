@@ -0,0 +1,147 @@
+"""
+Hooks used to trace and profile the pvload file parser.
+
+A hook is an object with enter() and exit() methods that are called when the parser enters
+and leaves a grammar rule (the pv_* methods) or one of the token routines. The parser methods
+are only wrapped when a hook is passed to the parser, so there's no cost when tracing is off.
+
+Two hooks are defined:
+
+  * PrintTraceHook: print the rule name and the current token on entry (the old debug output)
+
+  * ProfileHook: count the calls and measure the time spent in each rule
+"""
+import sys
+import time
+import functools
+
+
+class ParserHook:
+    """
+    Base class for parser hooks. The methods do nothing.
+    """
+
+    def enter(self, parser, name):
+        """
+        Called before a parser method runs
+        :param parser: parser object
+        :type parser: PvParser
+        :param name: method name
+        :type name: str
+        """
+        pass
+
+    def exit(self, parser, name, elapsed):
+        """
+        Called after a parser method returns or raises an exception
+        :param parser: parser object
+        :type parser: PvParser
+        :param name: method name
+        :type name: str
+        :param elapsed: time spent in the method, including nested calls (seconds)
+        :type elapsed: float
+        """
+        pass
+
+
+class PrintTraceHook(ParserHook):
+    """
+    Print the method name and the current token every time a parser method is called.
+    """
+
+    def __init__(self, f_out=sys.stdout):
+        """
+        :param f_out: output file
+        :type f_out: file
+        """
+        self.f_out = f_out
+
+    def enter(self, parser, name):
+        print('> ' + name, parser.token, file=self.f_out)
+
+
+class ProfileHook(ParserHook):
+    """
+    Collect the number of calls and the total time spent in each parser method.
+    Times include nested calls, so recursive rules (e.g. groups) are counted more than once.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.times = {}
+
+    def exit(self, parser, name, elapsed):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def merge(self, other):
+        """
+        Add the counts and times collected by another profile hook (e.g. from another process)
+        :param other: profile hook
+        :type other: ProfileHook
+        """
+        for name in other.calls:
+            self.calls[name] = self.calls.get(name, 0) + other.calls[name]
+            self.times[name] = self.times.get(name, 0.0) + other.times[name]
+
+    def report(self, f_out=sys.stdout):
+        """
+        Print the calls and times for each method, sorted by total time
+        :param f_out: output file
+        :type f_out: file
+        """
+        print('{0:<28} {1:>10} {2:>10} {3:>10}'.format('method', 'calls', 'total(s)', 'call(us)'), file=f_out)
+        for name in sorted(self.times, key=lambda n: self.times[n], reverse=True):
+            calls = self.calls[name]
+            total = self.times[name]
+            print('{0:<28} {1:>10} {2:>10.3f} {3:>10.2f}'.format(name, calls, total, 1e6 * total / calls),
+                  file=f_out)
+
+
+def wrap_method(parser, hook, name, method):
+    """
+    Return a function that calls the hook before and after a parser method
+    :param parser: parser object
+    :type parser: PvParser
+    :param hook: parser hook
+    :type hook: ParserHook
+    :param name: method name
+    :type name: str
+    :param method: bound method
+    :type method: callable
+    :return: wrapped method
+    :rtype: callable
+    """
+    enter = hook.enter
+    exit_ = hook.exit
+    clock = time.perf_counter
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        enter(parser, name)
+        t = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            exit_(parser, name, clock() - t)
+
+    return wrapper
+
+
+def install_hook(parser, hook, method_names):
+    """
+    Replace the parser methods by wrapped versions that call the hook.
+    The wrapped methods are stored in the object, so other parser objects are not affected.
+    :param parser: parser object
+    :type parser: PvParser
+    :param hook: parser hook
+    :type hook: ParserHook
+    :param method_names: names of the methods to wrap
+    :type method_names: list
+    """
+    for name in method_names:
+        setattr(parser, name, wrap_method(parser, hook, name, getattr(parser, name)))
+
+
+if __name__ == '__main__':
+    pass
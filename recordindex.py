@@ -0,0 +1,236 @@
+"""
+This module defines the RecordNameIndex class.
+
+RecordNameIndex is a sorted array of record names that supports prefix, glob and range
+queries in logarithmic time (plus the number of matches) using binary search, instead of
+scanning all the names in a dictionary. Each record name has a list of values associated
+with it, e.g. the systems and database files where the record is defined.
+
+Glob patterns and regular expressions are matched by looking up the literal prefix of the
+pattern first, and then matching the pattern against the names with that prefix only.
+
+The routine read_record_index() builds the index from the manifest files written by crossref.
+Manifests written by a different version of crossref are ignored, so the databases in them
+are not covered by the index.
+"""
+import re
+import sys
+import json
+import bisect
+import fnmatch
+from os import listdir
+from os.path import join, splitext
+
+# Manifest format version. Manifests written by a different version are ignored.
+# It's defined here rather than in crossref (which imports this module) to avoid a circular import.
+MANIFEST_VERSION = 3
+
+# Characters that start a wildcard in glob patterns
+GLOB_CHARACTERS = '*?['
+
+# Characters with a special meaning in regular expressions
+REGEX_CHARACTERS = '.^$*+?{}[]\\|()'
+
+
+def glob_prefix(pattern):
+    """
+    Return the literal prefix of a glob pattern (the characters before the first wildcard)
+    :param pattern: glob pattern
+    :type pattern: str
+    :return: literal prefix
+    :rtype: str
+    """
+    for i, c in enumerate(pattern):
+        if c in GLOB_CHARACTERS:
+            return pattern[:i]
+    return pattern
+
+
+def regex_prefix(pattern):
+    """
+    Return the literal prefix of a regular expression anchored at the start (^).
+    An empty string is returned if the expression is not anchored, doesn't start with a literal
+    or contains alternatives (|).
+    :param pattern: regular expression
+    :type pattern: str
+    :return: literal prefix
+    :rtype: str
+    """
+    if not pattern.startswith('^') or '|' in pattern:
+        return ''
+    prefix = ''
+    for c in pattern[1:]:
+        if c in REGEX_CHARACTERS:
+            # The last literal is optional or repeated if followed by a quantifier
+            if c in '*?{':
+                prefix = prefix[:-1]
+            break
+        prefix += c
+    return prefix
+
+
+class RecordNameIndex:
+    """
+    Sorted array of record names with a list of values for each name.
+    The index is built once and it's not modified afterwards.
+    """
+
+    def __init__(self, items):
+        """
+        Build the index from a list of (name, value) tuples.
+        Values for names that appear more than once are collected in a list.
+        :param items: iterable with (record name, value) tuples
+        :type items: iterable
+        """
+        d = {}
+        for name, value in items:
+            d.setdefault(name, []).append(value)
+        self.names = sorted(d)
+        self.values = [d[name] for name in self.names]
+
+    def __str__(self):
+        """
+        Return the string representation of the index object
+        :return: string representation
+        :rtype: str
+        """
+        return '<RecordNameIndex names=' + str(len(self.names)) + '>'
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        i = bisect.bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def get(self, name):
+        """
+        Return the values associated with a record name
+        :param name: record name
+        :type name: str
+        :return: list of values (empty if the record name is not in the index)
+        :rtype: list
+        """
+        i = bisect.bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            return self.values[i]
+        return []
+
+    def _prefix_bounds(self, prefix):
+        """
+        Return the position of the first and last + 1 names starting with a prefix
+        :param prefix: prefix
+        :type prefix: str
+        :return: tuple with the positions
+        :rtype: tuple
+        """
+        lo = bisect.bisect_left(self.names, prefix)
+        if not prefix:
+            return lo, len(self.names)
+        hi = bisect.bisect_left(self.names, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        return lo, hi
+
+    def prefix(self, prefix):
+        """
+        Return the record names starting with a prefix, in sorted order
+        :param prefix: prefix
+        :type prefix: str
+        :return: list of record names
+        :rtype: list
+        """
+        lo, hi = self._prefix_bounds(prefix)
+        return self.names[lo:hi]
+
+    def range(self, low, high):
+        """
+        Return the record names between two names (low <= name < high), in sorted order
+        :param low: lower bound (inclusive)
+        :type low: str
+        :param high: upper bound (exclusive)
+        :type high: str
+        :return: list of record names
+        :rtype: list
+        """
+        lo = bisect.bisect_left(self.names, low)
+        hi = bisect.bisect_left(self.names, high, lo)
+        return self.names[lo:hi]
+
+    def glob(self, pattern):
+        """
+        Return the record names matching a glob pattern (case sensitive), in sorted order
+        :param pattern: glob pattern (e.g. tcs:drives:*)
+        :type pattern: str
+        :return: list of record names
+        :rtype: list
+        """
+        prefix = glob_prefix(pattern)
+        if prefix == pattern:
+            return [pattern] if pattern in self else []
+        names = self.prefix(prefix)
+        if pattern == prefix + '*':
+            return names
+        return [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+
+    def search(self, pattern, flags=0):
+        """
+        Return the record names matching a regular expression (re.search), in sorted order.
+        Only the names starting with the literal prefix are checked if the expression is anchored.
+        :param pattern: regular expression
+        :type pattern: str
+        :param flags: regular expression flags
+        :type flags: int
+        :return: list of record names
+        :rtype: list
+        """
+        p = re.compile(pattern, flags)
+        prefix = '' if flags & re.IGNORECASE else regex_prefix(pattern)
+        return [name for name in self.prefix(prefix) if p.search(name)]
+
+
+def read_record_index(index_directory, database_set=None, raw=False):
+    """
+    Build the record name index from the manifest files in the index directory.
+    The values associated with each record name are (system, database file name, line number) tuples.
+    By default the record names are the ones used by crossref (after macro substitution) and the
+    database file names are the ones crossref was given. The raw option selects the record names
+    as they appear in the database files and the absolute database file names instead, which
+    is what programs that read the files from any directory need (e.g. dbgrep).
+    Manifests with a different version (see MANIFEST_VERSION) are skipped with a warning.
+    :param index_directory: index directory
+    :type index_directory: str
+    :param database_set: set where the names of the database files covered by the index are added
+    :type database_set: set
+    :param raw: use the raw record names and absolute database file names?
+    :type raw: bool
+    :return: record name index
+    :rtype: RecordNameIndex
+    """
+    items = []
+    for file_name in sorted(listdir(index_directory)):
+        system, extension = splitext(file_name)
+        if extension != '.manifest':
+            continue
+        with open(join(index_directory, file_name), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            print('Ignoring', file_name, '(manifest version ' + str(manifest.get('version')) +
+                  ', run crossref to update it)', file=sys.stderr)
+            continue
+        databases = manifest.get('databases', {})
+        for database_name in databases:
+            entry = databases[database_name]
+            if raw:
+                file_name = entry['path']
+                items.extend([(raw_name, (system, file_name, line_number))
+                              for _, line_number, raw_name in entry['records']])
+            else:
+                file_name = database_name
+                items.extend([(name, (system, file_name, line_number))
+                              for name, line_number, _ in entry['records']])
+            if database_set is not None:
+                database_set.add(file_name)
+    return RecordNameIndex(items)
+
+
+if __name__ == '__main__':
+    pass
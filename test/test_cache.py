@@ -0,0 +1,37 @@
+import os
+from cache import cache_key, read_cache, write_cache
+from db import DatabaseFile, EpicsDatabase
+
+# Database file name used in this test
+SIMPLE_DATABASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'db', 'simple.db')
+
+
+def test_cache_key():
+    assert (cache_key('database', [SIMPLE_DATABASE]) == cache_key('database', [SIMPLE_DATABASE]))
+    assert (cache_key('database', [SIMPLE_DATABASE]) != cache_key('other', [SIMPLE_DATABASE]))
+    assert (cache_key('database', [SIMPLE_DATABASE], True) != cache_key('database', [SIMPLE_DATABASE], False))
+
+
+def test_cache_key_changes(tmp_path):
+    file_name = os.path.join(str(tmp_path), 'test.db')
+    with open(file_name, 'w') as f:
+        f.write('one')
+    key = cache_key('database', [file_name])
+    with open(file_name, 'a') as f:
+        f.write('two')
+    assert (cache_key('database', [file_name]) != key)
+
+
+def test_read_write_cache(tmp_path):
+    cache_directory = os.path.join(str(tmp_path), 'cache')
+    key = cache_key('database', [SIMPLE_DATABASE])
+    assert (read_cache(key, cache_directory) is None)
+    db = DatabaseFile(file_name=SIMPLE_DATABASE).read_database()
+    assert (write_cache(key, db, cache_directory))
+    cached_db = read_cache(key, cache_directory)
+    assert (isinstance(cached_db, EpicsDatabase))
+    assert (cached_db.get_record_names() == db.get_record_names())
+
+
+if __name__ == '__main__':
+    pass
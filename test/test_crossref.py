@@ -0,0 +1,198 @@
+import os
+import io
+import json
+from crossref import update_index_file, ReferenceMatrix, remove_duplicates, print_system_to_others, \
+    print_others_to_system, parse_index_line, find_duplicates, build_indices, scan_database
+import crossref
+from db import EpicsMacro
+from xrefstore import CrossRefStore
+
+# Database contents used in this test
+DATABASE_1 = 'record(ai,"tcs:a") {\n    field(INP,"mcs:x")\n}\n'
+DATABASE_2 = 'record(ao,"tcs:b") {\n}\nrecord(ao,"tcs:c") {\n}\n'
+
+
+def write_file(file_name, text):
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def read_index(index_file_name):
+    with open(index_file_name, 'r') as f:
+        return [line.split('\t')[0] for line in f.read().splitlines()]
+
+
+def test_update_index_file(tmp_path):
+    directory = str(tmp_path)
+    db1 = os.path.join(directory, 'one.db')
+    db2 = os.path.join(directory, 'two.db')
+    index_file_name = os.path.join(directory, 'tcs.index')
+    manifest_file_name = os.path.join(directory, 'tcs.manifest')
+    write_file(db1, DATABASE_1)
+    write_file(db2, DATABASE_2)
+
+    # All databases are read the first time
+    assert (update_index_file(index_file_name, manifest_file_name, [db1, db2], False) == ([db1, db2], []))
+    assert (read_index(index_file_name) == ['tcs:a', 'tcs:b', 'tcs:c'])
+
+    # Nothing is read if nothing changed, even if the modification time did
+    os.utime(db1, ns=(0, 0))
+    assert (update_index_file(index_file_name, manifest_file_name, [db1, db2], False) == ([], []))
+
+    # Only changed databases are read
+    write_file(db2, DATABASE_2.replace('tcs:c', 'tcs:d'))
+    assert (update_index_file(index_file_name, manifest_file_name, [db1, db2], False) == ([db2], []))
+    assert (read_index(index_file_name) == ['tcs:a', 'tcs:b', 'tcs:d'])
+
+    # Removed databases
+    assert (update_index_file(index_file_name, manifest_file_name, [db2], False) == ([], [db1]))
+    assert (read_index(index_file_name) == ['tcs:b', 'tcs:d'])
+
+    # Rebuild
+    assert (update_index_file(index_file_name, manifest_file_name, [db1, db2], True) == ([db1, db2], []))
+
+
+def test_build_indices_after_scan(tmp_path):
+    data_directory = os.path.join(str(tmp_path), 'data')
+    index_directory = os.path.join(str(tmp_path), 'indices')
+    os.makedirs(os.path.join(data_directory, 'tcs'))
+    os.makedirs(os.path.join(data_directory, 'mcs'))
+    db1 = os.path.join(data_directory, 'tcs', 'one.db')
+    write_file(db1, DATABASE_1)
+    write_file(os.path.join(data_directory, 'mcs', 'mcs.db'), 'record(ai,"mcs:x") {\n}\nrecord(ai,"mcs:y") {\n}\n')
+    store = CrossRefStore(os.path.join(str(tmp_path), 'crossref.sqlite'))
+    build_indices(['tcs', 'mcs'], data_directory, index_directory, True, store=store, jobs=1)
+    assert (store.system_to_others('tcs') == [('mcs:x', 'VAL', 'tcs:a', 'INP', ['mcs'])])
+
+    # A scan run updates the manifests without the store
+    write_file(db1, DATABASE_1.replace('mcs:x', 'mcs:y'))
+    build_indices(['tcs', 'mcs'], data_directory, index_directory, False, store=None, jobs=1)
+
+    # The next run brings the store up to date even though the manifests did not change
+    changes = []
+    build_indices(['tcs', 'mcs'], data_directory, index_directory, False, store=store, jobs=1, changes=changes)
+    assert (changes == [db1])
+    assert (store.system_to_others('tcs') == [('mcs:y', 'VAL', 'tcs:a', 'INP', ['mcs'])])
+
+    # Databases removed during the scan run are removed from the store as well
+    os.remove(db1)
+    build_indices(['tcs', 'mcs'], data_directory, index_directory, False, store=None, jobs=1)
+    build_indices(['tcs', 'mcs'], data_directory, index_directory, False, store=store, jobs=1)
+    assert (store.system_to_others('tcs') == [])
+    assert (store.get_database_hashes('tcs') == {})
+    store.close()
+
+
+def test_build_indices_empty_store(tmp_path):
+    data_directory = os.path.join(str(tmp_path), 'data')
+    index_directory = os.path.join(str(tmp_path), 'indices')
+    os.makedirs(os.path.join(data_directory, 'tcs'))
+    write_file(os.path.join(data_directory, 'tcs', 'one.db'), '# no records\n')
+    store = CrossRefStore(os.path.join(str(tmp_path), 'crossref.sqlite'))
+    assert (not store.is_built())
+    build_indices(['tcs'], data_directory, index_directory, True, store=store, jobs=1)
+
+    # A store built from databases without records is empty, but it doesn't need a rebuild
+    assert (store.is_empty() and store.is_built())
+    changes = []
+    build_indices(['tcs'], data_directory, index_directory, not store.is_built(), store=store, jobs=1,
+                  changes=changes)
+    assert (changes == [])
+    store.close()
+
+
+def test_scan_database_strip(tmp_path, monkeypatch):
+    db1 = os.path.join(str(tmp_path), 'one.db')
+    write_file(db1, DATABASE_1.replace('tcs:a', '$(top)'))
+    # Macro values with spaces can only come from macro objects built elsewhere
+    monkeypatch.setattr(crossref, 'read_subs_file', lambda database_name: EpicsMacro([('top', ' tcs:a ')]))
+    assert (scan_database(db1) == ([['tcs:a', 1, '$(top)']], [('tcs:a', 'INP', 'mcs:x', 'VAL')]))
+
+
+def test_parse_index_line():
+    assert (parse_index_line('tcs:a\t./data/tcs/tcs.db\t12') == ('tcs:a', './data/tcs/tcs.db', 12))
+    assert (parse_index_line('tcs:a') == ('tcs:a', None, None))
+
+
+def test_find_duplicates(tmp_path):
+    directory = str(tmp_path)
+    write_file(os.path.join(directory, 'tcs.index'), 'tcs:a\ttcs.db\t1\ntcs:b\ttcs.db\t5\ntcs:c\ttcs.db\t9')
+    write_file(os.path.join(directory, 'mcs.index'), 'mcs:a\tmcs.db\t1\ntcs:b\tmcs.db\t3')
+    write_file(os.path.join(directory, 'ecs.index'), 'tcs:b\ntcs:c\necs:a\necs:a')
+    assert (find_duplicates(['tcs', 'mcs', 'ecs'], directory) ==
+            {'tcs:b': [('tcs', 'tcs.db', 5), ('mcs', 'mcs.db', 3), ('ecs', None, None)],
+             'tcs:c': [('tcs', 'tcs.db', 9), ('ecs', None, None)]})
+
+
+def test_reference_matrix():
+    channel_dict = {'tcs:a': ['tcs'], 'mcs:x': ['mcs'], 'xyz:b': ['mcs', 'ecs']}
+    matrix = ReferenceMatrix(['tcs', 'mcs', 'ecs'])
+    matrix.add_link('tcs', 'tcs:b', 'INP', 'mcs:x', 'VAL', channel_dict)
+    matrix.add_link('tcs', 'tcs:b', 'FLNK', 'mcs:x', 'VAL', channel_dict)
+    matrix.add_link('tcs', 'tcs:b', 'DOL', 'xyz:b', 'VAL', channel_dict)
+    matrix.add_link('mcs', 'mcs:x', 'INP', 'tcs:a', 'VAL', channel_dict)
+    matrix.add_link('mcs', 'mcs:x', 'OUT', 'unknown:a', 'VAL', channel_dict)
+    assert (matrix.get_count('tcs', 'mcs') == 3)
+    assert (matrix.get_count('tcs', 'ecs') == 1)
+    assert (matrix.get_count('mcs', 'tcs') == 1)
+    assert (matrix.get_count('ecs', 'tcs') == 0)
+    assert (len(matrix.edges) == 5)
+
+    f = io.StringIO()
+    matrix.write_csv(f)
+    assert (f.getvalue().splitlines() == ['source,ecs,mcs,tcs', 'ecs,0,0,0', 'mcs,0,0,1', 'tcs,1,3,0'])
+
+    f = io.StringIO()
+    matrix.write_json(f)
+    d = json.loads(f.getvalue())
+    assert (d['matrix'][2] == [1, 3, 0])
+    assert (d['edges'][0]['target_record'] == 'mcs:x')
+
+    f = io.StringIO()
+    matrix.write_dot(f)
+    assert ('"tcs" -> "mcs" [label="3"];' in f.getvalue())
+
+
+def test_reference_matrix_duplicate_channel():
+    channel_dict = {'mcs:x': ['mcs', 'ecs', 'mcs']}
+    matrix = ReferenceMatrix(['tcs', 'mcs', 'ecs'])
+    matrix.add_link('tcs', 'tcs:b', 'INP', 'mcs:x', 'VAL', channel_dict)
+    assert (matrix.get_count('tcs', 'mcs') == 1)
+    assert (matrix.get_count('tcs', 'ecs') == 1)
+    assert ([e[3] for e in matrix.edges] == ['mcs', 'ecs'])
+
+
+def test_remove_duplicates():
+    assert (remove_duplicates([('a', 1, 2), ('b', 3, 4), ('a', 5, 6)]) == [('a', 1, 2), ('b', 3, 4)])
+
+
+def test_print_system_to_others():
+    input_list = [('mcs:x', 'VAL', 'tcs:b', 'INP', ['mcs']),
+                  ('ecs:y', 'A', 'tcs:a', 'OUT', ['ecs']),
+                  ('mcs:x', 'VAL', 'tcs:a', 'INP', ['mcs'])]
+    f = io.StringIO()
+    print_system_to_others('tcs', input_list, False, f)
+    assert (f.getvalue().splitlines()[2:] == ['  ecs:y                          ecs',
+                                              '  mcs:x                          mcs'])
+    f = io.StringIO()
+    print_system_to_others('tcs', input_list, True, f)
+    assert (len(f.getvalue().splitlines()) == 5)
+    assert (f.getvalue().splitlines()[3].split() == ['mcs:x.VAL', 'tcs:b.INP', 'mcs'])
+
+
+def test_print_others_to_system():
+    input_dict = {'mcs': [('tcs:b', 'VAL', 'mcs:x', 'INP'), ('tcs:a', 'VAL', 'mcs:y', 'INP'),
+                          ('tcs:a', 'VAL', 'mcs:x', 'INP')],
+                  'ecs': [('tcs:a', 'VAL', 'ecs:y', 'INP')]}
+    f = io.StringIO()
+    print_others_to_system('tcs', input_dict, False, f)
+    assert (f.getvalue().splitlines()[2:] == ['ecs', '  tcs:a', 'mcs', '  tcs:a', '  tcs:b'])
+    f = io.StringIO()
+    print_others_to_system('tcs', input_dict, True, f)
+    assert ([line.split() for line in f.getvalue().splitlines()[2:]] ==
+            [['ecs'], ['tcs:a.VAL', 'ecs:y.INP'],
+             ['mcs'], ['tcs:a.VAL', 'mcs:x.INP'], ['tcs:a.VAL', 'mcs:y.INP'], ['tcs:b.VAL', 'mcs:x.INP']])
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,75 @@
+import os
+import pytest
+from xrefstore import CrossRefStore
+from crossrefd import CrossRefSnapshot, CrossRefServer
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    store = CrossRefStore(os.path.join(str(tmp_path), 'crossref.sqlite'))
+    store.add_database('tcs', 'tcs.db', ['tcs:a', 'tcs:b'],
+                       [('tcs:a', 'INP', 'mcs:x', 'VAL'),
+                        ('tcs:a', 'FLNK', 'ecs:y', 'VAL'),
+                        ('tcs:b', 'DOL', 'tcs:a', 'VAL')])
+    store.add_database('mcs', 'mcs.db', ['mcs:x'], [('mcs:x', 'INP', 'tcs:b', 'VAL')])
+    store.add_database('ecs', 'ecs.db', ['ecs:y'], [('ecs:y', 'INP', 'tcs:a', 'VAL')])
+    channel_dict = {'tcs:a': ['tcs'], 'tcs:b': ['tcs'], 'mcs:x': ['mcs'], 'ecs:y': ['ecs']}
+    s = CrossRefSnapshot(channel_dict, store)
+    yield s
+    store.close()
+
+
+def test_references(snapshot):
+    assert (snapshot.link_count == 5)
+    assert (snapshot.references('tcs:a') == [{'system': 'tcs', 'record': 'tcs:b', 'field': 'DOL', 'target_field': 'VAL'},
+                                             {'system': 'ecs', 'record': 'ecs:y', 'field': 'INP', 'target_field': 'VAL'}])
+    assert (snapshot.references('xyz:a') == [])
+    assert (snapshot.record('mcs:x') == ['mcs'])
+    assert (snapshot.record('xyz:a') == [])
+
+
+def test_system_to_others(snapshot):
+    assert (snapshot.system_to_others('tcs') == [('mcs:x', 'VAL', 'tcs:a', 'INP', ['mcs']),
+                                                 ('ecs:y', 'VAL', 'tcs:a', 'FLNK', ['ecs'])])
+
+
+def test_others_to_system(snapshot):
+    assert (snapshot.others_to_system('tcs') == {'mcs': [('tcs:b', 'VAL', 'mcs:x', 'INP')],
+                                                 'ecs': [('tcs:a', 'VAL', 'ecs:y', 'INP')]})
+
+
+
+def test_others_to_system_shared_record(tmp_path):
+    store = CrossRefStore(os.path.join(str(tmp_path), 'crossref.sqlite'))
+    store.add_database('tcs', 'tcs.db', ['tcs:a'], [('tcs:a', 'INP', 'xyz:b', 'VAL')])
+    store.add_database('mcs', 'mcs.db', ['xyz:b'], [('xyz:b', 'INP', 'xyz:b', 'DESC')])
+    store.add_database('ecs', 'ecs.db', ['xyz:b'], [])
+    snapshot = CrossRefSnapshot({'tcs:a': ['tcs'], 'xyz:b': ['mcs', 'ecs', 'mcs']}, store)
+    assert (snapshot.others_to_system('mcs') == {'tcs': [('xyz:b', 'VAL', 'tcs:a', 'INP')]})
+    assert (snapshot.others_to_system('ecs') == {'tcs': [('xyz:b', 'VAL', 'tcs:a', 'INP')],
+                                                 'mcs': [('xyz:b', 'DESC', 'xyz:b', 'INP')]})
+    assert (snapshot.others_to_system('xyz') == {})
+    store.close()
+
+
+def test_quiet_reload(tmp_path, capsys):
+    data_directory = os.path.join(str(tmp_path), 'data')
+    os.makedirs(os.path.join(data_directory, 'tcs'))
+    db_file = os.path.join(data_directory, 'tcs', 'tcs.db')
+    with open(db_file, 'w') as f:
+        f.write('record(ai,"tcs:a") {\n    field(INP,"mcs:x")\n}\n')
+    server = CrossRefServer(os.path.join(str(tmp_path), 's.sock'), data_directory,
+                            os.path.join(str(tmp_path), 'indices'), 60)
+    try:
+        capsys.readouterr()
+        with open(db_file, 'w') as f:
+            f.write('record(ai,"tcs:b") {\n}\n')
+        assert (server.reload() == 1)
+        assert (capsys.readouterr() == ('', ''))
+        assert (server.snapshot.record('tcs:b') == ['tcs'])
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    pass
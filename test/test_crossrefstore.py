@@ -0,0 +1,55 @@
+import os
+import pytest
+from xrefstore import CrossRefStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = CrossRefStore(os.path.join(str(tmp_path), 'crossref.sqlite'))
+    s.add_database('tcs', 'tcs.db', ['tcs:a', 'tcs:b'],
+                   [('tcs:a', 'INP', 'mcs:x', 'VAL'),
+                    ('tcs:a', 'FLNK', 'ecs:y', 'VAL'),
+                    ('tcs:b', 'DOL', 'tcs:a', 'VAL')])
+    s.add_database('mcs', 'mcs.db', ['mcs:x'], [('mcs:x', 'INP', 'tcs:b', 'VAL')])
+    s.add_database('ecs', 'ecs.db', ['ecs:y'], [('ecs:y', 'INP', 'tcs:a', 'VAL')])
+    s.commit()
+    yield s
+    s.close()
+
+
+def test_is_empty(tmp_path, store):
+    assert (not store.is_empty())
+    store.clear()
+    assert (store.is_empty())
+    assert (CrossRefStore(os.path.join(str(tmp_path), 'empty.sqlite')).is_empty())
+
+
+def test_is_built(tmp_path, store):
+    assert (not store.is_built())
+    store.set_built()
+    store.commit()
+    assert (CrossRefStore(store.file_name).is_built())
+    store.clear()
+    assert (not store.is_built())
+
+
+def test_system_to_others(store):
+    assert (store.system_to_others('tcs') == [('mcs:x', 'VAL', 'tcs:a', 'INP', ['mcs']),
+                                              ('ecs:y', 'VAL', 'tcs:a', 'FLNK', ['ecs'])])
+    assert (store.system_to_others('mcs') == [('tcs:b', 'VAL', 'mcs:x', 'INP', ['tcs'])])
+
+
+def test_others_to_system(store):
+    assert (store.others_to_system('tcs') == {'mcs': [('tcs:b', 'VAL', 'mcs:x', 'INP')],
+                                              'ecs': [('tcs:a', 'VAL', 'ecs:y', 'INP')]})
+    assert (store.others_to_system('xyz') == {})
+
+
+def test_remove_database(store):
+    store.remove_database('mcs.db')
+    assert (store.system_to_others('tcs') == [('ecs:y', 'VAL', 'tcs:a', 'FLNK', ['ecs'])])
+    assert ('mcs' not in store.others_to_system('tcs'))
+
+
+if __name__ == '__main__':
+    pass
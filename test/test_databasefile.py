@@ -4,6 +4,7 @@ from db import DatabaseFile, EpicsDatabase, EpicsRecord
 
 # Database file name used in this test
 SIMPLE_DATABASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'db', 'simple.db')
+LARGER_DATABASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'db', 'larger.db')
 
 
 @pytest.fixture
@@ -76,6 +77,14 @@ def test_next_record_name(database_file):
                                          ('cs:memoryUsedPercent', 'ai')])
 
 
+def test_record_line_number():
+    lines = [n for n, line in enumerate(open(SIMPLE_DATABASE), 1) if line.startswith('record')]
+    df = DatabaseFile(file_name=SIMPLE_DATABASE)
+    assert ([df.record_line_number for _ in df.next_record_name()] == lines)
+    df = DatabaseFile(file_name=SIMPLE_DATABASE)
+    assert ([df.record_line_number for _ in df.next_record()] == lines)
+
+
 def test_next_record_1(database_file):
     record_list = [x for x in database_file.next_record()]
     assert (len(record_list) == 3)
@@ -86,6 +95,23 @@ def test_next_record_2(database_file):
         assert (isinstance(record, EpicsRecord))
 
 
+def test_next_sorted_record_1(database_file):
+    record_name_list = [r.get_name() for r in database_file.next_sorted_record()]
+    assert (record_name_list == ['cs:cpuUsedPercent', 'cs:fdUsedPercent', 'cs:memoryUsedPercent'])
+
+
+def test_next_sorted_record_2():
+    """
+    Force an external sort by using a chunk size smaller than the number of records.
+    """
+    db = DatabaseFile(file_name=LARGER_DATABASE).read_database()
+    df = DatabaseFile(file_name=LARGER_DATABASE)
+    record_list = [r for r in df.next_sorted_record(chunk_size=3)]
+    assert ([r.get_name() for r in record_list] == sorted(db.get_record_names()))
+    for record in record_list:
+        assert (record.get_fields() == db.get_record(record.get_name()).get_fields())
+
+
 def test_read_database(database_file):
     db = database_file.read_database()
     assert (type(db) == EpicsDatabase)
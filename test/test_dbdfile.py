@@ -0,0 +1,41 @@
+import os
+from dbd import DbdFile, read_dbd_file
+
+# Dbd file name used in this test
+SMALL_DBD = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'dbd', 'small.dbd')
+
+
+def test_menus():
+    dbd = DbdFile(SMALL_DBD)
+    assert (dbd.menus == {'menuScan': ['Passive', 'Event', '1 second'], 'menuYesNo': ['NO', 'YES']})
+
+
+def test_field_types():
+    dbd = DbdFile(SMALL_DBD)
+    assert (sorted(dbd.record_types) == ['ai'])
+    assert (dbd.get_field_type('ai', 'SCAN') == 'DBF_MENU')
+    assert (dbd.get_field_type('ai', 'HOPR') == 'DBF_DOUBLE')
+    assert (dbd.get_field_type('ai', 'WHATEVER') is None)
+    assert (dbd.get_field_type('ao', 'HOPR') is None)
+
+
+def test_field_defaults():
+    dbd = DbdFile(SMALL_DBD)
+    assert (dbd.get_field_default('ai', 'SCAN') == 'Passive')
+    assert (dbd.get_field_default('ai', 'PINI') == 'NO')
+    assert (dbd.get_field_default('ai', 'DISV') == '1')
+    assert (dbd.get_field_default('ai', 'PREC') == '0')
+    assert (dbd.get_field_default('ai', 'DESC') == '')
+    assert (dbd.get_field_default('ai', 'FLNK') == '')
+    assert (dbd.get_field_default('ai', 'DTYP') is None)
+
+
+def test_read_dbd_file(tmp_path):
+    dbd1 = read_dbd_file(SMALL_DBD, str(tmp_path))
+    dbd2 = read_dbd_file(SMALL_DBD, str(tmp_path))
+    assert (dbd1 is dbd2)
+    assert (len(os.listdir(str(tmp_path))) == 1)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,58 @@
+import os
+from crossref import build_indices
+from dbgrep import get_args, indexed_file_list
+
+# Database with macros in the record names, and its macro substitution file
+DATABASE = 'record(ai,"$(top)drives:az") {\n}\nrecord(ai,"$(top)pos") {\n}\n'
+SUBS = 'top tcs:\n'
+
+
+def write_file(file_name, text):
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def build(tmp_path):
+    """
+    Build the crossref indices with relative file names, as crossref does.
+    It must be called from the top directory.
+    """
+    os.makedirs(os.path.join(str(tmp_path), 'data', 'tcs'))
+    write_file(os.path.join(str(tmp_path), 'data', 'tcs', 'tcs.db'), DATABASE)
+    write_file(os.path.join(str(tmp_path), 'data', 'tcs', 'tcs.subs'), SUBS)
+    write_file(os.path.join(str(tmp_path), 'data', 'tcs', 'other.db'), 'record(ai,"tcs:other") {\n}\n')
+    build_indices(['tcs'], 'data', 'indices', False, jobs=1, verbose=False)
+    return os.path.join(str(tmp_path), 'indices')
+
+
+def test_indexed_subs(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    index_directory = build(tmp_path)
+    db_file = os.path.join('data', 'tcs', 'tcs.db')
+
+    # The raw record names are matched, as when the files are scanned
+    assert (indexed_file_list(get_args(['dbgrep', '-r', '-x', index_directory, r'\$\(top\)drives', db_file])) ==
+            [db_file])
+    assert (indexed_file_list(get_args(['dbgrep', '-r', '-x', index_directory, '^tcs:drives', db_file])) == [])
+
+    # Files not covered by the index are scanned
+    assert (indexed_file_list(get_args(['dbgrep', '-r', '-x', index_directory, 'xyz', 'new.db'])) == ['new.db'])
+
+
+def test_indexed_other_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    index_directory = build(tmp_path)
+    other_directory = os.path.join(str(tmp_path), 'other')
+    os.makedirs(other_directory)
+    monkeypatch.chdir(other_directory)
+
+    # The files found in the index can be opened from any directory
+    file_list = indexed_file_list(get_args(['dbgrep', '-r', '-x', index_directory, 'pos']))
+    assert (file_list == [os.path.join(str(tmp_path), 'data', 'tcs', 'tcs.db')])
+    assert (all(os.path.exists(f) for f in file_list))
+    file_list = indexed_file_list(get_args(['dbgrep', '-r', '-x', index_directory, '^tcs:']))
+    assert (file_list == [os.path.join(str(tmp_path), 'data', 'tcs', 'other.db')])
+
+
+if __name__ == '__main__':
+    pass
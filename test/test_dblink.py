@@ -0,0 +1,51 @@
+import pytest
+from dblink import parse_link, DbLink, LINK_NULL, LINK_CONSTANT, LINK_JSON, LINK_HARDWARE, LINK_PV, LINK_STRING
+
+
+@pytest.mark.parametrize('value,kind', [
+    ('', LINK_NULL),
+    ('  ', LINK_NULL),
+    ('1.5', LINK_CONSTANT),
+    ('-2e3', LINK_CONSTANT),
+    ('0x1F', LINK_CONSTANT),
+    ('[1, 2]', LINK_JSON),
+    ('{"calc": {"expr": "A"}}', LINK_JSON),
+    ('#C0 S1 @parm', LINK_HARDWARE),
+    ('@asyn(port)', LINK_HARDWARE),
+    ('tcs:pos', LINK_PV),
+    ('Gemini status record', LINK_STRING),
+    ('tcs:pos.VAL PP junk', LINK_STRING),
+    ('a.b.c', LINK_STRING)
+])
+def test_parse_link_kind(value, kind):
+    assert (parse_link(value).kind == kind)
+
+
+def test_parse_link_pv():
+    link = parse_link(' tcs:pos.RBV CP MS ')
+    assert (isinstance(link, DbLink))
+    assert (link == DbLink(LINK_PV, 'tcs:pos', 'RBV', 'CP', 'MS', 'tcs:pos.RBV CP MS'))
+    assert (link.is_pv())
+    assert (link.is_channel_access())
+    assert (parse_link('tcs:pos') == DbLink(LINK_PV, 'tcs:pos', None, None, None, 'tcs:pos'))
+    assert (parse_link('tcs:pos').get_field() == 'VAL')
+    assert (not parse_link('tcs:pos NPP').is_channel_access())
+    assert (not parse_link('1.5').is_pv())
+
+
+def test_parse_link_dot_modifiers():
+    assert (parse_link('tcs:pos.VAL.PP.NMS') == parse_link('tcs:pos.VAL PP NMS')._replace(value='tcs:pos.VAL.PP.NMS'))
+    assert (parse_link('tcs:pos.MS').field is None)
+    assert (parse_link('tcs:pos.MS').severity == 'MS')
+
+
+def test_canonical():
+    assert (parse_link('tcs:pos.VAL.PP.NMS').canonical() == 'tcs:pos.VAL PP NMS')
+    assert (parse_link('tcs:pos.VAL  NMS  PP').canonical() == 'tcs:pos.VAL PP NMS')
+    assert (parse_link('tcs:pos').canonical() == 'tcs:pos')
+    assert (parse_link('Gemini status record').canonical() == 'Gemini status record')
+    assert (parse_link('#C0 S1').canonical() == '#C0 S1')
+
+
+if __name__ == '__main__':
+    pass
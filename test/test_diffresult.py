@@ -0,0 +1,180 @@
+import io
+import os
+import json
+import pytest
+from db import DatabaseFile, EpicsDatabase, EpicsRecord
+from dbd import DbdFile
+from dbcompare import DiffResult, TreeDiffResult, FieldNormalizer, compare_records, compare_databases
+from dbcompare import compare_sorted_records
+
+# Database file names used in this test
+SIMPLE_DATABASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'db', 'simple.db')
+LARGER_DATABASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'db', 'larger.db')
+SMALL_DBD = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'dbd', 'small.dbd')
+
+
+def make_record(name, record_type, fields):
+    """
+    Auxiliary routine to create a record from a list of (field name, field value) tuples
+    """
+    record = EpicsRecord(name, record_type)
+    for field_name, field_value in fields:
+        record.add_field(field_name, field_value)
+    return record
+
+
+@pytest.fixture
+def databases():
+    """
+    Fixture used to return two databases with known differences
+    :return: tuple with two databases
+    :rtype: tuple
+    """
+    db1 = EpicsDatabase()
+    db2 = EpicsDatabase()
+    db1.add_record(make_record('a:same', 'ai', [('DESC', 'same'), ('PREC', '2')]))
+    db2.add_record(make_record('a:same', 'ai', [('PREC', '2'), ('DESC', 'same')]))
+    db1.add_record(make_record('a:type', 'ai', [('DESC', 'type')]))
+    db2.add_record(make_record('a:type', 'ao', [('DESC', 'type')]))
+    db1.add_record(make_record('a:fields', 'bi', [('DESC', 'one'), ('ZNAM', 'off'), ('SCAN', '1 second')]))
+    db2.add_record(make_record('a:fields', 'bi', [('DESC', 'two'), ('ONAM', 'on'), ('SCAN', '1 second')]))
+    db1.add_record(make_record('a:only1', 'ai', []))
+    db2.add_record(make_record('a:only2', 'ai', []))
+    return db1, db2
+
+
+def test_get_hash():
+    r1 = make_record('a', 'ai', [('DESC', 'x'), ('PREC', '1')])
+    r2 = make_record('b', 'ai', [('PREC', '1'), ('DESC', 'x')])
+    assert (r1.get_hash() == r2.get_hash())
+    r2.add_field('EGU', 'mm')
+    assert (r1.get_hash() != r2.get_hash())
+    assert (make_record('a', 'ai', []).get_hash() != make_record('a', 'ao', []).get_hash())
+
+
+def test_compare_records():
+    result = DiffResult()
+    compare_records(make_record('a', 'ai', [('DESC', 'x')]), make_record('a', 'ai', [('DESC', 'x')]), result)
+    assert (result.is_empty())
+    assert (result.identical_count == 1)
+
+
+def test_compare_databases(databases):
+    db1, db2 = databases
+    result = compare_databases(db1, db2, 'one.db', 'two.db')
+    assert (result.only_in_1 == ['a:only1'])
+    assert (result.only_in_2 == ['a:only2'])
+    assert (result.type_differences == [('a:type', 'ai', 'ao')])
+    assert (result.field_name_differences == [('a:fields', ['ZNAM'], ['ONAM'])])
+    assert (result.field_value_differences == [('a:fields', 'DESC', 'one', 'two')])
+    assert (result.identical_count == 1)
+
+
+def test_compare_sorted_records(databases):
+    db1, db2 = databases
+    result1 = compare_databases(db1, db2)
+    result2 = compare_sorted_records(iter([db1.get_record(r) for r in sorted(db1.get_record_names())]),
+                                     iter([db2.get_record(r) for r in sorted(db2.get_record_names())]))
+    assert (result1.to_dict() == result2.to_dict())
+
+
+def test_compare_same_file():
+    db1 = DatabaseFile(file_name=LARGER_DATABASE).read_database()
+    db2 = DatabaseFile(file_name=LARGER_DATABASE).read_database()
+    result = compare_databases(db1, db2)
+    assert (result.is_empty())
+    assert (result.identical_count == db1.record_count())
+
+
+def test_write_text(databases):
+    db1, db2 = databases
+    f = io.StringIO()
+    compare_databases(db1, db2, 'one.db', 'two.db').write_text(f_out=f)
+    assert (f.getvalue() == '\nRecords only in one.db\n   a:only1\n'
+                            '\nRecords only in two.db\n   a:only2\n'
+                            '\nRecords that are of different type\n   a:type\n'
+                            '\nFields that are not common in the same record\n   a:fields: ONAM ZNAM\n'
+                            '\nDifferences in field values\n   in a:fields\n      DESC "one" "two"\n')
+
+
+def test_write_json(databases):
+    db1, db2 = databases
+    f = io.StringIO()
+    compare_databases(db1, db2, 'one.db', 'two.db').write_json(f_out=f)
+    d = json.loads(f.getvalue())
+    assert (d['only_in_1'] == ['a:only1'])
+    assert (d['field_value_differences'] == [{'record': 'a:fields', 'field': 'DESC', 'value1': 'one', 'value2': 'two'}])
+
+
+def test_write_csv(databases):
+    db1, db2 = databases
+    f = io.StringIO()
+    compare_databases(db1, db2).write_csv(f_out=f)
+    lines = f.getvalue().splitlines()
+    assert (lines[0] == 'difference,record,field,value1,value2')
+    assert ('value,a:fields,DESC,one,two' in lines)
+    assert (len(lines) == 7)
+
+
+def test_numeric_normalizer():
+    r1 = make_record('a', 'ai', [('HOPR', '0.000000000000000e+00'), ('LOPR', '1.5'), ('EGU', 'mm')])
+    r2 = make_record('a', 'ai', [('HOPR', '0'), ('LOPR', '1.50000000001'), ('EGU', 'm')])
+    result = DiffResult()
+    compare_records(r1, r2, result)
+    assert (len(result.field_value_differences) == 3)
+    result = DiffResult()
+    compare_records(r1, r2, result, FieldNormalizer())
+    assert (result.field_value_differences == [('a', 'EGU', 'mm', 'm')])
+    result = DiffResult()
+    compare_records(r1, r2, result, FieldNormalizer(tolerance=1e-15))
+    assert (len(result.field_value_differences) == 2)
+
+
+def test_default_normalizer():
+    normalizer = FieldNormalizer(dbd=DbdFile(SMALL_DBD))
+    r1 = make_record('a', 'ai', [('SCAN', 'Passive'), ('PREC', '0.0'), ('FLNK', '0.000000000000000e+00'),
+                                 ('DISV', '1'), ('DESC', 'x')])
+    r2 = make_record('a', 'ai', [('DESC', 'x'), ('DISV', '0')])
+    assert (sorted(normalizer.normalize(r1)) == ['DESC'])
+    result = DiffResult()
+    compare_records(r1, r2, result, normalizer)
+    assert (result.field_name_differences == [('a', [], ['DISV'])])
+    assert (result.field_value_differences == [])
+
+
+def test_find_moved_and_renamed():
+    tree = TreeDiffResult('one', 'two')
+    result_a = DiffResult('one/a.db', 'two/a.db')
+    result_a.only_in_1 = ['a:moved', 'a:old']
+    result_b = DiffResult('one/b.db', 'two/b.db')
+    result_b.only_in_2 = ['a:moved', 'a:new', 'a:added']
+    tree.add_result('a.db', result_a, [('a:moved', 'h1'), ('a:old', 'h2')], [])
+    tree.add_result('b.db', result_b, [], [('a:moved', 'h3'), ('a:new', 'h2'), ('a:added', 'h4')])
+    tree.add_result('c.db', DiffResult('one/c.db', ''), [], [])
+    tree.find_moved_and_renamed()
+    assert (tree.moved == [('a:moved', 'a.db', 'b.db', False)])
+    assert (tree.renamed == [('a:old', 'a.db', 'a:new', 'b.db')])
+    assert (tree.files_only_in_1 == ['c.db'])
+    assert (result_a.only_in_1 == [])
+    assert (result_b.only_in_2 == ['a:added'])
+
+
+def test_tree_write_csv():
+    tree = TreeDiffResult('one', 'two')
+    result = DiffResult('one/a.db', 'two/a.db')
+    result.only_in_1 = ['a:old']
+    tree.add_result('a.db', result, [], [])
+    tree.add_result('b.db', DiffResult('one/b.db', ''), [], [])
+    tree.add_result('c.db', DiffResult('', 'two/c.db'), [], [])
+    tree.add_error('d.db', 'parse error')
+    f_out = io.StringIO()
+    tree.write_csv(f_out)
+    assert (f_out.getvalue().splitlines() == ['file,difference,record,field,value1,value2',
+                                              'b.db,file_only_in_1,,,,',
+                                              'c.db,file_only_in_2,,,,',
+                                              'd.db,error,,,parse error,',
+                                              'a.db,only_in_1,a:old,,,'])
+
+
+if __name__ == '__main__':
+    pass
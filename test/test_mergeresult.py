@@ -0,0 +1,60 @@
+import io
+import json
+from db import EpicsDatabase, EpicsRecord
+from dbcompare import MergeResult, merge_databases, CONFLICT_FIELD, CONFLICT_TYPE, CONFLICT_DELETE
+
+
+def make_database(record_list):
+    """
+    Auxiliary routine to create a database from a list of (name, type, fields) tuples
+    """
+    db = EpicsDatabase()
+    for name, record_type, fields in record_list:
+        record = EpicsRecord(name, record_type)
+        for field_name, field_value in fields:
+            record.add_field(field_name, field_value)
+        db.add_record(record)
+    return db
+
+
+def test_merge_no_conflicts():
+    base = make_database([('a', 'ai', [('DESC', 'a'), ('PREC', '1')]),
+                          ('b', 'ai', [('DESC', 'b')]),
+                          ('c', 'ai', [('DESC', 'c')])])
+    ours = make_database([('a', 'ai', [('DESC', 'a2'), ('PREC', '1')]),
+                          ('b', 'ai', [('DESC', 'b')]),
+                          ('d', 'ao', [('DESC', 'd')])])
+    theirs = make_database([('a', 'ai', [('DESC', 'a'), ('PREC', '3'), ('EGU', 'mm')]),
+                            ('c', 'ai', [('DESC', 'c')]),
+                            ('e', 'bo', [])])
+    result = merge_databases(base, ours, theirs)
+    assert (isinstance(result, MergeResult))
+    assert (result.conflicts == [])
+    assert (result.changed_count == 1)
+    db = result.database
+    assert (db.get_record_names() == ['a', 'd', 'e'])
+    assert (db.get_record('a').get_fields() == [('DESC', 'a2'), ('PREC', '3'), ('EGU', 'mm')])
+
+
+def test_merge_conflicts():
+    base = make_database([('a', 'ai', [('DESC', 'a')]),
+                          ('b', 'ai', [('DESC', 'b')]),
+                          ('c', 'ai', [('DESC', 'c')])])
+    ours = make_database([('a', 'ai', [('DESC', 'ours')]),
+                          ('b', 'ao', [('DESC', 'b')]),
+                          ('c', 'ai', [('DESC', 'c2')])])
+    theirs = make_database([('a', 'ai', [('DESC', 'theirs')]),
+                            ('b', 'bo', [('DESC', 'b')])])
+    result = merge_databases(base, ours, theirs)
+    assert (result.conflicts == [(CONFLICT_FIELD, 'a', 'DESC', 'a', 'ours', 'theirs'),
+                                 (CONFLICT_TYPE, 'b', '', 'ai', 'ao', 'bo'),
+                                 (CONFLICT_DELETE, 'c', '', 'ai', 'ai', None)])
+    assert (result.database.get_record('a').get_field_value('DESC') == 'ours')
+    assert (result.database.get_record('c').get_field_value('DESC') == 'c2')
+    f = io.StringIO()
+    result.write_conflicts_json(f_out=f)
+    assert (len(json.loads(f.getvalue())) == 3)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,51 @@
+import io
+import pytest
+from pvparser import PvParser
+from pvtrace import ProfileHook, PrintTraceHook
+
+
+@pytest.fixture
+def pv_file(tmp_path):
+    file_name = tmp_path / 'test.pv'
+    file_name.write_text('group {\n  double tcs:a = 1.5 deg;\n  int tcs:b = 2;\n}\nsleep 1;\n')
+    return str(file_name)
+
+
+def test_no_hook():
+    parser = PvParser()
+    assert (parser.hook is None)
+    assert ('pv_item' not in vars(parser))
+    assert ('get_token' not in vars(parser))
+
+
+def test_profile(pv_file):
+    hook = ProfileHook()
+    parser = PvParser(hook=hook)
+    assert (parser.pv_file(pv_file) is True)
+    assert (hook.calls['pv_file'] == 1)
+    assert (hook.calls['pv_item'] == 3)  # group, sleep and end of file
+    assert (hook.calls['pv_single_value'] == 2)
+    assert ('pv_error' not in hook.calls)
+    assert (hook.times['pv_file'] >= hook.times['pv_group'])
+
+    other = ProfileHook()
+    other.merge(hook)
+    other.merge(hook)
+    assert (other.calls['pv_file'] == 2)
+
+    f_out = io.StringIO()
+    hook.report(f_out)
+    assert (f_out.getvalue().split('\n')[1].startswith('pv_file'))
+
+
+def test_print_trace(pv_file):
+    f_out = io.StringIO()
+    parser = PvParser(hook=PrintTraceHook(f_out))
+    parser.pv_file(pv_file)
+    lines = f_out.getvalue().split('\n')
+    assert (lines[0] == '> pv_file Token(0,none)')
+    assert (lines[1] == '> pv_item Token(0,none)')
+
+
+if __name__ == '__main__':
+    pass
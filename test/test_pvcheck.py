@@ -0,0 +1,57 @@
+import io
+import json
+import pytest
+from pvcheck import expand_file_list, check_files, count_diagnostics, print_report, write_json_report
+from pvparser import SEVERITY_ERROR, SEVERITY_WARNING
+
+
+@pytest.fixture
+def pv_directory(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'a.pv').write_text('double tcs:a = 1.5 deg;\ntcs:b = 2;\n')
+    (tmp_path / 'sub' / 'b.pv').write_text('group {\n  int tcs:c = 1;\n}\nint tcs:d = & ;\n')
+    (tmp_path / 'notes.txt').write_text('not a pvload file\n')
+    return tmp_path
+
+
+def test_expand_file_list(pv_directory):
+    file_list = expand_file_list([str(pv_directory), 'other.pv'], '*.pv')
+    assert (file_list == [str(pv_directory / 'a.pv'), str(pv_directory / 'sub' / 'b.pv'), 'other.pv'])
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_check_files(pv_directory, jobs):
+    file_list = [str(pv_directory / 'a.pv'), str(pv_directory / 'sub' / 'b.pv'), str(pv_directory / 'x.pv')]
+    diagnostics, profile_hook = check_files(file_list, jobs)
+    assert (profile_hook is None)
+    assert ([(d.file, d.line, d.column, d.severity) for d in diagnostics] ==
+            [(file_list[0], 2, 0, SEVERITY_WARNING),
+             (file_list[1], 4, 13, SEVERITY_ERROR),
+             (file_list[2], 0, 0, SEVERITY_ERROR)])
+    assert (diagnostics[0].message == 'type not defined')
+    assert (diagnostics[0].source == 'tcs:b = 2;')
+    assert (count_diagnostics(diagnostics) == (2, 1))
+
+
+def test_profile(pv_directory):
+    diagnostics, profile_hook = check_files([str(pv_directory / 'a.pv'), str(pv_directory / 'sub' / 'b.pv')],
+                                            2, profile=True)
+    assert (profile_hook.calls['pv_file'] == 2)
+
+
+def test_report(pv_directory):
+    file_list = [str(pv_directory / 'a.pv')]
+    diagnostics, _ = check_files(file_list, 1)
+    f_out = io.StringIO()
+    print_report(file_list, diagnostics, False, f_out)
+    assert (f_out.getvalue() == 'Warning: file ' + file_list[0] + ', line 2 -> type not defined\n' +
+            '>> tcs:b = 2;\n1 files, 0 errors, 1 warnings\n')
+    f_out = io.StringIO()
+    write_json_report(file_list, diagnostics, f_out)
+    report = json.loads(f_out.getvalue())
+    assert ((report['files'], report['errors'], report['warnings']) == (1, 0, 1))
+    assert (report['diagnostics'][0]['line'] == 2)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,100 @@
+import os
+import pytest
+from dbd import DbdFile
+from pvmodel import PvFile, PvSingle
+from pvdb import RecordInfo, read_record_table, split_pv_name, check_single, check_model
+from pvcheck import check_files
+from pvparser import SEVERITY_ERROR, SEVERITY_WARNING
+
+# Dbd file used in these tests
+SMALL_DBD = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'dbd', 'small.dbd')
+
+# Database used in these tests
+DATABASE = '''record(ai, "tcs:ai") {
+    field(DESC, "analog input")
+}
+record(stringout, "tcs:name") {
+}
+record(waveform, "tcs:wave") {
+    field(NELM, "4")
+    field(FTVL, "DOUBLE")
+}
+'''
+
+
+@pytest.fixture
+def db_directory(tmp_path):
+    directory = os.path.join(str(tmp_path), 'db')
+    os.makedirs(os.path.join(directory, 'sub'))
+    with open(os.path.join(directory, 'sub', 'tcs.db'), 'w') as f:
+        f.write(DATABASE)
+    return directory
+
+
+@pytest.fixture
+def record_table():
+    return {'tcs:ai': RecordInfo('ai', None, None),
+            'tcs:name': RecordInfo('stringout', None, None),
+            'tcs:wave': RecordInfo('waveform', 4, 'DOUBLE')}
+
+
+def single(name, type_name='double', count=1):
+    return PvSingle(3, type_name, name, count, (), ('1',) * count, (None,) * count)
+
+
+def test_read_record_table(db_directory, record_table, tmp_path):
+    cache_directory = os.path.join(str(tmp_path), 'cache')
+    assert (read_record_table(db_directory) == record_table)
+    assert (read_record_table(db_directory, cache_directory) == record_table)
+    assert (len(os.listdir(cache_directory)) == 1)
+    assert (read_record_table(db_directory, cache_directory) == record_table)
+
+
+def test_split_pv_name():
+    assert (split_pv_name('tcs:ai') == ('tcs:ai', 'VAL'))
+    assert (split_pv_name('tcs:ai.DESC') == ('tcs:ai', 'DESC'))
+
+
+@pytest.mark.parametrize('statement,messages', [
+    (single('tcs:ai'), []),
+    (single('tcs:ai', 'int'), []),
+    (single('tcs:ai', None), []),
+    (single('tcs:ai.DESC', 'string'), []),
+    (single('tcs:missing'), [(SEVERITY_ERROR, 'record tcs:missing not found in the databases')]),
+    (single('tcs:ai', 'string'), [(SEVERITY_WARNING, 'type string does not match float field tcs:ai.VAL')]),
+    (single('tcs:name', 'double'), [(SEVERITY_WARNING, 'type double does not match string field tcs:name.VAL')]),
+    (single('tcs:wave', 'double', 4), []),
+    (single('tcs:wave', 'double', 5), [(SEVERITY_WARNING, 'array of 5 elements larger than NELM=4 in tcs:wave')]),
+    (single('tcs:ai', 'double', 2), [(SEVERITY_WARNING, 'array of 2 elements for scalar record tcs:ai')])
+])
+def test_check_single(record_table, statement, messages):
+    assert (check_single(statement, record_table) == messages)
+
+
+def test_check_single_dbd(record_table):
+    dbd = DbdFile(SMALL_DBD)
+    assert (check_single(single('tcs:ai.HOPR'), record_table, dbd) == [])
+    assert (check_single(single('tcs:ai.PREC', 'double'), record_table, dbd) ==
+            [(SEVERITY_WARNING, 'type double does not match integer field tcs:ai.PREC')])
+    assert (check_single(single('tcs:ai.XYZ'), record_table, dbd) ==
+            [(SEVERITY_WARNING, 'field XYZ not defined for record type ai')])
+
+
+def test_check_model(record_table):
+    diagnostics = check_model(PvFile('test.pv', (single('tcs:ai'), single('tcs:other'))), record_table)
+    assert ([(d.file, d.line, d.severity) for d in diagnostics] == [('test.pv', 3, SEVERITY_ERROR)])
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_check_files(record_table, tmp_path, jobs):
+    file_name = os.path.join(str(tmp_path), 'test.pv')
+    with open(file_name, 'w') as f:
+        f.write('double tcs:ai = 1;\nsleep;\ndouble tcs:other = 2;\n')
+    diagnostics, _ = check_files([file_name, file_name], jobs, record_table=record_table)
+    assert ([(d.line, d.severity) for d in diagnostics] == [(2, SEVERITY_WARNING), (3, SEVERITY_ERROR)] * 2)
+    diagnostics, _ = check_files([file_name], jobs)
+    assert ([(d.line, d.severity) for d in diagnostics] == [(2, SEVERITY_WARNING)])
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,72 @@
+import math
+import pytest
+from pvmodel import PvFile, PvGroup, PvSingle
+from pveval import to_float, scale_factor, evaluate_single, evaluate_model
+
+
+def single(name, values, count=1, indices=(), scales=None, type_name='double'):
+    return PvSingle(1, type_name, name, count, indices, values, scales if scales else (None,) * len(values))
+
+
+def test_to_float():
+    assert (to_float('1.5') == 1.5)
+    assert (to_float('-2') == -2.0)
+    assert (to_float('0x1F') == 31.0)
+    assert (to_float(',5') == 0.5)
+    assert (to_float('-,25e1') == -2.5)
+    with pytest.raises(ValueError):
+        to_float('"abc"')
+
+
+def test_scale_factor():
+    assert (scale_factor(None) == 1.0)
+    assert (scale_factor(('*', '2')) == 2.0)
+    assert (scale_factor(('/', '4')) == 0.25)
+    assert (scale_factor(('*', 'deg')) == pytest.approx(math.pi / 180))
+    assert (scale_factor(('/', 'arcsec')) == pytest.approx(180 * 3600 / math.pi))
+    assert (scale_factor(('*', 'mm')) == pytest.approx(1e-3))
+    assert (scale_factor(('*', ',5')) == 0.5)
+    assert (scale_factor(('/', ',5')) == 2.0)
+
+
+def test_evaluate_scalar():
+    assert (list(evaluate_single(single('a', ('3',), scales=(('*', '2'),)))) == [6.0])
+    assert (list(evaluate_single(single('a', ('180',), scales=(('*', 'deg'),)))) == [pytest.approx(math.pi)])
+    assert (list(evaluate_single(single('a', (',5',), scales=(('*', ',2'),)))) == [pytest.approx(0.1)])
+    assert (evaluate_single(single('a', ('"x"',))) is None)
+    assert (evaluate_single(single('a', ('1',), type_name='string')) is None)
+
+
+def test_evaluate_array():
+    values = evaluate_single(single('a', ('1', '2', '3'), count=4, indices=(3, 0, 1),
+                                    scales=(None, ('/', '2'), ('*', 'um'))))
+    assert (values[0] == 1.0)
+    assert (values[1] == pytest.approx(3e-6))
+    assert (math.isnan(values[2]))
+    assert (values[3] == 1.0)
+    values = evaluate_single(single('a', ('1', '2'), count=3))
+    assert (values[:2].tolist() == [1.0, 2.0] and math.isnan(values[2]))
+
+
+@pytest.mark.parametrize('statement', [
+    single('a', ('1', '2'), count=2, indices=(0,)),
+    single('a', ('1',), count=2, indices=(2,)),
+    single('a', ('1', '2'), count=1),
+    single('a', ('1',), scales=(('*', 'furlong'),))
+])
+def test_evaluate_errors(statement):
+    with pytest.raises(ValueError):
+        evaluate_single(statement)
+
+
+def test_evaluate_model():
+    model = PvFile('test.pv', (
+        PvGroup(1, (single('a', ('1', '2'), count=2), single('b', ('"x"',), type_name='string'))),
+        single('a', ('5',), count=2, indices=(1,))))
+    values = evaluate_model(model)
+    assert (sorted(values) == ['a'])
+    assert (values['a'].tolist() == [1.0, 5.0])
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,92 @@
+import io
+import pytest
+from pvlexer import PvLexer
+from pvlexer import TOKEN_INTEGER, TOKEN_FLOAT, TOKEN_STRING, TOKEN_PVNAME
+from pvlexer import TOKEN_TYPE, TOKEN_UNIT, TOKEN_GROUP, TOKEN_SLEEP
+from pvlexer import TOKEN_SEMICOLON, TOKEN_COMMA, TOKEN_EQUALS, TOKEN_TIMES, TOKEN_DIVIDED, TOKEN_PERCENT
+from pvlexer import TOKEN_LEFT_BRACE, TOKEN_RIGHT_BRACE, TOKEN_LEFT_BRACKET, TOKEN_RIGHT_BRACKET, TOKEN_ERROR
+from pvlexer import TOKEN_EOF
+
+
+@pytest.fixture
+def lexer():
+    return PvLexer()
+
+
+def tokens(lexer, line):
+    return [(t.id, t.value) for t in lexer._get_token_list(line)]
+
+
+@pytest.mark.parametrize('value,token_id', [
+    ('12', TOKEN_INTEGER),
+    ('-12', TOKEN_INTEGER),
+    ('+12', TOKEN_INTEGER),
+    ('0x1F', TOKEN_INTEGER),
+    ('1.5', TOKEN_FLOAT),
+    ('1.', TOKEN_FLOAT),
+    ('.5', TOKEN_FLOAT),
+    ('1e5', TOKEN_FLOAT),
+    ('-2.5E-3', TOKEN_FLOAT),
+    ('"a string"', TOKEN_STRING),
+    ('double', TOKEN_TYPE),
+    ('arcsec', TOKEN_UNIT),
+    ('um', TOKEN_UNIT),
+    ('millimetres', TOKEN_UNIT),
+    ('group', TOKEN_GROUP),
+    ('sleep', TOKEN_SLEEP),
+    ('tcs:ak:pos.VAL', TOKEN_PVNAME)
+])
+def test_single_token(lexer, value, token_id):
+    assert (tokens(lexer, value) == [(token_id, value)])
+
+
+def test_statement(lexer):
+    assert (tokens(lexer, '%double tcs:pos[2] = {[0] 1.5 deg, [1] 2 / 3};') ==
+            [(TOKEN_PERCENT, '%'), (TOKEN_TYPE, 'double'), (TOKEN_PVNAME, 'tcs:pos'), (TOKEN_LEFT_BRACKET, '['),
+             (TOKEN_INTEGER, '2'), (TOKEN_RIGHT_BRACKET, ']'), (TOKEN_EQUALS, '='), (TOKEN_LEFT_BRACE, '{'),
+             (TOKEN_LEFT_BRACKET, '['), (TOKEN_INTEGER, '0'), (TOKEN_RIGHT_BRACKET, ']'), (TOKEN_FLOAT, '1.5'),
+             (TOKEN_UNIT, 'deg'), (TOKEN_COMMA, ','), (TOKEN_LEFT_BRACKET, '['), (TOKEN_INTEGER, '1'),
+             (TOKEN_RIGHT_BRACKET, ']'), (TOKEN_INTEGER, '2'), (TOKEN_DIVIDED, '/'), (TOKEN_INTEGER, '3'),
+             (TOKEN_RIGHT_BRACE, '}'), (TOKEN_SEMICOLON, ';')])
+    assert (tokens(lexer, 'a = 2 * 3') == [(TOKEN_PVNAME, 'a'), (TOKEN_EQUALS, '='), (TOKEN_INTEGER, '2'),
+                                           (TOKEN_TIMES, '*'), (TOKEN_INTEGER, '3')])
+    assert (tokens(lexer, '{1,2} ,5') == [(TOKEN_LEFT_BRACE, '{'), (TOKEN_INTEGER, '1'), (TOKEN_COMMA, ','),
+                                          (TOKEN_INTEGER, '2'), (TOKEN_RIGHT_BRACE, '}'), (TOKEN_FLOAT, ',5')])
+
+
+def test_comment(lexer):
+    assert (tokens(lexer, 'sleep 2; # comment = 3') == [(TOKEN_SLEEP, 'sleep'), (TOKEN_INTEGER, '2'),
+                                                        (TOKEN_SEMICOLON, ';')])
+    assert (tokens(lexer, '# comment') == [])
+
+
+def test_error(lexer):
+    assert (tokens(lexer, 'a & b') == [(TOKEN_PVNAME, 'a'), (TOKEN_ERROR, '&')])
+
+
+def test_next_token(lexer):
+    f = io.StringIO('# header\n\ngroup {\n  a = 1;  # note\n}\n')
+    assert ([(t.id, t.value, t.line, t.column) for t in lexer.tokens(f)] ==
+            [(TOKEN_GROUP, 'group', 3, 1), (TOKEN_LEFT_BRACE, '{', 3, 7), (TOKEN_PVNAME, 'a', 4, 3),
+             (TOKEN_EQUALS, '=', 4, 5), (TOKEN_INTEGER, '1', 4, 7), (TOKEN_SEMICOLON, ';', 4, 8),
+             (TOKEN_RIGHT_BRACE, '}', 5, 1), (TOKEN_EOF, '', 6, 1)])
+    assert (lexer.get_last_line() == (5, '}'))
+    assert (lexer.next_token(f).id == TOKEN_EOF)
+
+
+def test_flush(lexer):
+    f = io.StringIO('a = 1;\nb = 2;\n')
+    assert (lexer.next_token(f).value == 'a')
+    lexer.flush()
+    assert (lexer.next_token(f).value == 'b')
+    assert (lexer.get_last_line() == (2, 'b = 2;'))
+
+
+def test_new_file(lexer):
+    lexer.next_token(io.StringIO('a = 1;\n'))
+    token = lexer.next_token(io.StringIO('\nb = 2;\n'))
+    assert ((token.value, token.line) == ('b', 2))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,151 @@
+import os
+import pytest
+from pvparser import PvParser, read_model
+from pvmodel import PvFile, PvGroup, PvSingle, PvSleep, PvHandler, next_single
+
+# Contents of the pvload file used in these tests
+PV_FILE = '''group {
+  double tcs:a[3] = {[0] 1.5 deg, [2] 2 / 3, [1] 4 * 2};
+  int tcs:b = 2;
+}
+sleep 1;
+sleep;
+group {
+  string tcs:c = "x";
+  tcs:d = & ;
+}
+%tcs:e = 5 arcsec;
+'''
+
+
+@pytest.fixture
+def pv_file(tmp_path):
+    file_name = os.path.join(str(tmp_path), 'test.pv')
+    with open(file_name, 'w') as f:
+        f.write(PV_FILE)
+    return file_name
+
+
+def test_no_model(pv_file):
+    parser = PvParser()
+    assert (parser.pv_file(pv_file))
+    assert (parser.model is None)
+
+
+def test_model(pv_file):
+    parser = PvParser(model=True)
+    assert (parser.pv_file(pv_file))
+    assert (parser.model == PvFile(pv_file, (
+        PvGroup(1, (
+            PvSingle(2, 'double', 'tcs:a', 3, (0, 2, 1), ('1.5', '2', '4'), (('*', 'deg'), ('/', '3'), ('*', '2'))),
+            PvSingle(3, 'int', 'tcs:b', 1, (), ('2',), (None,)))),
+        PvSleep(5, '1'),
+        PvSleep(6, None),
+        PvSingle(11, None, 'tcs:e', 1, (), ('5',), (('*', 'arcsec'),)))))
+    assert ([single.name for single in next_single(parser.model.items)] == ['tcs:a', 'tcs:b', 'tcs:e'])
+
+
+def test_read_model(pv_file, tmp_path):
+    cache_directory = os.path.join(str(tmp_path), 'cache')
+    model = read_model(pv_file, cache_directory)
+    assert (len(os.listdir(cache_directory)) == 1)
+    assert (read_model(pv_file, cache_directory) == model)
+    assert (read_model(pv_file) == model)
+    assert (read_model(os.path.join(str(tmp_path), 'missing.pv'), cache_directory) is None)
+    assert (read_model(os.path.join(str(tmp_path), 'missing.pv')) is None)
+
+
+@pytest.mark.parametrize('statement,messages', [
+    ('int tcs:a = 1;', []),
+    ('int tcs:a = 0x1F;', []),
+    ('int tcs:a = 1.5;', ['type mismatch']),
+    ('double tcs:a[3] = {1, 2.5, -3e2};', []),
+    ('double tcs:a[3] = {1, "x", 2};', ['type mismatch (1 of 3 values)']),
+    ('int tcs:a[3] = {1.5, 2.5, 3};', ['type mismatch (2 of 3 values)']),
+    ('string tcs:a = "x";', []),
+    ('string tcs:a = 12;', ['type mismatch']),
+    ('char tcs:a[2] = {"x", 1.5};', ['type mismatch (1 of 2 values)']),
+    ('tcs:a = 1;', ['type not defined'])
+])
+def test_type_check(tmp_path, statement, messages):
+    file_name = os.path.join(str(tmp_path), 'test.pv')
+    with open(file_name, 'w') as f:
+        f.write(statement + '\n')
+    parser = PvParser()
+    parser.pv_file(file_name)
+    assert ([d.message for d in parser.diagnostics] == messages)
+
+
+@pytest.mark.parametrize('statement,values,scales,messages', [
+    ('int tcs:a[2] = {1,2};', ('1', '2'), (None, None), []),
+    ('int tcs:a[3] = {1,2,3};', ('1', '2', '3'), (None, None, None), []),
+    ('double tcs:a[2] = {1.5 deg,2};', ('1.5', '2'), (('*', 'deg'), None), []),
+    ('double tcs:a = 2 * ,5;', ('2',), (('*', ',5'),), []),
+    ('double tcs:a = ,5;', (',5',), (None,), []),
+    ('int tcs:a = 5,3;', None, None, ["at ',', expected ';'"]),
+    ('double tcs:a[2] = {1 ,5};', None, None, ["at ',5', expected '}'"])
+])
+def test_value_list(tmp_path, statement, values, scales, messages):
+    file_name = os.path.join(str(tmp_path), 'test.pv')
+    with open(file_name, 'w') as f:
+        f.write(statement + '\n')
+    parser = PvParser(model=True)
+    parser.pv_file(file_name)
+    assert ([d.message for d in parser.diagnostics] == messages)
+    if values is None:
+        assert (parser.model.items == ())
+    else:
+        assert ([(s.values, s.scales) for s in parser.model.items] == [(values, scales)])
+
+
+class EventHandler(PvHandler):
+    def __init__(self):
+        self.events = []
+
+    def on_file_start(self, file_name):
+        self.events.append('file_start')
+
+    def on_file_end(self, file_name):
+        self.events.append('file_end')
+
+    def on_group_start(self, line):
+        self.events.append(('group_start', line))
+
+    def on_group_end(self, line):
+        self.events.append(('group_end', line))
+
+    def on_single(self, single):
+        self.events.append(('single', single.name))
+
+    def on_sleep(self, sleep):
+        self.events.append(('sleep', sleep.time))
+
+    def on_warning(self, diagnostic):
+        self.events.append(('warning', diagnostic.line))
+
+    def on_error(self, diagnostic):
+        self.events.append(('error', diagnostic.line))
+
+
+def test_handler(pv_file):
+    handler = EventHandler()
+    parser = PvParser(handler=handler)
+    assert (parser.pv_file(pv_file))
+    assert (handler.events == ['file_start', ('group_start', 1), ('single', 'tcs:a'), ('single', 'tcs:b'),
+                               ('group_end', 4), ('sleep', '1'), ('warning', 6), ('sleep', None),
+                               ('group_start', 7), ('single', 'tcs:c'), ('error', 9), ('error', 10),
+                               ('warning', 11), ('single', 'tcs:e'), 'file_end'])
+    assert (parser.diagnostics == [] and parser.collector is None)
+    assert ((parser.error_count, parser.warning_count) == (2, 2))
+    assert (parser.model is None)
+
+    # The diagnostics are collected when there's no handler
+    parser = PvParser()
+    assert (parser.pv_file(pv_file))
+    assert ([(d.severity, d.line) for d in parser.diagnostics] ==
+            [('warning', 6), ('error', 9), ('error', 10), ('warning', 11)])
+    assert ((parser.error_count, parser.warning_count) == (2, 2))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,26 @@
+import pytest
+from pvtoken import PvToken
+
+
+@pytest.fixture
+def token():
+    return PvToken(1, 'tcs:pos', 3, 5)
+
+
+def test_token(token):
+    assert (token.get_id() == 1)
+    assert (token.get_value() == 'tcs:pos')
+    assert ((token.line, token.column) == (3, 5))
+    assert (token.match(1) is True)
+    assert (token.match(2) is False)
+    assert (token.is_in(frozenset([1, 2])) is True)
+    assert (token.is_in(frozenset([2, 3])) is False)
+
+
+def test_slots(token):
+    with pytest.raises(AttributeError):
+        token.other = 0
+
+
+if __name__ == '__main__':
+    pass
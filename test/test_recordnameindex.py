@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import pytest
+from recordindex import RecordNameIndex, glob_prefix, regex_prefix, read_record_index, MANIFEST_VERSION
+
+# Record names used in this test
+RECORD_NAMES = ['tcs:drives:az', 'tcs:drives:el', 'tcs:drives', 'tcs:pos', 'mcs:az', 'mcs:el', 'tcs:drivesX']
+
+
+@pytest.fixture
+def record_index():
+    return RecordNameIndex([(name, 'sys') for name in RECORD_NAMES] + [('mcs:az', 'other')])
+
+
+def test_prefix_functions():
+    assert (glob_prefix('tcs:drives:*') == 'tcs:drives:')
+    assert (glob_prefix('tcs:?os') == 'tcs:')
+    assert (glob_prefix('tcs:pos') == 'tcs:pos')
+    assert (regex_prefix('^tcs:drives') == 'tcs:drives')
+    assert (regex_prefix('^tcs:d.*') == 'tcs:d')
+    assert (regex_prefix('^tcs:ds*') == 'tcs:d')
+    assert (regex_prefix('tcs:drives') == '')
+    assert (regex_prefix('^tcs|mcs') == '')
+
+
+def test_get(record_index):
+    assert (len(record_index) == len(RECORD_NAMES))
+    assert ('tcs:pos' in record_index)
+    assert ('tcs:po' not in record_index)
+    assert (record_index.get('mcs:az') == ['sys', 'other'])
+    assert (record_index.get('xyz') == [])
+
+
+def test_prefix(record_index):
+    assert (record_index.prefix('tcs:drives:') == ['tcs:drives:az', 'tcs:drives:el'])
+    assert (record_index.prefix('tcs:drives') == ['tcs:drives', 'tcs:drives:az', 'tcs:drives:el', 'tcs:drivesX'])
+    assert (record_index.prefix('') == sorted(RECORD_NAMES))
+    assert (record_index.prefix('xyz') == [])
+
+
+def test_range(record_index):
+    assert (record_index.range('mcs:', 'mcs;') == ['mcs:az', 'mcs:el'])
+    assert (record_index.range('tcs:drives:el', 'tcs:pos') == ['tcs:drives:el', 'tcs:drivesX'])
+
+
+def test_glob(record_index):
+    assert (record_index.glob('tcs:drives:*') == ['tcs:drives:az', 'tcs:drives:el'])
+    assert (record_index.glob('*:az') == ['mcs:az', 'tcs:drives:az'])
+    assert (record_index.glob('tcs:drives?') == ['tcs:drivesX'])
+    assert (record_index.glob('tcs:pos') == ['tcs:pos'])
+    assert (record_index.glob('tcs:po') == [])
+
+
+def test_search(record_index):
+    assert (record_index.search('^tcs:drives:') == ['tcs:drives:az', 'tcs:drives:el'])
+    assert (record_index.search('el$') == ['mcs:el', 'tcs:drives:el'])
+    assert (record_index.search('^TCS:POS', re.IGNORECASE) == ['tcs:pos'])
+
+
+def test_read_record_index(tmp_path):
+    manifest = {'version': MANIFEST_VERSION,
+                'databases': {'tcs.db': {'path': '/data/tcs.db',
+                                         'records': [['tcs:a', 1, 'tcs:a'], ['tcs:b', 5, '$(top)b']]}}}
+    with open(os.path.join(str(tmp_path), 'tcs.manifest'), 'w') as f:
+        json.dump(manifest, f)
+    record_index = read_record_index(str(tmp_path))
+    assert (record_index.names == ['tcs:a', 'tcs:b'])
+    assert (record_index.get('tcs:b') == [('tcs', 'tcs.db', 5)])
+    record_index = read_record_index(str(tmp_path), raw=True)
+    assert (record_index.names == ['$(top)b', 'tcs:a'])
+    assert (record_index.get('$(top)b') == [('tcs', '/data/tcs.db', 5)])
+
+
+def test_read_record_index_version(tmp_path):
+    manifest = {'version': MANIFEST_VERSION,
+                'databases': {'tcs.db': {'records': [['tcs:a', 1, 'tcs:a']]}, 'empty.db': {'records': []}}}
+    with open(os.path.join(str(tmp_path), 'tcs.manifest'), 'w') as f:
+        json.dump(manifest, f)
+    with open(os.path.join(str(tmp_path), 'mcs.manifest'), 'w') as f:
+        json.dump({'version': 2, 'databases': {'mcs.db': {'records': [['mcs:a', 1]]}}}, f)
+    with open(os.path.join(str(tmp_path), 'ecs.manifest'), 'w') as f:
+        json.dump({'ecs.db': [0, 0]}, f)
+    database_set = set()
+    record_index = read_record_index(str(tmp_path), database_set)
+    assert (record_index.names == ['tcs:a'])
+    assert (database_set == {'tcs.db', 'empty.db'})
+
+
+if __name__ == '__main__':
+    pass
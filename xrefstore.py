@@ -0,0 +1,215 @@
+"""
+This module defines the CrossRefStore class.
+
+CrossRefStore keeps the records and the links between records for all the systems in a
+local SQLite database, so cross reference queries become indexed lookups instead of a scan
+of every database file in the facility. The store contains four tables:
+
+  * records: one row per record (record name, system, database file name)
+
+  * links: one row per reference found in a field value (system, database file name,
+    source record, source field, target record, target field)
+
+  * databases: one row per database file in the store (file name, system, content hash),
+    used to find out whether the store is in sync with the index manifests
+
+  * properties: name and value pairs, with the store version written when the store is built.
+    A store without it was never built completely (or was built by another version) and has
+    to be rebuilt, even if the systems have no records or links.
+
+The store is filled one database file at a time. All the rows for a database file can be
+removed and added again when the file changes, without touching the rest of the store.
+"""
+import sqlite3
+
+# Store format version, written in the properties table when the store is built
+STORE_VERSION = 1
+
+# SQL statements used to create the tables and indices
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS records (name TEXT, system TEXT, database TEXT)',
+    'CREATE TABLE IF NOT EXISTS links (system TEXT, database TEXT, record TEXT, field TEXT, '
+    'target_record TEXT, target_field TEXT)',
+    'CREATE TABLE IF NOT EXISTS databases (name TEXT PRIMARY KEY, system TEXT, hash TEXT)',
+    'CREATE TABLE IF NOT EXISTS properties (name TEXT PRIMARY KEY, value TEXT)',
+    'CREATE INDEX IF NOT EXISTS records_name ON records (name, system)',
+    'CREATE INDEX IF NOT EXISTS records_database ON records (database)',
+    'CREATE INDEX IF NOT EXISTS links_target ON links (target_record, system)',
+    'CREATE INDEX IF NOT EXISTS links_system ON links (system)',
+    'CREATE INDEX IF NOT EXISTS links_database ON links (database)'
+]
+
+
+class CrossRefStore:
+    """
+    This class provides the routines to fill and query the cross reference store.
+    """
+
+    def __init__(self, file_name):
+        """
+        Open the store. The file and tables are created if they don't exist.
+        :param file_name: SQLite database file name
+        :type file_name: str
+        """
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def __str__(self):
+        """
+        Return the string representation of the store object
+        :return: string representation
+        :rtype: str
+        """
+        return '<CrossRefStore file_name=' + str(self.file_name) + '>'
+
+    def close(self):
+        """
+        Commit any pending changes and close the store
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def commit(self):
+        """
+        Commit the changes made to the store
+        """
+        self.connection.commit()
+
+    def clear(self):
+        """
+        Remove all records, links and databases from the store.
+        The store is not marked as built until set_built is called again.
+        """
+        self.connection.execute('DELETE FROM records')
+        self.connection.execute('DELETE FROM links')
+        self.connection.execute('DELETE FROM databases')
+        self.connection.execute('DELETE FROM properties WHERE name = ?', ('version',))
+
+    def is_empty(self):
+        """
+        Check whether the store has no records
+        :return: True if there are no records
+        :rtype: bool
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0] == 0
+
+    def is_built(self):
+        """
+        Check whether the store was built completely by this version of the program.
+        Stores that were not built have to be rebuilt from scratch.
+        :return: True if the store version is STORE_VERSION
+        :rtype: bool
+        """
+        row = self.connection.execute('SELECT value FROM properties WHERE name = ?', ('version',)).fetchone()
+        return row is not None and row[0] == str(STORE_VERSION)
+
+    def set_built(self):
+        """
+        Mark the store as built by writing the store version
+        """
+        self.connection.execute('INSERT OR REPLACE INTO properties VALUES (?, ?)', ('version', str(STORE_VERSION)))
+
+    def remove_database(self, database_name):
+        """
+        Remove all the records and links found in a database file
+        :param database_name: database file name
+        :type database_name: str
+        """
+        self.connection.execute('DELETE FROM records WHERE database = ?', (database_name,))
+        self.connection.execute('DELETE FROM links WHERE database = ?', (database_name,))
+        self.connection.execute('DELETE FROM databases WHERE name = ?', (database_name,))
+
+    def add_database(self, system, database_name, record_names, links, digest=None):
+        """
+        Add the records and links found in a database file.
+        The content hash is kept so the store can be checked against the manifests later.
+        :param system: system name
+        :type system: str
+        :param database_name: database file name
+        :type database_name: str
+        :param record_names: list of record names
+        :type record_names: list
+        :param links: list of (record, field, target record, target field) tuples
+        :type links: list
+        :param digest: hash of the database file contents (see crossref.file_hash)
+        :type digest: str
+        """
+        self.connection.execute('INSERT OR REPLACE INTO databases VALUES (?, ?, ?)',
+                                (database_name, system, digest))
+        self.connection.executemany('INSERT INTO records VALUES (?, ?, ?)',
+                                    [(r, system, database_name) for r in record_names])
+        self.connection.executemany('INSERT INTO links VALUES (?, ?, ?, ?, ?, ?)',
+                                    [(system, database_name) + tuple(link) for link in links])
+
+    def get_database_hashes(self, system):
+        """
+        Return the content hash of the database files stored for a system
+        :param system: system name
+        :type system: str
+        :return: dictionary indexed by database file name with the hashes
+        :rtype: dict
+        """
+        return dict(self.connection.execute('SELECT name, hash FROM databases WHERE system = ?', (system,)))
+
+    def system_to_others(self, system):
+        """
+        Return the references from a system to records in other systems.
+        The output has the same format as crossref.system_to_others.
+        :param system: system name
+        :type system: str
+        :return: list of (target record, target field, source record, source field, list of systems)
+        :rtype: list
+        """
+        cursor = self.connection.execute(
+            'SELECT l.rowid, l.target_record, l.target_field, l.record, l.field, r.system '
+            'FROM links l JOIN records r ON r.name = l.target_record '
+            'WHERE l.system = ? AND NOT EXISTS '
+            '(SELECT 1 FROM records s WHERE s.name = l.target_record AND s.system = ?) '
+            'ORDER BY l.rowid, r.rowid', (system, system))
+        output_list = []
+        last_row = None
+        for row, target_record, target_field, source_record, source_field, target_system in cursor:
+            if row != last_row:
+                output_list.append((target_record, target_field, source_record, source_field, []))
+                last_row = row
+            if target_system not in output_list[-1][4]:
+                output_list[-1][4].append(target_system)
+        return output_list
+
+    def next_link(self):
+        """
+        Generator that returns all the links in the store, in the order they were added.
+        :return: (system, record, field, target record, target field) tuples
+        :rtype: tuple
+        """
+        for row in self.connection.execute('SELECT system, record, field, target_record, target_field '
+                                           'FROM links ORDER BY rowid'):
+            yield row
+
+    def others_to_system(self, system):
+        """
+        Return the references from other systems to records in a system.
+        The output has the same format as crossref.others_to_system.
+        :param system: system name
+        :type system: str
+        :return: dictionary indexed by system name with lists of
+                 (target record, target field, source record, source field) tuples
+        :rtype: dict
+        """
+        cursor = self.connection.execute(
+            'SELECT l.system, l.target_record, l.target_field, l.record, l.field '
+            'FROM links l WHERE l.system != ? AND EXISTS '
+            '(SELECT 1 FROM records r WHERE r.name = l.target_record AND r.system = ?) '
+            'ORDER BY l.rowid', (system, system))
+        output_dict = {}
+        for source_system, target_record, target_field, source_record, source_field in cursor:
+            output_dict.setdefault(source_system, []).append((target_record, target_field,
+                                                              source_record, source_field))
+        return output_dict
+
+
+if __name__ == '__main__':
+    pass